@@ -0,0 +1,29 @@
+import backtrader as bt
+
+
+"""Analyzers module
+
+Analyzers added to every cerebro by Backtest.setup_cerebro (on top of the backtrader ones).
+"""
+
+
+class TradeList(bt.Analyzer):
+    """Analyzer recording the closed trades (close date, net PnL, length in bars and symbol) so that the trades of
+    several backtests can be merged, and the number of trades still open at the end of the backtest. The open dates of
+    the closed trades are kept apart (opened) for walkforward.trim."""
+    def start(self):
+        self.trades = []
+        self.opened = []
+        self.open = 0
+
+    def notify_trade(self, trade):
+        if trade.justopened:
+            self.open += 1
+        elif trade.status == trade.Closed:
+            self.open -= 1
+            self.trades.append([
+                bt.num2date(trade.dtclose).isoformat(), trade.pnlcomm, trade.barlen, trade.data._name or ''])
+            self.opened.append(bt.num2date(trade.dtopen).isoformat())
+
+    def get_analysis(self):
+        return {'trades': self.trades, 'open': self.open}
@@ -1,10 +1,15 @@
-import flask
 import json
 import logging
 import os
+import time
 import uuid
-import redis
 
+import omega_ui.startup as osu
+
+# Libraries imported one at a time for the startup report (see /startup)
+osu.imports(osu.LIBRARIES)
+
+import flask
 import dash
 import dash.dependencies as dd
 import dash_auth
@@ -12,11 +17,21 @@ import dash_core_components as dcc
 import dash_html_components as dhc
 import dash_table_experiments as dtb
 
-import omega_ui.configuration as oc
-import omega_ui.backend as ob
+with osu.step('Import omega_ui modules'):
+    import omega_ui.auth as oau
+    import omega_ui.configuration as oc
+    import omega_ui.connections as oconn
+    import omega_ui.backend as ob
+    import omega_ui.jobs as oj
+    import omega_ui.log_archive as ola
+    import omega_ui.metrics as om
+    import omega_ui.runs as oru
+    import omega_ui.sweep as osw
+    import omega_ui.timing as otm
 
 
 debug_mode = True  # set False to deploy
+oau.enabled = not debug_mode
 
 root_directory = os.getcwd()
 stylesheets = ['stylesheet.css']
@@ -29,14 +44,27 @@ server = app.server
 app.title = 'Omega - Backtest'
 
 level_marks = ['Debug', 'Info', 'Warning', 'Error']
+log_page_size = 200
+callback_seconds = om.Histogram('omega_callback_seconds', 'Latency of the Dash callbacks', ['callback'])
+
 
+def callback(*args, **kwargs):
+    """app.callback also recording the latency of the callback (see /metrics)."""
+    def decorator(fn):
+        return app.callback(*args, **kwargs)(callback_seconds.time(callback=fn.__name__)(fn))
+    return decorator
 
+
+layout_started = time.perf_counter()
 left_column = dhc.Div([
     dhc.Div([
-        dhc.Div('Symbols:', className='four columns'),
+        dhc.Div([
+            'Symbols: ',
+            dhc.A('\u21bb', id='symbols-refresh', n_clicks=0, title='Refresh the symbols', style={'cursor': 'pointer'})
+        ], className='four columns'),
         dcc.Dropdown(
             id='symbols',
-            options=[{'label': name, 'value': name} for name in ob.backtest.get_symbols()],
+            options=[],  # see update_symbols_list
             multi=True,
             className='eight columns u-pull-right')
     ], className='row mb-10'),
@@ -59,6 +87,31 @@ left_column = dhc.Div([
             editable=True,
             id='params-table'
         ), className='row mb-10'),
+    dhc.Div(
+        dtb.DataTable(
+            rows=[{}],
+            columns=['Run'] + osw.RANKING,
+            row_selectable=True,
+            sortable=True,
+            selected_row_indices=[],
+            min_height=200,
+            id='sweep-table'
+        ), id='sweep-container', className='row mb-10', style={'display': 'none'}),
+    dhc.Div([
+        dhc.Div([
+            dcc.Input(id='runs-filter', type='text', placeholder='Filter saved runs', className='eight columns'),
+            dcc.Input(id='runs-page', type='number', min=1, value=1, className='four columns')
+        ], className='row'),
+        dtb.DataTable(
+            rows=[{}],
+            columns=oru.COLUMNS,
+            row_selectable=True,
+            sortable=True,
+            selected_row_indices=[],
+            min_height=200,
+            id='runs-table'
+        )
+    ], id='runs-container', className='row mb-10', style={'display': 'none'}),
 
     dhc.Div([
         dhc.Div('Notes:'),
@@ -78,9 +131,10 @@ right_column = dhc.Div([
         dhc.Div([
             dhc.Div([
                 dhc.Div([
-                    dhc.Button('Backtest', id='backtest-btn', n_clicks=0, style={'width': '34%', 'margin-left': 0, 'margin-right': '3%'}),
-                    dhc.Button('Save', id='save-btn', n_clicks=0, style={'width': '30%', 'margin-left': 0, 'margin-right': '3%'}),
-                    dhc.Button('Load', id='load-btn', n_clicks=0, style={'width': '30%', 'margin-left': 0, 'margin-right': 0}),
+                    dhc.Button('Backtest', id='backtest-btn', n_clicks=0, style={'width': '28%', 'margin-left': 0, 'margin-right': '2%', 'padding': 0}),
+                    dhc.Button('Cancel', id='cancel-btn', n_clicks=0, style={'width': '24%', 'margin-left': 0, 'margin-right': '2%', 'padding': 0}),
+                    dhc.Button('Save', id='save-btn', n_clicks=0, style={'width': '21%', 'margin-left': 0, 'margin-right': '2%', 'padding': 0}),
+                    dhc.Button('Load', id='load-btn', n_clicks=0, style={'width': '21%', 'margin-left': 0, 'margin-right': 0, 'padding': 0}),
                 ]),
                 dhc.Div(id='status-area', style={
                     'margin-top': '10px',
@@ -90,8 +144,11 @@ right_column = dhc.Div([
                     'min-height': '40px',
                 })
             ], className='gray-block mb-10'),
-            dhc.Div(id='stat-block', className='block',
-                    style={'position': 'absolute', 'top': '155px', 'bottom': '9.2em', 'left': '75.75%', 'right': 0}),
+            dhc.Div([
+                dhc.Div(id='stat-content'),
+                dhc.Div(id='performance-block')
+            ], id='stat-block', className='block',
+                style={'position': 'absolute', 'top': '155px', 'bottom': '9.2em', 'left': '75.75%', 'right': 0}),
         ], className='twelve columns'), className='row'),
 ], className='offset-by-nine three columns')
 
@@ -108,7 +165,10 @@ bottom = dhc.Div([
                 step=1,
                 value=[0, len(level_marks)-1],
             )
-        ], className='five columns', style={'margin-top': '-0.5em', 'margin-left': '-1em', })
+        ], className='five columns', style={'margin-top': '-0.5em', 'margin-left': '-1em', }),
+        dhc.Div('Past run:', className='one columns'),
+        dcc.Dropdown(id='log-run', options=[], placeholder='Live', className='three columns'),
+        dcc.Input(id='log-page', type='number', min=1, value=1, className='one columns')
     ], className='row mb-10'),
     dhc.Iframe(id='log-frame', style={
         'width': '100%',
@@ -117,6 +177,7 @@ bottom = dhc.Div([
         'min-height': '20em',
         'margin-bottom': '-1em'
     }, className='row'),
+    dhc.Div(id='log-archive', style={'display': 'none'}, className='row'),
 ], className='gray-block')
 
 app.layout = dhc.Div([
@@ -132,11 +193,17 @@ app.layout = dhc.Div([
             , className='row', style={'position': 'absolute', 'bottom': '0.5em', 'right': '1em', 'width': '99%'})
     ]),
     dhc.Div(id='intermediate-value', style={'display': 'none'}),
+    dhc.Div(id='intermediate-job', style={'display': 'none'}),
+    dhc.Div(id='intermediate-cancel', style={'display': 'none'}),
+    dhc.Div(id='intermediate-save', style={'display': 'none'}),
+    dcc.Interval(id='job-poll', interval=500, n_intervals=0, disabled=True),
     dhc.Div(id='intermediate-params', style={'display': 'none'}),
     dhc.Div(id='intermediate-status', style={'display': 'none'}),
     dhc.Div(id='level-log', contentEditable=True, style={'display': 'none'}),
-    dcc.Input(id='log-uid', type='text', style={'display': 'none'})
+    dcc.Input(id='log-uid', type='text', style={'display': 'none'}),
+    dhc.Div(id='page-load', style={'display': 'none'})
 ])
+osu.add('Layout', layout_started)
 
 
 for stylesheet in stylesheets:
@@ -158,32 +225,74 @@ def serve_file(file):
     return flask.send_from_directory(static_directory, file)
 
 
-@app.callback(dd.Output('strategy', 'options'), [dd.Input('module', 'value')])
+@callback(dd.Output('symbols', 'options'), [dd.Input('symbols-refresh', 'n_clicks')])
+def update_symbols_list(n_clicks):
+    """Symbols of the Backtest class (cached, listed again when the refresh link is clicked)."""
+    try:
+        return [{'label': name, 'value': name} for name in ob.symbols(refresh=bool(n_clicks))]
+    except Exception as e:
+        logging.getLogger(__name__).log(logging.ERROR, 'Error in listing the symbols: {}'.format(str(e)))
+        return []
+
+
+@callback(dd.Output('strategy', 'options'), [dd.Input('module', 'value')])
 def update_strategy_list(module_name):
     data = ob.test_list(module_name)
     return [{'label': name, 'value': name} for name in data]
 
 
-@app.callback(dd.Output('params-table', 'rows'), [dd.Input('module', 'value'), dd.Input('strategy', 'value'), dd.Input('symbols', 'value')])
+@callback(dd.Output('params-table', 'rows'), [dd.Input('module', 'value'), dd.Input('strategy', 'value'), dd.Input('symbols', 'value')])
 def update_params_list(module_name, strategy_name, symbol):
     return ob.params_list(module_name, strategy_name, symbol)
 
 
-@app.callback(dd.Output('strategy', 'value'), [dd.Input('strategy', 'options')])
+@callback(dd.Output('strategy', 'value'), [dd.Input('strategy', 'options')])
 def update_strategy_value(options):
     if len(options):
         return options[0]['value']
     return ''
 
 
-@app.callback(dd.Output('status-area', 'children'),
-              [
-                  dd.Input('backtest-btn', 'n_clicks'),
-                  dd.Input('intermediate-params', 'children'),
-                  dd.Input('intermediate-value', 'children')
-              ])
-def update_status_area(n_clicks, packed_params, result):
+@callback(dd.Output('status-area', 'children'),
+          [
+              dd.Input('backtest-btn', 'n_clicks'),
+              dd.Input('intermediate-params', 'children'),
+              dd.Input('intermediate-value', 'children'),
+              dd.Input('intermediate-job', 'children'),
+              dd.Input('intermediate-cancel', 'children'),
+              dd.Input('job-poll', 'n_intervals'),
+              dd.Input('intermediate-save', 'children')
+          ])
+def update_status_area(n_clicks, packed_params, result, job_id, cancelled, n_intervals, saved):
+    status = ob.job_status(job_id) if job_id else {'state': None}
+    if status['state'] == oj.PENDING:
+        return 'Queued ({} waiting)...'.format(oj.queue_depth())
+    if status['state'] == oj.RUNNING:
+        if 'runs' in status:
+            return 'Sweep: {}/{} runs done ({:.1f}s)'.format(status['done'], status['runs'], status['total'])
+        if 'symbols' in status:
+            return 'Portfolio: {}/{} symbols done ({:.1f}s)'.format(status['done'], status['symbols'], status['total'])
+        if 'windows' in status:
+            return 'Walk-forward: {}/{} windows done ({:.1f}s)'.format(status['done'], status['windows'], status['total'])
+        return 'Backtesting... ({:.1f}s)'.format(status['total'])
+    if status['state'] == oj.CANCELLED:
+        return 'Cancelled!'
+    if status['state'] == oj.FAILED:
+        return 'Error: {}'.format(status['error'])
+    saved = json.loads(saved) if saved else {}
+    if result and saved.get('result') == result:
+        return 'Saved as run #{}'.format(saved['run']) if 'run' in saved else 'Error: {}'.format(saved['error'])
     if result:
+        if status['state'] == oj.DONE and status.get('cached'):
+            return 'Done! (cached)'
+        if status['state'] == oj.DONE and 'runs' in status:
+            return 'Done! ({done}/{runs} runs in {total:.1f}s)'.format(**status)
+        if status['state'] == oj.DONE and 'symbols' in status:
+            return 'Done! ({symbols} symbols in {total:.1f}s)'.format(**status)
+        if status['state'] == oj.DONE and 'windows' in status:
+            return 'Done! ({done}/{windows} windows in {total:.1f}s)'.format(**status)
+        if status['state'] == oj.DONE:
+            return 'Done! (queued {wait:.1f}s, ran {run:.1f}s)'.format(**status)
         return 'Done!'
     if n_clicks == 0:
         return ''
@@ -211,14 +320,15 @@ def update_status_area(n_clicks, packed_params, result):
     return 'Backtesting...'
 
 
-@app.callback(dd.Output('log-uid', 'value'), [dd.Input('symbols', 'options')])
+@callback(dd.Output('log-uid', 'value'), [dd.Input('page-load', 'children')])
 def create_uid(m):
     return uuid.uuid4().hex
 
 
-@app.callback(dd.Output('intermediate-value', 'children'),
-              [dd.Input('intermediate-params', 'children'), dd.Input('log-uid', 'value')])
-def on_click_backtest_to_intermediate(json_packed, uid):
+@callback(dd.Output('intermediate-job', 'children'),
+          [dd.Input('intermediate-params', 'children'), dd.Input('log-uid', 'value')],
+          [dd.State('intermediate-job', 'children')])
+def on_click_backtest_to_intermediate(json_packed, uid, previous_job):
     try:
         unpacked = json.loads(json_packed)
         module = unpacked['module_i']
@@ -226,36 +336,202 @@ def on_click_backtest_to_intermediate(json_packed, uid):
         symbols = unpacked['symbols_i']
         params = unpacked['table_params']
         if module is None or strategy is None or symbols is None:
-            return []
-        return ob.create_ts(uid, module, strategy, symbols, params)
+            return ''
+        if previous_job:
+            ob.job_cancel(previous_job)
+        return ob.submit_ts(uid, module, strategy, symbols, params, unpacked.get('level_i', 'DEBUG'))
     except json.decoder.JSONDecodeError:
         # Ignoring this error (this is happening when inputting values in Module/Strategy boxes)
-        return []
+        return ''
+    except ValueError as e:
+        logging.getLogger(__name__).log(logging.ERROR, 'Error in submitting a backtest: {}'.format(str(e)))
+        return ''
+
 
+def selected_result(job_id, state, selected, opened, rows, runs):
+    """Result to display: run opened from the saved runs table, run clicked in the sweep table or result of the job
+    (None while the job is queued/running, [] if it failed)."""
+    value = None
+    if opened and opened[-1] < len(runs) and runs[opened[-1]].get('Run'):
+        # Open the run clicked in the saved runs table (its result is restored without running the backtest)
+        try:
+            value = oru.open_run(runs[opened[-1]]['Run'])
+        except Exception as e:
+            logging.getLogger(__name__).log(logging.ERROR, 'Error in opening a saved run: {}'.format(str(e)))
+    elif selected and osw.is_sweep_id(job_id):
+        # Open the tearsheet of the run clicked in the sweep table
+        value = osw.run_result(job_id, rows[selected[-1]].get('Run', -1))
+    elif state == oj.DONE:
+        value = ob.job_result(job_id)
+    elif state == oj.FAILED:
+        value = []
+    return value
+
+
+@callback(dd.Output('job-poll', 'disabled'),
+          [
+              dd.Input('intermediate-job', 'children'),
+              dd.Input('job-poll', 'n_intervals'),
+              dd.Input('sweep-table', 'selected_row_indices'),
+              dd.Input('runs-table', 'selected_row_indices')
+          ],
+          [
+              dd.State('sweep-table', 'rows'),
+              dd.State('runs-table', 'rows')
+          ])
+def toggle_job_poll(job_id, n_intervals, selected, opened, rows, runs):
+    state = ob.job_status(job_id)['state'] if job_id else None
+    if state in (oj.PENDING, oj.RUNNING):
+        return False
+    # Also polled while the robustness analysis of the result to display is running (see backend.analyze)
+    value = selected_result(job_id, state, selected, opened, rows, runs)
+    return not value or ob.analyze(value)
+
+
+@callback(dd.Output('intermediate-value', 'children'),
+          [
+              dd.Input('intermediate-job', 'children'),
+              dd.Input('job-poll', 'n_intervals'),
+              dd.Input('sweep-table', 'selected_row_indices'),
+              dd.Input('runs-table', 'selected_row_indices')
+          ],
+          [
+              dd.State('sweep-table', 'rows'),
+              dd.State('runs-table', 'rows'),
+              dd.State('intermediate-value', 'children')
+          ])
+def on_job_to_intermediate(job_id, n_intervals, selected, opened, rows, runs, current):
+    state = ob.job_status(job_id)['state'] if job_id else None
+    value = selected_result(job_id, state, selected, opened, rows, runs)
+    if value and not ob.analyze(value):
+        value = None  # Displayed once its robustness analysis is stored, the figure and statistic only read it
+    # Keep the last result while the job is queued/running or when it has been cancelled
+    if value is None or value == current:
+        raise dash.exceptions.PreventUpdate()
+    return value
+
+
+@callback(dd.Output('sweep-table', 'rows'),
+          [dd.Input('intermediate-job', 'children'), dd.Input('job-poll', 'n_intervals')])
+def update_sweep_rows(job_id, n_intervals):
+    if not osw.is_sweep_id(job_id):
+        return [{}]
+    return osw.ranked(job_id) or [{}]
+
+
+@callback(dd.Output('sweep-table', 'columns'), [dd.Input('intermediate-job', 'children')])
+def update_sweep_columns(job_id):
+    return ['Run'] + osw.RANKING + list(osw.grid_keys(job_id))
+
+
+@callback(dd.Output('sweep-table', 'selected_row_indices'), [dd.Input('intermediate-job', 'children')])
+def reset_sweep_selection(job_id):
+    return []
+
+
+@callback(dd.Output('sweep-container', 'style'), [dd.Input('intermediate-job', 'children')])
+def toggle_sweep_table(job_id):
+    return {'display': 'block' if osw.is_sweep_id(job_id) else 'none'}
+
+
+@callback(dd.Output('intermediate-save', 'children'),
+          [dd.Input('save-btn', 'n_clicks')],
+          [
+              dd.State('intermediate-value', 'children'),
+              dd.State('intermediate-params', 'children'),
+              dd.State('notes-area', 'value')
+          ])
+def on_click_save(n_clicks, result, packed_params, notes):
+    """Save the displayed result with its notes (the inputs of the backtest are stored with the result, the params
+    of the last submission are used for the combined results of portfolios and walk-forwards)."""
+    if n_clicks == 0 or not result:
+        return ''
+    try:
+        params = json.loads(packed_params) if packed_params else {}
+        inputs = dict(module=params.get('module_i'), strategy=params.get('strategy_i'),
+                      symbols=params.get('symbols_i'), params=params.get('table_params'))
+        return json.dumps({'result': result, 'run': oru.save(result, notes, inputs)})
+    except Exception as e:
+        logging.getLogger(__name__).log(logging.ERROR, 'Error in saving a run: {}'.format(str(e)))
+        return json.dumps({'result': result, 'error': str(e)})
+
+
+@callback(dd.Output('runs-container', 'style'), [dd.Input('load-btn', 'n_clicks')])
+def toggle_runs_table(n_clicks):
+    return {'display': 'block' if n_clicks % 2 else 'none'}
+
+
+@callback(dd.Output('runs-table', 'rows'),
+          [
+              dd.Input('load-btn', 'n_clicks'),
+              dd.Input('runs-filter', 'value'),
+              dd.Input('runs-page', 'value'),
+              dd.Input('intermediate-save', 'children')
+          ])
+def update_runs_rows(n_clicks, text, page, saved):
+    """Page of the saved runs matching the filter (only read while the table is shown)."""
+    if not n_clicks % 2:
+        raise dash.exceptions.PreventUpdate()
+    page_size = int(oc.cfg['runs']['page_size'])
+    return oru.rows(text, page_size, (max(int(page or 1), 1) - 1) * page_size) or [{}]
+
+
+@callback(dd.Output('runs-page', 'value'), [dd.Input('runs-filter', 'value')])
+def reset_runs_page(text):
+    return 1
+
+
+@callback(dd.Output('runs-table', 'selected_row_indices'),
+          [dd.Input('intermediate-job', 'children'), dd.Input('sweep-table', 'selected_row_indices')])
+def reset_runs_selection(job_id, selected):
+    return []
+
+
+@callback(dd.Output('notes-area', 'value'), [dd.Input('intermediate-value', 'children')])
+def on_open_run_to_notes(result):
+    """Notes of an opened run (the notes are kept for the other results)."""
+    run_id = oru.run_id(result)
+    run = oru.get(run_id) if run_id is not None else None
+    if run is None:
+        raise dash.exceptions.PreventUpdate()
+    return run['notes']
+
+
+@callback(dd.Output('intermediate-cancel', 'children'),
+          [dd.Input('cancel-btn', 'n_clicks')],
+          [dd.State('intermediate-job', 'children')])
+def on_click_cancel(n_clicks, job_id):
+    if n_clicks == 0 or not job_id:
+        return ''
+    return job_id if ob.job_cancel(job_id) else ''
 
-@app.callback(dd.Output('backtest-btn', 'n_clicks'),
-              [
-                  dd.Input('module', 'value'),
-                  dd.Input('strategy', 'value'),
-                  dd.Input('symbols', 'value'),
-                  dd.Input('params-table', 'rows')
-              ])
+
+@callback(dd.Output('backtest-btn', 'n_clicks'),
+          [
+              dd.Input('module', 'value'),
+              dd.Input('strategy', 'value'),
+              dd.Input('symbols', 'value'),
+              dd.Input('params-table', 'rows')
+          ])
 def reset_button(*args):
     return 0
 
 
-@app.callback(dd.Output('intermediate-params', 'children'),
-              [
-                  dd.Input('backtest-btn', 'n_clicks'),
-                  dd.Input('module', 'value'),
-                  dd.Input('strategy', 'value'),
-                  dd.Input('symbols', 'value'),
-                  dd.Input('params-table', 'rows')
-              ])
-def update_params(n_clicks, module, strategy, symbol, rows):
+@callback(dd.Output('intermediate-params', 'children'),
+          [
+              dd.Input('backtest-btn', 'n_clicks'),
+              dd.Input('module', 'value'),
+              dd.Input('strategy', 'value'),
+              dd.Input('symbols', 'value'),
+              dd.Input('params-table', 'rows')
+          ],
+          [dd.State('level-slider', 'value')])
+def update_params(n_clicks, module, strategy, symbol, rows, levels):
     if n_clicks == 0:
         return ''
     params = {'module_i': module, 'strategy_i': strategy, 'symbols_i': symbol}
+    # Records below the minimum level of the slider are not streamed by the server
+    params['level_i'] = level_marks[levels[0]].upper()
     table_params = {}
     for row in rows:
         table_params[row['Parameter']] = str(row['Value'])
@@ -263,16 +539,30 @@ def update_params(n_clicks, module, strategy, symbol, rows):
     return json.dumps(params)
 
 
-@app.callback(dd.Output('charts', 'figure'),
-              [dd.Input('intermediate-value', 'children'), dd.Input('log-uid', 'value')])
-def on_intermediate_to_chart(children, uid):
-    r = redis.StrictRedis(oc.cfg['default']['redis'], 6379, db=0)
+@callback(dd.Output('charts', 'figure'),
+          [
+              dd.Input('intermediate-value', 'children'),
+              dd.Input('log-uid', 'value'),
+              dd.Input('charts', 'relayoutData')
+          ],
+          [dd.State('intermediate-job', 'children')])
+def on_intermediate_to_chart(children, uid, relayout_data, job_id):
+    r = oconn.redis_client()
     size = r.get(uid + 'size')
     w, h = size.decode('utf8').split(',')
-    return ob.extract_figure(children, w, h)
-
-
-@app.callback(
+    # The points of the zoomed range are re-fetched, a new result is displayed unzoomed
+    shown = json.dumps(children)
+    x_range = None
+    if (r.get(uid + 'chart') or b'').decode('utf8') == shown:
+        x_range = ob.zoom_range(relayout_data)
+        if x_range is None:
+            raise dash.exceptions.PreventUpdate()
+    else:
+        r.set(uid + 'chart', shown, ex=7 * 24 * 3600)
+    return ob.extract_figure(children, w, h, None if x_range == 'auto' else x_range, job_id)
+
+
+@callback(
     dash.dependencies.Output('level-log', 'children'),
     [dash.dependencies.Input('level-slider', 'value')])
 def level_output(value):
@@ -283,9 +573,66 @@ def level_output(value):
     return ','.join(res)
 
 
-@app.callback(dd.Output('stat-block', 'children'), [dd.Input('intermediate-value', 'children')])
-def on_intermediate_to_stat(children):
-    statistic = ob.extract_statistic(children)
+@callback(dd.Output('log-run', 'options'), [dd.Input('intermediate-value', 'children')])
+def update_log_runs(children):
+    return [
+        {'label': '#{} {} ({:,} lines)'.format(run['id'], run['name'], run['records']), 'value': run['id']}
+        for run in ola.runs()
+    ]
+
+
+@callback(dd.Output('log-page', 'value'), [dd.Input('log-run', 'value')])
+def reset_log_page(run_id):
+    return 1
+
+
+@callback(dd.Output('log-frame', 'style'), [dd.Input('log-run', 'value')])
+def toggle_log_frame(run_id):
+    return {
+        'width': '100%',
+        'background-color': 'white',
+        'border': '1px solid black',
+        'min-height': '20em',
+        'margin-bottom': '-1em',
+        'display': 'none' if run_id else 'block'
+    }
+
+
+@callback(dd.Output('log-archive', 'style'), [dd.Input('log-run', 'value')])
+def toggle_log_archive(run_id):
+    if not run_id:
+        return {'display': 'none'}
+    return {
+        'background-color': 'white',
+        'border': '1px solid black',
+        'height': '20em',
+        'overflow-y': 'scroll',
+        'font-family': 'monospace',
+        'margin-bottom': '-1em'
+    }
+
+
+@callback(dd.Output('log-archive', 'children'),
+          [dd.Input('log-run', 'value'), dd.Input('log-page', 'value'), dd.Input('level-slider', 'value')])
+def on_log_page(run_id, page, levels):
+    """Page of the logs of a past run, read from the log archive (only the chunks of the page are decompressed)."""
+    if not run_id:
+        return []
+    page = max(int(page or 1), 1)
+    selected = [level_marks[i].upper() for i in range(levels[0], levels[1] + 1)]
+    result = ola.page(run_id, selected, (page - 1) * log_page_size, log_page_size)
+    pages = max((result['total'] - 1) // log_page_size + 1, 1)
+    header = 'Page {} of {} ({:,} lines)'.format(page, pages, result['total'])
+    return [dhc.Div(dhc.B(header))] + [
+        dhc.Div('{}: {}: {}'.format(record['logger'], record['level'], record['msg']), className=record['level'])
+        for record in result['records']
+    ]
+
+
+@callback(dd.Output('stat-content', 'children'), [dd.Input('intermediate-value', 'children')],
+          [dd.State('intermediate-job', 'children')])
+def on_intermediate_to_stat(children, job_id):
+    statistic = ob.extract_statistic(children, job_id)
     ht = []
     for section in statistic:
         ht.append(dhc.Div(dhc.B(section, style={'font-size': '1.1em', 'line-height': '1.5m'}), className='row'))
@@ -299,6 +646,112 @@ def on_intermediate_to_stat(children):
     return dhc.Div(dhc.Div(ht[:-1], className='twelve columns', style={'line-height': '1.4em'}), className='row')
 
 
+@callback(dd.Output('performance-block', 'children'),
+          [dd.Input('charts', 'figure')],
+          [dd.State('intermediate-value', 'children')])
+def on_chart_to_performance(figure, children):
+    """Collapsible timing of the stages of the backtest and of its display (updated once the chart is rendered)."""
+    timing, profile = ob.extract_timing(children)
+    if not timing:
+        return []
+    ht = [dhc.Summary(dhc.B('Performance', style={'font-size': '1.1em', 'line-height': '1.5m'}))]
+    for phase in otm.PHASES:
+        if phase not in timing:
+            continue
+        ht.append(dhc.Div(dhc.I(phase), className='row'))
+        for name, seconds in timing[phase]:
+            ht.append(
+                dhc.Div([
+                    dhc.Div(name, className='u-pull-left'),
+                    dhc.Div(dhc.B('{:.3f}s'.format(seconds)), className='u-pull-right')
+                ], className='row'))
+    if profile is not None:
+        ht.append(dhc.Div(dhc.A('Download cerebro.run profile (pstats)', href='/profiles/{}'.format(profile)),
+                          className='row'))
+    return dhc.Div([
+        dhc.Div(style={'border': '1px solid #999', 'margin': '10px 10px 5px'}),
+        dhc.Div(dhc.Details(ht), className='twelve columns', style={'line-height': '1.4em'})
+    ], className='row')
+
+
+@app.server.route('/metrics')
+@oau.protected
+def metrics():
+    return flask.Response(om.render(), content_type=om.CONTENT_TYPE)
+
+
+@app.server.route('/jobs')
+@oau.protected
+def jobs_stats():
+    return flask.jsonify(oj.stats())
+
+
+@app.server.route('/jobs/<job_id>')
+@oau.protected
+def job_status(job_id):
+    return flask.jsonify(ob.job_status(job_id))
+
+
+@app.server.route('/logs')
+@oau.protected
+def log_runs():
+    before = flask.request.args.get('before')
+    return flask.jsonify(ola.runs(
+        limit=int(flask.request.args.get('limit', 50)),
+        before=int(before) if before else None))
+
+
+@app.server.route('/logs/<int:run_id>')
+@oau.protected
+def log_page(run_id):
+    levels = flask.request.args.get('levels')
+    return flask.jsonify(ola.page(
+        run_id,
+        levels=levels.split(',') if levels else None,
+        offset=int(flask.request.args.get('offset', 0)),
+        limit=int(flask.request.args.get('limit', log_page_size))))
+
+
+@app.server.route('/logs/<int:run_id>/text')
+@oau.protected
+def log_text(run_id):
+    return flask.Response(ola.text(run_id), mimetype='text/plain')
+
+
+@app.server.route('/runs')
+@oau.protected
+def saved_runs():
+    return flask.jsonify(oru.runs(
+        flask.request.args.get('filter', ''),
+        limit=int(flask.request.args.get('limit', oc.cfg['runs']['page_size'])),
+        offset=int(flask.request.args.get('offset', 0))))
+
+
+@app.server.route('/runs/<int:run_id>')
+@oau.protected
+def saved_run(run_id):
+    run = oru.get(run_id)
+    if run is None:
+        flask.abort(404)
+    return flask.jsonify(run)
+
+
+@app.server.route('/startup')
+def startup_report():
+    """Time taken by each step of the startup (imports, configuration, Backtest class, layout, symbols)."""
+    return flask.jsonify(osu.report())
+
+
+@app.server.route('/profiles/<int:run_id>')
+@oau.protected
+def profile_dump(run_id):
+    """pstats dump of cerebro.run of a run (see logging/profile), e.g. python -m pstats <file>."""
+    path = otm.profile_path(run_id)
+    if not os.path.exists(path):
+        flask.abort(404)
+    return flask.send_file(path, mimetype='application/octet-stream', as_attachment=True)
+
+
 if not debug_mode:
     auth = dash_auth.BasicAuth(
         app,
@@ -309,6 +762,9 @@ if not debug_mode:
 # Before running the app, please run the following 'python socket_logged.py flask run'
 if __name__ == '__main__':
     logger = logging.getLogger('werkzeug')
-    handler = logging.FileHandler(ob.LogFileCreator.werkzeug_log_file_name())
+    handler = logging.FileHandler(ob.werkzeug_log_file_name())
     logger.addHandler(handler)
+    ob.warm_up()
+    osu.ready()
+    print('Startup:\n{}'.format(osu.summary()))
     app.run_server(host='0.0.0.0', debug=debug_mode)
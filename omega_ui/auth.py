@@ -0,0 +1,49 @@
+import functools
+import hmac
+import json
+
+import flask
+
+
+"""Authentication module
+
+Basic authentication of the Flask routes added next to the Dash app (JSON API, logs, profiles, metrics) with the users
+of dash_auth (users.json, see backend.add_user). The users file is read on every request so that added users can log in
+without a restart. The check is skipped while enabled is False (debug mode of the UI).
+"""
+users_file = 'users.json'
+enabled = True
+REALM = 'Basic realm="Omega UI"'
+
+
+def users():
+    """
+        :return: dict - password by user name ({} if the users file is missing or invalid)
+    """
+    try:
+        with open(users_file) as data_file:
+            return json.load(data_file)
+    except:
+        return {}
+
+
+def authorized(authorization):
+    """
+        Checks the credentials of a request against the users file.
+        :param authorization: werkzeug Authorization or None - flask.request.authorization
+        :return: bool
+    """
+    if authorization is None or authorization.username is None or authorization.password is None:
+        return False
+    password = users().get(authorization.username)
+    return password is not None and hmac.compare_digest(str(password).encode(), authorization.password.encode())
+
+
+def protected(view):
+    """Decorator of a Flask view answering 401 to requests without the credentials of a user (when enabled)."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if enabled and not authorized(flask.request.authorization):
+            return flask.Response('Login required', 401, {'WWW-Authenticate': REALM})
+        return view(*args, **kwargs)
+    return wrapper
@@ -1,62 +1,117 @@
-import glob
+import contextlib
 import importlib
-import inspect
 import json
 import logging
 import os
-import pandas as pd
-import re
-import rlog
-import sys
+import queue
+import threading
+import time
 
+import omega_ui.auth as oau
+import omega_ui.backtest as obt
+import omega_ui.cache as oca
 import omega_ui.configuration as oc
+import omega_ui.connections as oconn
+import omega_ui.discovery as odi
+import omega_ui.jobs as oj
+import omega_ui.live as olive
+import omega_ui.log_archive as ola
+import omega_ui.log_handlers as olh
+import omega_ui.metrics as om
+import omega_ui.portfolio as opf
+import omega_ui.results as ors
+import omega_ui.robustness as orb
+import omega_ui.startup as osu
+import omega_ui.sweep as osw
+import omega_ui.walkforward as owf
 import omega_ui.tearsheet as ots
+import omega_ui.timing as otm
 
-users_file = 'users.json'
+stage_seconds = om.Histogram(
+    'omega_backtest_stage_seconds', 'Duration of the stages of create_ts (see omega_ui.timing)', ['stage'])
+backtests = om.Counter('omega_backtests_total', 'Backtests run by create_ts', ['outcome'])
 log_dir = oc.cfg['logging']['root']
 if not os.path.exists(log_dir):
     os.makedirs(log_dir)
 
 
-# Backtest class
-btm = importlib.import_module(oc.cfg['default']['module'])
-backtest = getattr(btm, oc.cfg['default']['class'])()
+# Backtest instance, created on first use (importing the Backtest module can be slow, see get_backtest)
+backtest = None
+_backtest_lock = threading.Lock()
+_symbols = {}
 
 
-class LogFileCreator:
-    def __init__(self):
-        files = glob.glob(os.path.join(log_dir, 'backtest*.txt'))
-        if len(files) > 0:
-            last = max(files, key=os.path.getctime)
-            nb = re.findall(r'\d+', last)
-            self.counter = int(nb[0]) + 1
-        else:
-            # If no files, start at 1
-            self.counter = 1
+def get_backtest():
+    """Instance of the Backtest class of the configuration (imported and created the first time it is used)."""
+    global backtest
+    if backtest is None:
+        with _backtest_lock:
+            if backtest is None:
+                with osu.step('Backtest class'):
+                    btm = importlib.import_module(oc.cfg['default']['module'])
+                    backtest = getattr(btm, oc.cfg['default']['class'])()
+    return backtest
 
-    def next_file_name(self):
-        self.counter += 1
-        return os.path.join(log_dir, 'backtest{:03d}-logs.txt'.format(self.counter))
 
-    @staticmethod
-    def werkzeug_log_file_name():
-        return os.path.join(log_dir, 'access.log')
+def warm_up():
+    """Import the strategy modules in the background (backtest/warm_up), once the UI has started."""
+    if oc.cfg['backtest'].get('warm_up'):
+        odi.warm_in_background(oc.cfg['backtest']['modules'].split(','))
+
+
+def symbols(refresh=False):
+    """Symbols of the Backtest class (listing them can be slow, e.g. from a data vendor), cached in memory and in Redis
+    for backtest/symbols_ttl seconds so that restarting the UI does not list them again
+
+    :param refresh: bool - List the symbols again
+    :return: list - Symbols
+    """
+    logger = logging.getLogger(__name__)
+
+    ttl = int(oc.cfg['backtest'].get('symbols_ttl') or 0)
+    now = time.time()
+    cached = _symbols.get('values')
+    if not refresh and cached is not None and (not ttl or now - _symbols['time'] < ttl):
+        return cached
+    key = 'symbols:{}.{}'.format(oc.cfg['default']['module'], oc.cfg['default']['class'])
+    r = None
+    try:
+        r = oconn.redis_client()
+        value = None if refresh else r.get(key)
+        if value is not None:
+            _symbols.update(values=json.loads(value.decode('utf8')), time=now)
+            return _symbols['values']
+    except Exception as e:
+        logger.log(logging.ERROR, 'Error in reading the cached symbols: {}'.format(str(e)))
+    # Only the first listing is part of the startup report
+    with osu.step('Symbols') if 'values' not in _symbols else contextlib.suppress():
+        values = list(get_backtest().get_symbols())
+    _symbols.update(values=values, time=now)
+    try:
+        if r is not None:
+            r.set(key, json.dumps(values), ex=ttl or None)
+    except Exception as e:
+        logger.log(logging.ERROR, 'Error in caching the symbols: {}'.format(str(e)))
+    return values
+
+
+def werkzeug_log_file_name():
+    return os.path.join(log_dir, 'access.log')
 
 
 def test_list(module_name):
+    """Strategies of a module (the module is only reloaded when its source files are modified)."""
     try:
-        result = []
-        importlib.import_module(module_name)
-        for name, obj in inspect.getmembers(sys.modules[module_name]):
-            if inspect.isclass(obj):
-                result.append(name)
-        return result
+        return odi.strategies(module_name)
     except:
         return []
 
 
 def cash_param():
-    return [{'Parameter': 'Cash', 'Value': oc.cfg['backtest']['cash']}]
+    return [
+        {'Parameter': 'Cash', 'Value': oc.cfg['backtest']['cash']},
+        {'Parameter': owf.PARAM, 'Value': ''}
+    ]
 
 
 def params_list(module_name, strategy_name, symbol):
@@ -64,11 +119,8 @@ def params_list(module_name, strategy_name, symbol):
 
     params = cash_param()
     try:
-        # Get strategy
-        module = importlib.import_module(module_name)
-        importlib.reload(module)  # Always reload module in case some changes have been made to the strategies
-        strategy = getattr(module, strategy_name)
-        for key, value in backtest.get_parameters(strategy, symbol).items():
+        # Parameters are cached until the strategy module is modified
+        for key, value in odi.parameters(get_backtest(), module_name, strategy_name, symbol).items():
             if isinstance(value, dict):
                 value = json.dumps(value)
             params.append({'Parameter': key, 'Value': value})
@@ -77,60 +129,322 @@ def params_list(module_name, strategy_name, symbol):
     return params
 
 
-def create_ts(uid, module_name, strategy_name, symbols, params):
+def create_ts(uid, module_name, strategy_name, symbols, params, result_id=None, level='DEBUG', window=None,
+              robustness=True):
+    """Run a backtest and store its result in the result store (see omega_ui.results)
+
+    :param window: tuple - First and last dates ('%Y-%m-%d') of the data (walk-forward windows), or first date of the
+        warm-up, first and last dates of the data (walk-forward test runs, see walkforward.test_window)
+    :param robustness: bool - Store the robustness analysis with the result (see analyze for the other results)
+    :param level: string - Minimum level of the records streamed to the UI (and written to the log archive unless
+        logging/full_files is set)
+    :return: string - Result id ([] if the backtest failed)
+    """
     result = []
+    # Inputs of the backtest, saved with the result by the Save button (see omega_ui.runs)
+    inputs = dict(module=module_name, strategy=strategy_name, symbols=symbols, params=dict(params))
+    level = logging.getLevelName(level)
+    full_files = bool(oc.cfg['logging']['full_files'])
+    sampling = olh.SamplingFilter(oc.cfg['logging'].get('sampling') or {})
     logger = logging.getLogger()
-    logger.setLevel(logging.NOTSET)
-    lfc = LogFileCreator()
-    fh = logging.FileHandler(lfc.next_file_name())
-    formatter = logging.Formatter('%(levelname)s - %(message)s')
-    fh.setFormatter(formatter)
-    fh.setLevel(logging.NOTSET)
-    logger.addHandler(fh)
-    rh = rlog.RedisHandler(channel='l' + uid)
-    logger.addHandler(rh)
-    logger.log(logging.DEBUG, 'start')
+    # Records below all the handler levels are not even created
+    logger.setLevel(logging.NOTSET if full_files else level)
+    run_id = ola.create_run('{} {}'.format(strategy_name, symbols))
+    timer = otm.Timer()
+    profile = otm.profile_path(run_id) if oc.cfg['logging'].get('profile') else None
+    fh = ola.ArchiveHandler(run_id, int(oc.cfg['logging']['chunk_records']), logging.NOTSET if full_files else level)
+    handlers = [fh]
+    if uid:
+        rh = olh.RedisBatchHandler('l' + uid, oconn.redis_client(), level=level)
+        if full_files:
+            rh.addFilter(sampling)
+        handlers.append(rh)
+    # The strategy only enqueues records, files and Redis are written in batches by a background thread
+    records = queue.Queue()
+    qh = olh.QueueHandler(records)
+    if not full_files:
+        qh.addFilter(sampling)
+    logger.addHandler(qh)
+    listener = olh.BatchListener(records, handlers, batch_size=int(oc.cfg['logging']['batch_size']))
+    listener.start()
+    olh.log_control(logger, 'start')
     try:
-        # Get strategy
-        module = importlib.import_module(module_name)
-        importlib.reload(module)  # Always reload module in case some changes have been made to the strategies
-        strategy = getattr(module, strategy_name)
+        # Get strategy (reloaded if some changes have been made to the strategies)
+        with timer.span('Module reload'):
+            strategy = odi.strategy(module_name, strategy_name)
         # Backtest
         cash = float(params.pop('Cash', 1))
         for k, v in params.items():
             params[k] = json.loads(v)
-        pnl, strat = backtest.run(symbols, cash, strategy, **params)
-        pyfoliozer = strat.analyzers.getbyname('pyfolio')
-        returns, _, _, _ = pyfoliozer.get_pf_items()
-        result = json.dumps({
-            'returns': returns.to_json(),
-            'statistic': ots.create_statistic(returns,strat),
-            'title': '{}: {:,.2f}'.format(symbols, pnl)
-        })
-        logger.log(logging.DEBUG, 'done')
+        job_id = oj.current_job_id()
+        olive.configure('l' + uid if uid else None, job_id)
+        otm.configure(timer, profile)
+        if window is not None:
+            obt.set_window(owf.to_datetime(window[0]), owf.end_of_day(window[-1]))
+        try:
+            pnl, strat = get_backtest().run(symbols, cash, strategy, **params)
+        finally:
+            olive.configure(None, None)
+            otm.configure(None)
+            obt.set_window(None, None)
+        if olive.stop_requested(job_id):
+            raise Exception('cancelled')
+        with timer.span('Analyzers'):
+            pyfoliozer = strat.analyzers.getbyname('pyfolio')
+            returns, _, _, _ = pyfoliozer.get_pf_items()
+            trades = strat.analyzers.tradelist.get_analysis()
+        with timer.span('create_statistic'):
+            if window is not None and len(window) == 3:
+                returns, trades, statistic = owf.trim(
+                    returns, trades, strat.analyzers.tradelist.opened, window[1])
+            else:
+                statistic = ots.create_statistic(returns, strat)
+        with timer.span('JSON encoding/store'):
+            result = ors.put(
+                returns,
+                statistic,
+                '{}: {:,.2f}'.format(symbols, pnl),
+                result_id=result_id,
+                trades=trades,
+                cash=cash,
+                inputs=inputs)
+        if robustness:
+            with timer.span('Robustness'):
+                add_robustness(result)
+        olh.log_control(logger, 'done')
     except Exception as e:
         logger.log(logging.ERROR, 'Error in starting a backtest: {}'.format(str(e)))
-    logger.removeHandler(fh)
-    logger.removeHandler(rh)
+    logger.removeHandler(qh)
+    listener.stop()
+    stats = listener.stats()
+    message = 'Logging: {} records, {:.3f}s in handlers'.format(stats['records'], stats['seconds'])
+    fh.handle(logger.makeRecord(logger.name, logging.INFO, __file__, 0, message, None, None))
+    spans = timer.result()
+    message = 'Backtest timing: {}'.format(otm.summary(spans))
+    fh.handle(logger.makeRecord(logger.name, logging.INFO, __file__, 0, message, None, None))
+    fh.close()
+    if result:
+        ors.update_header(result, logging=stats, log_run=run_id,
+                          profile=run_id if profile is not None and os.path.exists(profile) else None)
+        ors.put_timing(result, 'Backtest', spans)
     return result
 
 
-def extract_figure(json_ts, w, h):
+def submit_ts(uid, module_name, strategy_name, symbols, params, level='DEBUG'):
+    """Submit create_ts to the job pool and return the job id (or the sweep id if a param holds a range/list, or the
+    portfolio id if the backtest is symbol independent and several symbols are selected, or the walk-forward id)."""
+    params = dict(params)
+    spec = params.pop(owf.PARAM, '')
+    if spec:
+        return owf.submit(
+            lambda p, window: _submit_cached(None, module_name, strategy_name, symbols, p, level, window, False),
+            spec,
+            get_backtest().get_date_range(symbols),
+            params)
+    if osw.is_sweep(params):
+        # Runs of a sweep are not streamed to the UI (nor analyzed unless displayed, see analyze)
+        return osw.submit(lambda p: _submit_cached(None, module_name, strategy_name, symbols, p, level, None, False),
+                          params)
+    if get_backtest().symbol_independent and len(symbols) > 1:
+        # One job per symbol, the jobs of a portfolio are not streamed to the UI either
+        return opf.submit(
+            lambda s, cash: _submit_cached(
+                None, module_name, strategy_name, [s], dict(params, Cash=str(cash)), level, None, False),
+            symbols,
+            get_backtest().get_weights(symbols),
+            float(params.get('Cash', oc.cfg['backtest']['cash'])))
+    return _submit_cached(uid, module_name, strategy_name, symbols, params, level)
+
+
+def _submit_cached(uid, module_name, strategy_name, symbols, params, level, window=None, robustness=True):
+    """Submit create_ts unless its result is in the cache, store the result in the cache once the job is done."""
+    logger = logging.getLogger(__name__)
+
+    key = None
+    try:
+        fingerprint = get_backtest().get_data_fingerprint(symbols)
+        if fingerprint is not None:
+            # The cache key is used as the result id so that results still in the result store are reused as well
+            key = oca.make_key(
+                module_name, strategy_name, symbols, params, fingerprint if window is None else [fingerprint, window])
+            if ors.exists(key):
+                return oj.completed('create_ts', key)
+            value = oca.get(key)
+            if value is not None:
+                return oj.completed('create_ts', ors.loads(key, value))
+    except Exception as e:
+        logger.log(logging.ERROR, 'Error in reading the cache: {}'.format(str(e)))
+    job_id = oj.submit(create_ts, uid, module_name, strategy_name, symbols, params, result_id=key, level=level,
+                       window=window, robustness=robustness)
+    oj.add_done_callback(job_id, observe_backtest)
+    if key is not None:
+        oj.add_done_callback(job_id, lambda value: _put_cached(key, value))
+    return job_id
+
+
+def observe_backtest(result_id):
+    """Update the metrics of create_ts once its job is done (it runs in a worker process, the spans are read from the
+    result)."""
+    backtests.inc(outcome='ok' if result_id else 'failed')
+    if not result_id:
+        return
+    try:
+        for stage, seconds in ors.get_timing(result_id, ['Backtest']).get('Backtest', []):
+            stage_seconds.observe(seconds, stage=stage)
+    except Exception as e:
+        logging.getLogger(__name__).log(logging.ERROR, 'Error in reading the timing of a backtest: {}'.format(str(e)))
+
+
+def _put_cached(key, result_id):
+    if not result_id:
+        return  # create_ts failed
+    try:
+        oca.put(key, ors.dumps(result_id))
+    except Exception as e:
+        logging.getLogger(__name__).log(logging.ERROR, 'Error in writing the cache: {}'.format(str(e)))
+
+
+def job_status(job_id):
+    if osw.is_sweep_id(job_id):
+        return osw.status(job_id)
+    if opf.is_portfolio_id(job_id):
+        return opf.status(job_id)
+    if owf.is_walk_forward_id(job_id):
+        return owf.status(job_id)
+    return oj.status(job_id)
+
+
+def job_result(job_id):
+    if osw.is_sweep_id(job_id):
+        return osw.best_result(job_id)
+    if opf.is_portfolio_id(job_id):
+        return opf.result(job_id)
+    if owf.is_walk_forward_id(job_id):
+        return owf.result(job_id)
+    return oj.result(job_id)
+
+
+def job_cancel(job_id):
+    """Cancel a job or all the jobs of a sweep/portfolio/walk-forward. Pending jobs are removed from the queue, running
+    backtests stop within Live/Stop_interval_ms (see live.StopCheck) and their result is discarded."""
+    if osw.is_sweep_id(job_id):
+        job_ids = osw.job_ids(job_id)
+    elif opf.is_portfolio_id(job_id):
+        job_ids = opf.job_ids(job_id)
+    elif owf.is_walk_forward_id(job_id):
+        owf.stop(job_id)
+        job_ids = owf.job_ids(job_id)
+    else:
+        job_ids = [job_id]
+    cancelled = False
+    for j in job_ids:
+        if oj.status(j)['state'] == oj.RUNNING:
+            olive.request_stop(j)
+        cancelled = oj.cancel(j) or cancelled
+    return cancelled
+
+
+_robustness_lock = threading.Lock()
+_analyses = {}  # result id -> job id of its robustness analysis
+
+
+def add_robustness(result_id):
+    """Run the Monte Carlo analysis of a result and store it with the result (in a worker process: at the end of
+    create_ts or as a job submitted by analyze)."""
+    header = ors.get_header(result_id)
+    if header is None or 'robustness' in header:
+        return
+    trades = (header.get('trades') or {}).get('trades')
+    section, figure = orb.analyze(ors.get_returns(result_id), trades, header.get('cash'))
+    statistic = header['statistic']
+    if section is not None:
+        statistic['Robustness'] = section
+    ors.update_header(result_id, statistic=statistic, robustness=figure)
+
+
+def analyze(result_id):
+    """Submit the robustness analysis of a result which has none to the process pool (runs of sweeps, walk-forwards
+    and portfolios are only analyzed when displayed, merged results and saved runs may not have been analyzed)
+
+    :param result_id: string - Result id
+    :return: bool - False while the analysis is pending or running
+    """
+    header = ors.get_header(result_id)
+    if header is None or 'robustness' in header:
+        return True
+    with _robustness_lock:
+        job_id = _analyses.get(result_id)
+        if job_id is None:
+            job_id = _analyses[result_id] = oj.submit(add_robustness, result_id)
+        if oj.status(job_id)['state'] in (oj.PENDING, oj.RUNNING):
+            return False
+        del _analyses[result_id]  # displayed without the analysis if it failed
+        return True
+
+
+def log_timing(result_id, header, phase, timer, job_id=None):
+    """Store the spans of a phase with a result (see extract_timing) and write them to the log of its run, once per job
+    displaying the result (a result found in the cache is shared by several jobs)."""
+    spans = timer.result()
+    ors.put_timing(result_id, phase, spans)
+    if header.get('log_run') is not None and ors.mark(result_id, 'logged:{}:{}'.format(phase, job_id or result_id)):
+        fh = ola.ArchiveHandler(header['log_run'])
+        logger = logging.getLogger(__name__)
+        message = '{} timing: {}'.format(phase, otm.summary(spans))
+        fh.handle(logger.makeRecord(logger.name, logging.INFO, __file__, 0, message, None, None))
+        fh.close()
+
+
+def extract_figure(result_id, w, h, x_range=None, job_id=None):
+    """Figure of a result sized to the chart (see figure/downsample), x_range being the dates of the zoomed range and
+    job_id the job displaying the result (see log_timing)."""
     try:
-        ts = json.loads(json_ts)
-        df_r = pd.read_json(ts['returns'], typ='series').rename('return')
-        fig = ots.create_figure(df_r, ts['title'])
+        timer = otm.Timer()
+        with timer.span('Load result'):
+            df_r = ors.get_returns(result_id).rename('return')
+            header = ors.get_header(result_id)
+        with timer.span('create_figure'):
+            fig = ots.create_figure(
+                df_r, header['title'], header.get('robustness'),
+                width=int(float(w)) if oc.cfg['figure']['downsample'] else None,
+                x_range=x_range,
+                webgl_points=int(oc.cfg['figure']['webgl_points']))
         fig['layout'].update(autosize=True, width=w, height=h)
+        if x_range is None:
+            log_timing(result_id, header, 'Figure', timer, job_id)
 
         return fig
     except:
         return []
 
 
-def extract_statistic(json_ts):
+def zoom_range(relayout_data):
+    """Dates of the range displayed by the drawdown or underwater plot after a zoom/pan of the chart
+
+    :param relayout_data: dict - relayoutData of the chart
+    :return: tuple - First and last dates, 'auto' if the zoom has been reset, None if the x-axes did not change
+    """
+    data = relayout_data or {}
+    for axis in ('xaxis', 'xaxis2'):
+        if data.get(axis + '.autorange'):
+            return 'auto'
+        if axis + '.range[0]' in data and axis + '.range[1]' in data:
+            return data[axis + '.range[0]'], data[axis + '.range[1]']
+        if axis + '.range' in data:
+            return tuple(data[axis + '.range'])
+    return None
+
+
+def extract_statistic(result_id, job_id=None):
+    """Statistic of a result, job_id being the job displaying the result (see log_timing)."""
     try:
-        ts = json.loads(json_ts)
-        return ts['statistic']
+        timer = otm.Timer()
+        with timer.span('Load statistic'):
+            header = ors.get_header(result_id)
+        if header is None:
+            raise KeyError(result_id)  # expired
+        log_timing(result_id, header, 'Statistic', timer, job_id)
+        return header['statistic']
     except:
         return dict(
             Curve={
@@ -167,19 +481,25 @@ def extract_statistic(json_ts):
             })
 
 
-def get_users_list():
+def extract_timing(result_id):
+    """Timing spans of the phases of a result and the log run of its profile (None if not profiled)."""
     try:
-        with open(users_file) as data_file:
-            data = json.load(data_file)
-            return data
+        header = ors.get_header(result_id)
+        if header is None:
+            return {}, None
+        return ors.get_timing(result_id, otm.PHASES), header.get('profile')
     except:
-        return {}
+        return {}, None
+
+
+def get_users_list():
+    return oau.users()
 
 
 def add_user(username, password):
     users = get_users_list()
     users[username] = password
-    with open(users_file, 'w') as outfile:
+    with open(oau.users_file, 'w') as outfile:
         json.dump(users, outfile, indent=2)
 
 
@@ -1,8 +1,37 @@
 import backtrader as bt
 
+import omega_ui.analyzers as oan
+import omega_ui.configuration as oc
+import omega_ui.datastore as ods
+import omega_ui.live as olive
+import omega_ui.timing as otm
+
+
+_window = {'fromdate': None, 'todate': None}
+
+
+def set_window(fromdate, todate):
+    """Restrict the data loaded by Backtest.load_data to a date range (walk-forward windows), None to remove it."""
+    _window['fromdate'] = fromdate
+    _window['todate'] = todate
+
+
+class Cerebro(bt.Cerebro):
+    """Cerebro timing its run (and profiling it when logging/profile is set, see omega_ui.timing)."""
+    def run(self, **kwargs):
+        with otm.span('Cerebro run'):
+            return otm.profiled(bt.Cerebro.run, self, **kwargs)
+
 
 class Backtest(object):
-    """Backtest class - Inherit and implement this class to run a backtest."""
+    """Backtest class - Inherit and implement this class to run a backtest.
+
+    Set symbol_independent to True if the strategies treat each symbol independently: a backtest on several symbols is
+    then run as one job per symbol (with the cash split according to get_weights) and the results are merged into one
+    portfolio.
+    """
+    symbol_independent = False
+
     def __init__(self):
         pass
 
@@ -22,6 +51,34 @@ class Backtest(object):
         """
         pass
 
+    def get_weights(self, symbols):
+        """Get the weights used to split the cash between the symbols (symbol independent backtests only)
+
+        :param symbols: list - List of symbols
+        :return: dict - Weight per symbol (normalized to 1)
+        """
+        configured = oc.cfg['backtest'].get('weights') or {}
+        weights = {s: float(configured.get(s, 1.0)) for s in symbols}
+        total = sum(weights.values())
+        return {s: w / total for s, w in weights.items()}
+
+    def get_date_range(self, symbols):
+        """Get the first and last dates of the data of the symbols (required by the walk-forward analysis)
+
+        :param symbols: list - List of symbols
+        :return: tuple - First and last dates (datetime), None if unknown
+        """
+        return None
+
+    def get_data_fingerprint(self, symbols):
+        """Get a fingerprint of the data used for the symbols (e.g. file sizes and modification times). Cached results
+        of a backtest are discarded when the fingerprint changes.
+
+        :param symbols: list - List of symbols
+        :return: string - Fingerprint of the data, None to disable caching
+        """
+        return None
+
     def run(self, symbols, cash, strategy, **params):
         """Run a backtest
 
@@ -33,19 +90,46 @@ class Backtest(object):
         """
         pass
 
+    @staticmethod
+    def load_data(path, fromdate=None, todate=None, **kwargs):
+        """Get a feed for a CSV file (first column being the dates). The file is converted once into the columnar
+        data store and the memory-mapped bars are shared across runs (until the file is modified). During a walk-forward
+        analysis the feed is sliced to the window being run.
+
+        :param path: string - Path of the CSV file
+        :param fromdate: datetime - First date of the feed (optional)
+        :param todate: datetime - Last date of the feed (optional)
+        :param kwargs: dict - Extra parameters of bt.feeds.PandasData
+        :return: object - bt.feeds.PandasData
+        """
+        if _window['fromdate'] is not None:
+            fromdate = max(fromdate, _window['fromdate']) if fromdate is not None else _window['fromdate']
+        if _window['todate'] is not None:
+            todate = min(todate, _window['todate']) if todate is not None else _window['todate']
+        with otm.span('Data loading'):
+            return ods.store().feed(path, fromdate, todate, **kwargs)
+
     @staticmethod
     def setup_cerebro(cash):
-        """Setup a Cerebro instance with a starting cash value and all the necessary analyzers.
+        """Setup a Cerebro instance with a starting cash value and all the necessary analyzers. When the backtest is
+        run from the UI, the portfolio value is also streamed to the chart while cerebro is running. A cancelled job
+        stops its backtest (live.StopCheck) whether the portfolio value is streamed or not.
 
         :param cash: float - Starting cash value
         :return: object - Cerebro
         """
         # Setup Cerebro
-        cerebro = bt.Cerebro()
+        cerebro = Cerebro()
         cerebro.broker.setcash(cash)
         cerebro.addanalyzer(bt.analyzers.PyFolio, _name='pyfolio')
         cerebro.addanalyzer(bt.analyzers.DrawDown, _name='drawdown')
+        # Not used by the statistics (see omega_ui.statistics), kept for the strategies and scripts reading them
         cerebro.addanalyzer(bt.analyzers.SQN, _name='SQN')
         cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name='trades')
+        cerebro.addanalyzer(oan.TradeList, _name='tradelist')
+        cerebro.addanalyzer(olive.StopCheck, _name='stopcheck', interval_ms=float(oc.cfg['live']['stop_interval_ms']))
+        if olive.enabled():
+            cerebro.addanalyzer(olive.LiveEquity, _name='live', bars=int(oc.cfg['live']['bars']),
+                                interval_ms=float(oc.cfg['live']['interval_ms']))
 
         return cerebro
@@ -0,0 +1,54 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import omega_ui.tearsheet as ots
+
+
+"""Benchmark of tearsheet.create_figure
+
+Times the construction of the tearsheet figure for 5, 30 and 100 years of daily returns.
+
+Usage: python -m omega_ui.benchmarks.figure [--repeat N]
+"""
+YEARS = (5, 30, 100)
+
+
+def synthetic_returns(years, seed=0):
+    """Random daily returns (business days) over a number of years
+
+    :param years: int - Number of years
+    :param seed: int - Seed of the random generator
+    :return: pd.Series - Daily returns, noncumulative
+    """
+    index = pd.bdate_range('1900-01-01', periods=252 * years, tz='UTC')
+    values = np.random.RandomState(seed).normal(0.0004, 0.01, len(index))
+    return pd.Series(values, index=index, name='return')
+
+
+def run(years=YEARS, repeat=5):
+    """Best build time of create_figure in seconds for each number of years."""
+    result = {}
+    for y in years:
+        returns = synthetic_returns(y)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            ots.create_figure(returns, 'Benchmark')
+            timings.append(time.perf_counter() - start)
+        result[y] = min(timings)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of tearsheet.create_figure.')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of builds per history length')
+    args = parser.parse_args()
+    for y, seconds in run(repeat=args.repeat).items():
+        print('{:>4} years: {:8.1f} ms'.format(y, seconds * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import fakeredis
+import numpy as np
+import pandas as pd
+
+import omega_ui.backtest as obt
+import omega_ui.benchmarks.figure as obf
+import omega_ui.configuration as oc
+import omega_ui.connections as oconn
+import omega_ui.datastore as ods
+import omega_ui.results as ors
+import omega_ui.robustness as orb
+import omega_ui.tearsheet as ots
+
+
+"""Benchmark suite of the backtest-to-render pipeline
+
+Times every stage from the data to the tearsheet (CSV ingestion, backend.create_ts on the bundled test data and on
+synthetic minute bars, create_statistic, the robustness analysis, create_figure, extract_figure/extract_statistic and
+the socket log forwarding) and measures their peak memory (tracemalloc, Python and NumPy allocations). Everything runs
+offline: Redis is replaced by fakeredis and the logs, data and cache go to a temporary directory.
+
+Baselines are stored in benchmarks/baselines.json (--save), the other runs are compared to them and the stages slower
+(or using more memory) by more than the threshold are flagged, --check exits with status 1 if any.
+
+The million-bar backtest (SLOW_STAGE) is only run with --slow and timed once: it takes over an hour with its memory
+measurement and peaks at about 3 GB.
+
+Usage: python -m omega_ui.benchmarks.pipeline [--bars N] [--backtest-bars N] [--records N] [--repeat N]
+    [--only TEXT] [--threshold PCT] [--slow] [--save] [--check]
+"""
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+MODULE = 'omega_ui.tests.test_backtest'
+STRATEGY = 'TestStrategy'
+CASH = 100000.0
+SOCKET_STAGES = ('socket/publish', 'socket/forward')
+SLOW_BARS = 1000000
+SLOW_STAGE = 'create_ts/synthetic {:,} bars'.format(SLOW_BARS)
+
+
+def measure(fn, repeat=3, setup=None):
+    """Best time of a function and its peak memory (measured in a separate run as tracemalloc slows the code down)
+
+    :param fn: function - Function to measure
+    :param repeat: int - Number of timed runs
+    :param setup: function - Function called (untimed) before every run, returning the arguments of fn
+    :return: dict - Seconds and peak MB
+    """
+    timings = []
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    args = setup() if setup else ()
+    tracemalloc.start()
+    try:
+        fn(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'seconds': round(min(timings), 4), 'peak_mb': round(peak / 1024 / 1024, 2)}
+
+
+def synthetic_bars(path, n, seed=0):
+    """Write a CSV file of random minute bars (same columns as the test data)
+
+    :param path: string - Path of the CSV file
+    :param n: int - Number of bars
+    :param seed: int - Seed of the random generator
+    """
+    rng = np.random.RandomState(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, n)))
+    open_ = np.append(100, close[:-1])
+    spread = np.abs(rng.normal(0, 0.0005, (2, n)))
+    pd.DataFrame({
+        'Open': open_,
+        'High': np.maximum(open_, close) * (1 + spread[0]),
+        'Low': np.minimum(open_, close) * (1 - spread[1]),
+        'Close': close,
+        'Volume': rng.randint(100, 10000, n)
+    }, index=pd.date_range('2000-01-03', periods=n, freq='min')).to_csv(path, index_label='Date', float_format='%.4f')
+
+
+class SyntheticBacktest(obt.Backtest):
+    """Backtest of a file written by synthetic_bars (replaces backend.backtest for the synthetic stages)."""
+    def __init__(self, path):
+        obt.Backtest.__init__(self)
+        self.path = path
+
+    def get_symbols(self):
+        return ['Synthetic']
+
+    def run(self, symbols, cash, strategy, **params):
+        cerebro = obt.Backtest.setup_cerebro(cash)
+        cerebro.adddata(self.load_data(self.path))
+        cerebro.addstrategy(strategy, **params)
+        results = cerebro.run()
+        return cerebro.broker.getvalue() - cash, results[0]
+
+
+def setup(root):
+    """Point the logs, data and cache to a directory and Redis to a fake one
+
+    :param root: string - Temporary directory
+    :return: module - omega_ui.backend (imported once configured, it creates its log directory on import)
+    """
+    for section in ('logging', 'data', 'cache'):
+        oc.cfg[section]['root'] = os.path.join(root, section)
+        os.makedirs(oc.cfg[section]['root'], exist_ok=True)
+    oc.cfg['backtest']['warm_up'] = False
+    redis = fakeredis.FakeStrictRedis()
+    oconn.redis_client = lambda: redis
+    import omega_ui.backend as ob
+    return ob
+
+
+def _create_ts(ob, symbols):
+    result_id = ob.create_ts('bench', MODULE, STRATEGY, symbols, {'Cash': str(CASH)})
+    if not result_id:
+        raise RuntimeError('create_ts failed for {}'.format(symbols))
+    return result_id
+
+
+def _extract_figure(ob, result_id):
+    figure = ob.extract_figure(result_id, 1200, 1600)
+    if not figure or not figure['data']:
+        raise RuntimeError('extract_figure failed for {}'.format(result_id))  # it returns [] on errors
+    return figure
+
+
+def stages(ob, root, args):
+    """Stages of the pipeline
+
+    :return: list - (name, function, setup) tuples, see measure
+    """
+    csv = os.path.join(root, 'Synthetic.csv')
+    synthetic_bars(csv, args.bars)
+    backtest_csv = os.path.join(root, 'SyntheticBacktest.csv')
+    synthetic_bars(backtest_csv, args.backtest_bars)
+    store = ods.DataStore(oc.cfg['data']['root'])
+    store.ingest(csv)
+    strategy = getattr(__import__(MODULE, fromlist=[STRATEGY]), STRATEGY)
+    _, strat = ob.get_backtest().run(['AAPL'], CASH, strategy)
+    returns = strat.analyzers.getbyname('pyfolio').get_pf_items()[0]
+    result_id = _create_ts(ob, ['AAPL'])  # analyzed by create_ts, extract_* read the stored analysis
+
+    def synthetic_create_ts(path=backtest_csv):
+        default, ob.backtest = ob.get_backtest(), SyntheticBacktest(path)
+        try:
+            _create_ts(ob, ['Synthetic'])
+        finally:
+            ob.backtest = default
+
+    def robustness():
+        header = ors.get_header(result_id)
+        orb.analyze(returns, (header.get('trades') or {}).get('trades'), CASH)
+
+    result = [
+        ('datastore/ingest {:,} bars'.format(args.bars), lambda: store.ingest(csv, force=True), None),
+        ('datastore/frame {:,} bars'.format(args.bars),
+         lambda: ods.DataStore(oc.cfg['data']['root']).frame(csv), None),
+    ]
+    for symbols in (['AAPL'], ['MSFT'], ['TestData'], ['AAPL', 'MSFT', 'TestData']):
+        result.append(('create_ts/{}'.format('+'.join(symbols)), lambda s=symbols: _create_ts(ob, s), None))
+    result += [
+        ('create_ts/synthetic {:,} bars'.format(args.backtest_bars), synthetic_create_ts, None),
+        ('create_statistic/AAPL', lambda: ots.create_statistic(returns, strat), None),
+        ('robustness/AAPL', robustness, None),
+    ]
+    if args.slow and args.only in SLOW_STAGE:
+        slow_csv = os.path.join(root, 'SyntheticSlow.csv')
+        synthetic_bars(slow_csv, SLOW_BARS)
+        result.append((SLOW_STAGE, lambda: synthetic_create_ts(slow_csv), None))
+    for years in obf.YEARS:
+        series = obf.synthetic_returns(years)
+        result.append(('create_figure/{}y'.format(years), lambda s=series: ots.create_figure(s, 'Benchmark'), None))
+    result += [
+        ('extract_figure/AAPL', lambda: _extract_figure(ob, result_id), None),
+        ('extract_statistic/AAPL', lambda: ob.extract_statistic(result_id), None),
+    ]
+    return result
+
+
+def socket_stages(args):
+    """Socket forwarding stages, run in another process (see benchmarks.socket_forwarding)."""
+    package = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in (package, os.environ.get('PYTHONPATH')) if p))
+    process = subprocess.run(
+        [sys.executable, '-m', 'omega_ui.benchmarks.socket_forwarding', '--records', str(args.records), '--repeat',
+         str(args.repeat), '--json'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    if process.returncode != 0:
+        print('Socket forwarding benchmark failed:\n{}'.format(process.stderr.decode('utf8', 'replace')))
+        return {}
+    return json.loads(process.stdout.decode('utf8').strip().splitlines()[-1])
+
+
+def _print(name, stage):
+    print('{:<36} {:10.1f} ms {:10.1f} MB'.format(name, stage['seconds'] * 1000, stage['peak_mb']))
+
+
+def run(args):
+    """Measure the stages selected by args.only
+
+    :return: dict - Seconds and peak MB of every stage
+    """
+    result = {}
+    with tempfile.TemporaryDirectory() as root:
+        ob = setup(root)
+        for name, fn, prepare in stages(ob, root, args):
+            if args.only in name:
+                result[name] = measure(fn, 1 if name == SLOW_STAGE else args.repeat, prepare)
+                _print(name, result[name])
+    if any(args.only in name for name in SOCKET_STAGES):
+        for name, stage in socket_stages(args).items():
+            if args.only in name:
+                result[name] = stage
+                _print(name, stage)
+    return result
+
+
+def load_baselines(path=BASELINES):
+    if not os.path.exists(path):
+        return {'meta': {}, 'stages': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baselines(result, args, path=BASELINES):
+    """Store the result as baselines (stages which were not run keep their baseline)."""
+    baselines = load_baselines(path)
+    baselines['meta'] = {
+        'created': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'bars': args.bars,
+        'backtest_bars': args.backtest_bars,
+        'records': args.records,
+        'repeat': args.repeat
+    }
+    baselines['stages'].update(result)
+    with open(path, 'w') as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare(result, baselines, threshold):
+    """Print the result against the baselines
+
+    :param result: dict - Result of run
+    :param baselines: dict - Baselines (see save_baselines)
+    :param threshold: float - Increase (%) of the time or memory of a stage flagged as a regression
+    :return: list - Names of the regressed stages
+    """
+    def change(current, base):
+        return (current - base) / base * 100 if base else 0.0
+
+    meta = baselines.get('meta') or {}
+    if meta:
+        print('\nBaselines of {} (Python {}, {})'.format(meta.get('created'), meta.get('python'), meta.get('platform')))
+    print('{:<36} {:>10} {:>10} {:>8} {:>10} {:>10} {:>8}'.format(
+        'Stage', 'ms', 'base', 'change', 'MB', 'base', 'change'))
+    regressions = []
+    for name, stage in result.items():
+        base = baselines.get('stages', {}).get(name)
+        if base is None:
+            print('{:<36} {:10.1f} {:>10} {:>8} {:10.1f} {:>10} {:>8}'.format(
+                name, stage['seconds'] * 1000, '-', 'new', stage['peak_mb'], '-', 'new'))
+            continue
+        time_change = change(stage['seconds'], base['seconds'])
+        memory_change = change(stage['peak_mb'], base['peak_mb'])
+        regressed = time_change > threshold or memory_change > threshold
+        if regressed:
+            regressions.append(name)
+        print('{:<36} {:10.1f} {:10.1f} {:+7.1f}% {:10.1f} {:10.1f} {:+7.1f}%{}'.format(
+            name, stage['seconds'] * 1000, base['seconds'] * 1000, time_change, stage['peak_mb'], base['peak_mb'],
+            memory_change, '  <- regression' if regressed else ''))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark suite of the backtest-to-render pipeline.')
+    parser.add_argument('--bars', type=int, default=1000000, help='Number of synthetic bars ingested in the datastore')
+    parser.add_argument('--backtest-bars', type=int, default=50000, help='Number of synthetic bars backtested')
+    parser.add_argument('--records', type=int, default=200000, help='Number of log records forwarded by the socket')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timed runs per stage (best one is kept)')
+    parser.add_argument('--only', default='', help='Run only the stages whose name contains this text')
+    parser.add_argument('--threshold', type=float, default=20.0, help='Regression threshold in percent')
+    parser.add_argument('--slow', action='store_true', help='Also run create_ts on {:,} bars'.format(SLOW_BARS))
+    parser.add_argument('--save', action='store_true', help='Store the result as baselines')
+    parser.add_argument('--check', action='store_true', help='Exit with status 1 if a stage regressed')
+    args = parser.parse_args()
+    result = run(args)
+    if args.save:
+        save_baselines(result, args)
+        print('Baselines saved to {}'.format(BASELINES))
+        return
+    regressions = compare(result, load_baselines(), args.threshold)
+    if regressions:
+        print('\n{} regression(s): {}'.format(len(regressions), ', '.join(regressions)))
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
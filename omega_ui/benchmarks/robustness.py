@@ -0,0 +1,46 @@
+import argparse
+import time
+import tracemalloc
+
+import omega_ui.benchmarks.figure as obf
+import omega_ui.robustness as orb
+
+
+"""Benchmark of robustness.bootstrap
+
+Times the block bootstrap of 20 years of daily returns and measures its peak memory for several chunk sizes.
+
+Usage: python -m omega_ui.benchmarks.robustness [--paths N] [--repeat N]
+"""
+CHUNKS = (0, 1000, 250)
+
+
+def run(paths=10000, years=20, chunks=CHUNKS, repeat=3):
+    """Best time (seconds) and peak memory (MB) of the bootstrap for each chunk size."""
+    returns = obf.synthetic_returns(years).values
+    result = {}
+    for chunk in chunks:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            orb.bootstrap(returns, paths, chunk=chunk)
+            timings.append(time.perf_counter() - start)
+        tracemalloc.start()
+        orb.bootstrap(returns, paths, chunk=chunk)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        result[chunk] = (min(timings), peak / 1024 / 1024)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of robustness.bootstrap.')
+    parser.add_argument('--paths', type=int, default=10000, help='Number of paths')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs per chunk size')
+    args = parser.parse_args()
+    for chunk, (seconds, mb) in run(paths=args.paths, repeat=args.repeat).items():
+        print('chunk {:>5}: {:8.1f} ms {:8.1f} MB'.format(chunk or 'all', seconds * 1000, mb))
+
+
+if __name__ == '__main__':
+    main()
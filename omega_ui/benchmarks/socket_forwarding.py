@@ -0,0 +1,94 @@
+import argparse
+import json
+import logging
+
+import fakeredis
+
+import omega_ui.benchmarks.pipeline as obp
+import omega_ui.configuration as oc
+import omega_ui.log_handlers as olh
+import omega_ui.socket_logging as osl
+
+
+"""Benchmark of the socket log forwarding
+
+Publishes log records with log_handlers.RedisBatchHandler to fakeredis and times how fast the dispatcher of the
+socket server drains and forwards them (Socket.IO emits are counted, not sent). Importing socket_logging monkey patches
+the standard library with eventlet, benchmarks.pipeline runs this benchmark in its own process.
+
+Usage: python -m omega_ui.benchmarks.socket_forwarding [--records N] [--repeat N] [--json]
+"""
+UID = 'bench'
+LEVELS = (logging.DEBUG,) * 8 + (logging.INFO, logging.WARNING)
+
+
+def synthetic_records(n):
+    """Log records of a backtest (mostly DEBUG, as TestStrategy logs every bar)."""
+    logger = logging.getLogger('omega_ui.tests.test_backtest')
+    return [logger.makeRecord(logger.name, LEVELS[i % len(LEVELS)], __file__, 0,
+                              '2018-01-01 - Close price: {}'.format(100 + i % 50), None, None) for i in range(n)]
+
+
+def publish(redis, records, batch_size):
+    handler = olh.RedisBatchHandler('l' + UID, redis)
+    for start in range(0, len(records), batch_size):
+        handler.handle_batch(records[start:start + batch_size])
+
+
+def forward(pubsub, max_drain):
+    """Drain and forward the pending messages like Dispatcher.run (without the sleeps between batches)."""
+    messages = osl.drain(pubsub, max_drain)
+    while messages:
+        osl.dispatcher.forward(UID, messages)
+        messages = osl.drain(pubsub, max_drain)
+
+
+def run(records=200000, repeat=3):
+    """Time and peak memory of publishing and of forwarding the records (see pipeline.measure)."""
+    emitted = []
+    osl.socketio.emit = lambda event, data, **kwargs: emitted.append(len(data.get('records', ())))
+    batch_size = int(oc.cfg['logging']['batch_size'])
+    max_drain = int(oc.cfg['socket']['max_drain'])
+    items = synthetic_records(records)
+
+    def subscribed():
+        redis = fakeredis.FakeStrictRedis()
+        pubsub = redis.pubsub()
+        pubsub.psubscribe('l*')
+        return redis, pubsub
+
+    def published():
+        redis, pubsub = subscribed()
+        publish(redis, items, batch_size)
+        return (pubsub,)
+
+    publish_stage = obp.measure(lambda r, _: publish(r, items, batch_size), repeat, subscribed)
+    forward_stage = obp.measure(lambda p: forward(p, max_drain), repeat, published)
+    for stage in (publish_stage, forward_stage):
+        stage['records_per_s'] = round(records / stage['seconds']) if stage['seconds'] else None
+    del emitted[:]
+    forward(published()[0], max_drain)
+    forward_stage['emitted'] = sum(emitted)
+    return {
+        'socket/publish {:,} records'.format(records): publish_stage,
+        'socket/forward {:,} records'.format(records): forward_stage
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the socket log forwarding.')
+    parser.add_argument('--records', type=int, default=200000, help='Number of log records')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs')
+    parser.add_argument('--json', action='store_true', help='Print the result as JSON (see benchmarks.pipeline)')
+    args = parser.parse_args()
+    result = run(args.records, args.repeat)
+    if args.json:
+        print(json.dumps(result))
+        return
+    for name, stage in result.items():
+        print('{:<32} {:8.1f} ms {:8.1f} MB {:>10,} records/s'.format(
+            name, stage['seconds'] * 1000, stage['peak_mb'], stage['records_per_s']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+import argparse
+import sys
+import time
+
+import empyrical as ep
+import numpy as np
+import pandas as pd
+
+import omega_ui.benchmarks.figure as obf
+import omega_ui.statistics as ost
+import omega_ui.tearsheet as ots
+
+
+"""Benchmark and equivalence check of the statistics engine
+
+Checks that omega_ui.statistics gives the same metrics as empyrical (Curve metrics of the daily returns) and as pandas
+(returns compounded per day, month and year with groupbys, trade analysis in the format of bt.analyzers.TradeAnalyzer)
+on daily and intraday returns, then times tearsheet.statistic against this reference for 5, 30 and 100 years of daily
+returns (the number of runs per second is the rate of a parameter sweep computing its statistics).
+
+The Time metrics compound the daily returns per month and year; the former create_statistic summed them, so Winning
+Months %, the Average Winning/Losing Month %, Best/Worst Month % and Best/Worst Year % differ from its output
+(tests/test_statistics.py lists the values that moved on AAPL).
+
+Usage: python -m omega_ui.benchmarks.statistics [--trades N] [--repeat N]
+"""
+RTOL = 1e-9
+
+
+def synthetic_trades(index, n, seed=0):
+    """Closed trades (close date, net PnL, length in bars, symbol) spread over the dates of an index."""
+    random = np.random.RandomState(seed)
+    dates = np.sort(random.choice(len(index), n))
+    pnls = random.normal(20, 500, n)
+    lengths = random.randint(1, 30, n)
+    return [[index[d].isoformat(), float(p), int(l), 'Synthetic'] for d, p, l in zip(dates, pnls, lengths)]
+
+
+def synthetic_intraday(days, seed=0):
+    """Random minute returns of the regular session of business days."""
+    session = pd.timedelta_range('09:30:00', '15:59:00', freq='min')
+    index = pd.DatetimeIndex([d + t for d in pd.bdate_range('2015-01-01', periods=days) for t in session])
+    values = np.random.RandomState(seed).normal(0.00002, 0.0006, len(index))
+    return pd.Series(values, index=index, name='return')
+
+
+def reference(returns, trades, still_open=0):
+    """Metrics computed with empyrical and pandas groupbys (same keys as statistics.metrics)."""
+    index = returns.index.tz_localize(None) if returns.index.tz is not None else returns.index
+    growth = (1 + pd.Series(returns.values, index=index)).groupby(index.normalize()).prod()
+    daily = growth - 1
+    bars = np.median(np.diff(index.values[:10001]).astype('timedelta64[s]').astype(np.float64))
+    periods = next(p for limit, p in ost.PERIODS_PER_YEAR if bars < limit)
+    period = {252: ep.DAILY, 52: ep.WEEKLY, 12: ep.MONTHLY, 1: ep.YEARLY}[periods]
+    monthly = growth.groupby([daily.index.year, daily.index.month]).prod() - 1
+    yearly = growth.groupby(daily.index.year).prod() - 1
+    curve = {
+        'total_return': ep.cum_returns_final(daily),
+        'cagr': ep.cagr(daily, period=period),
+        'sharpe': ep.sharpe_ratio(daily, period=period),
+        'volatility': ep.annual_volatility(daily, period=period),
+        'r_squared': ep.stability_of_timeseries(daily)
+    }
+    frame = pd.DataFrame(trades, columns=['date', 'pnl', 'length', 'symbol'])
+    won, lost = frame[frame['pnl'] >= 0], frame[frame['pnl'] < 0]
+    total = len(frame) + still_open
+    std = frame['pnl'].std(ddof=0)
+    trade = {
+        'trades': total,
+        'winning': len(won) / total if total else 0.0,
+        'average': frame['pnl'].mean() if len(frame) else 0.0,
+        'average_win': won['pnl'].mean() if len(won) else 0.0,
+        'average_loss': lost['pnl'].mean() if len(lost) else 0.0,
+        'best': won['pnl'].max() if len(won) else 0.0,
+        'worst': lost['pnl'].min() if len(lost) else 0.0,
+        'worst_date': lost.loc[lost['pnl'].idxmin(), 'date'][:10] if len(lost) else None,
+        'average_length': frame['length'].mean() if len(frame) else 0.0,
+        'sqn': np.sqrt(len(frame)) * frame['pnl'].mean() / std if len(frame) > 1 and std > 0 else 0.0,
+        'per_year': total / (len(daily) / periods)
+    }
+    time_ = {
+        'winning_months': (monthly > 0).mean(),
+        'average_winning_month': monthly[monthly > 0].mean(),
+        'average_losing_month': monthly[monthly < 0].mean(),
+        'best_month': monthly.max(),
+        'worst_month': monthly.min(),
+        'winning_years': (yearly > 0).mean(),
+        'best_year': yearly.max(),
+        'worst_year': yearly.min()
+    }
+    return dict(curve=curve, trade=trade, time=time_)
+
+
+def compare(result, expected):
+    """Metrics of the engine which differ from the reference (relative tolerance RTOL)
+
+    :return: list - (section, metric, engine value, reference value) tuples
+    """
+    differences = []
+    for section, metrics in expected.items():
+        for name, value in metrics.items():
+            actual = result[section][name]
+            if isinstance(value, str) or value is None:
+                same = actual == value
+            else:
+                same = np.isclose(actual, value, rtol=RTOL, atol=1e-12, equal_nan=True)
+            if not same:
+                differences.append((section, name, actual, value))
+    return differences
+
+
+def cases(trades=500):
+    """(name, returns, trades, still open) cases of the equivalence check."""
+    daily = obf.synthetic_returns(30)
+    intraday = synthetic_intraday(300)
+    weekly = pd.Series(np.random.RandomState(1).normal(0.002, 0.02, 520),
+                       index=pd.date_range('2000-01-07', periods=520, freq='W-FRI'))
+    return [
+        ('daily 30y', daily, synthetic_trades(daily.index, trades), 1),
+        ('daily 30y, no trades', daily, [], 0),
+        ('minute bars 300 days', intraday, synthetic_trades(intraday.index, trades, seed=1), 0),
+        ('weekly 10y', weekly, synthetic_trades(weekly.index, trades // 10, seed=2), 0)
+    ]
+
+
+def check(trades=500):
+    """Run the equivalence check, print the differences and return their number."""
+    failures = 0
+    for name, returns, trade_list, still_open in cases(trades):
+        differences = compare(ost.metrics(returns, trade_list, still_open), reference(returns, trade_list, still_open))
+        print('{:<24} {}'.format(name, 'ok' if not differences else '{} difference(s)'.format(len(differences))))
+        for section, metric, actual, expected in differences:
+            print('    {}/{}: {} != {}'.format(section, metric, actual, expected))
+        failures += len(differences)
+    return failures
+
+
+def run(years=obf.YEARS, trades=500, repeat=20):
+    """Best time (seconds) of tearsheet.statistic and of the reference for each number of years."""
+    result = {}
+    for y in years:
+        returns = obf.synthetic_returns(y)
+        trade_list = synthetic_trades(returns.index, trades * y // 30 or 1)
+        timings = {}
+        for name, fn in (('engine', lambda: ots.statistic(returns, 10.0, 100, trade_list)),
+                         ('reference', lambda: reference(returns, trade_list))):
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                fn()
+                best = min(best, time.perf_counter() - start)
+            timings[name] = best
+        result[y] = timings
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark and equivalence check of the statistics engine.')
+    parser.add_argument('--trades', type=int, default=500, help='Number of trades of 30 years of returns')
+    parser.add_argument('--repeat', type=int, default=20, help='Number of runs per history length')
+    args = parser.parse_args()
+    failures = check(args.trades)
+    for y, timings in run(trades=args.trades, repeat=args.repeat).items():
+        print('{:>4} years: {:8.2f} ms ({:,.0f} runs/s), reference {:8.2f} ms'.format(
+            y, timings['engine'] * 1000, 1 / timings['engine'], timings['reference'] * 1000))
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+import collections
+import hashlib
+import importlib.util
+import json
+import os
+import threading
+
+import omega_ui.configuration as oc
+import omega_ui.discovery as odi
+import omega_ui.statistics as ost
+
+
+"""Cache module
+
+Content-addressed cache of backtest results. Keys are a hash of everything a result depends on (source files of the
+strategy and backtest modules, the same files that discovery watches for reloads, version of the statistics, strategy
+name, symbols, cash, parameters and a data fingerprint) so editing a strategy file invalidates its entries
+automatically. Results are kept in an in-memory LRU tier backed by a bounded on-disk tier.
+"""
+_memory = collections.OrderedDict()
+_lock = threading.Lock()
+
+
+def _root():
+    root = oc.cfg['cache']['root']
+    if not os.path.exists(root):
+        os.makedirs(root)
+    return root
+
+
+def _path(key):
+    return os.path.join(_root(), key + '.bin')
+
+
+def module_source(module_name):
+    """Hash of the source files of a module, all the .py files of a package (without importing it)."""
+    spec = importlib.util.find_spec(module_name)
+    if spec is None or spec.origin is None or not os.path.isfile(spec.origin):
+        return b''
+    h = hashlib.sha256()
+    for path in sorted(odi.source_files(spec.origin, spec.submodule_search_locations)):
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+        except OSError:
+            continue
+        h.update(os.path.relpath(path, os.path.dirname(spec.origin)).encode('utf8'))
+        h.update(hashlib.sha256(content).digest())
+    return h.digest()
+
+
+def make_key(module_name, strategy_name, symbols, params, fingerprint):
+    """Hash of the inputs of a backtest
+
+    :param module_name: string - Module of the strategy
+    :param strategy_name: string - Name of the strategy
+    :param symbols: list - List of symbols
+    :param params: dict - Parameters of the params table (including cash)
+    :param fingerprint: string - Fingerprint of the data of the symbols (see Backtest.get_data_fingerprint)
+    :return: string - Cache key
+    """
+    h = hashlib.sha256()
+    h.update(str(ost.VERSION).encode('utf8'))
+    h.update(module_source(module_name))
+    h.update(module_source(oc.cfg['default']['module']))
+    h.update(json.dumps([module_name, strategy_name, symbols, params, fingerprint], sort_keys=True).encode('utf8'))
+    return h.hexdigest()
+
+
+def get(key):
+    """Get a result from the cache
+
+    :param key: string - Cache key
+    :return: bytes - Cached result, None if not found
+    """
+    with _lock:
+        if key in _memory:
+            _memory.move_to_end(key)
+            return _memory[key]
+    path = _path(key)
+    try:
+        with open(path, 'rb') as f:
+            value = f.read()
+        os.utime(path)  # mark as recently used for the disk eviction
+    except OSError:
+        return None
+    _put_memory(key, value)
+    return value
+
+
+def _put_memory(key, value):
+    with _lock:
+        _memory[key] = value
+        _memory.move_to_end(key)
+        while len(_memory) > int(oc.cfg['cache']['memory_entries']):
+            _memory.popitem(last=False)
+
+
+def put(key, value):
+    """Store a result in both tiers of the cache
+
+    :param key: string - Cache key
+    :param value: bytes - Serialized result (see results.dumps)
+    """
+    _put_memory(key, value)
+    path = _path(key)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(value)
+    os.replace(tmp, path)
+    _evict_disk()
+
+
+def _evict_disk():
+    """Remove the least recently used files until the disk tier fits in its budget."""
+    limit = float(oc.cfg['cache']['disk_mb']) * 1024 * 1024
+    entries = []
+    for entry in os.scandir(_root()):
+        if entry.name.endswith('.bin'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+
+def clear():
+    """Empty both tiers of the cache."""
+    with _lock:
+        _memory.clear()
+    for entry in os.scandir(_root()):
+        if entry.name.endswith('.bin'):
+            os.remove(entry.path)
@@ -1,28 +1,65 @@
+import collections.abc
 import os
 import sys
+import threading
 import yaml
 
+import omega_ui.startup as osu
+
 
 """Configuration module
 
-This module is used to load the configuration as defined in the config file.
+This module is used to load the configuration as defined in the config file. The file is read the first time a value
+is used (not when the module is imported).
 """
-cfg = []
 
 
-def initialization():
-    """Read and return configuration file."""
-    global cfg
+class Configuration(collections.abc.MutableMapping):
+    """Sections of the configuration file, read on first access.
+
+    :param path: string - Path of the configuration file
+    """
+    def __init__(self, path):
+        self.path = path
+        self._sections = None
+        self._lock = threading.Lock()
+
+    def sections(self):
+        if self._sections is None:
+            with self._lock:
+                if self._sections is None:
+                    self._sections = self.read()
+        return self._sections
+
+    def read(self):
+        """Read and return configuration file."""
+        with osu.step('Configuration'):
+            try:
+                with open(self.path, 'r') as y_cfg:
+                    return yaml.safe_load(y_cfg)
+            except FileNotFoundError:
+                print('Configuration file not found!')
+                sys.exit(1)
+
+    def __getitem__(self, key):
+        return self.sections()[key]
 
-    # Configuration
-    root = os.path.abspath(os.path.dirname(__file__))
-    try:
-        with open(os.path.join(root, 'omega_ui.config'), 'r') as y_cfg:
-            cfg = yaml.load(y_cfg)
-    except FileNotFoundError:
-        print('Configuration file not found!')
-        sys.exit(1)
+    def __setitem__(self, key, value):
+        self.sections()[key] = value
 
+    def __delitem__(self, key):
+        del self.sections()[key]
 
-# Read configuration
-initialization()
+    def __iter__(self):
+        return iter(self.sections())
+
+    def __len__(self):
+        return len(self.sections())
+
+
+cfg = Configuration(os.path.join(os.path.abspath(os.path.dirname(__file__)), 'omega_ui.config'))
+
+
+def initialization():
+    """Read the configuration file again."""
+    cfg._sections = cfg.read()
@@ -0,0 +1,45 @@
+import os
+import threading
+
+import redis
+
+import omega_ui.configuration as oc
+
+
+"""Connections module
+
+Redis connection pool shared by all the modules of a process (Dash callbacks, backend, result store, socket server).
+"""
+_pool = None
+_pid = None
+_lock = threading.Lock()
+
+
+def _connection_pool():
+    global _pool, _pid
+    with _lock:
+        # Connections must not be shared with the worker processes forked by the job pool
+        if _pool is None or _pid != os.getpid():
+            _pool = redis.ConnectionPool(
+                host=oc.cfg['default']['redis'],
+                port=6379,
+                db=0,
+                max_connections=int(oc.cfg['default']['redis_connections']))
+            _pid = os.getpid()
+        return _pool
+
+
+def redis_client():
+    """Redis client using the connection pool of the process."""
+    return redis.StrictRedis(connection_pool=_connection_pool())
+
+
+def stats():
+    """Number of connections created, in use and available in the pool of the process."""
+    pool = _connection_pool()
+    return {
+        'created': pool._created_connections,
+        'in_use': len(pool._in_use_connections),
+        'available': len(pool._available_connections),
+        'max': pool.max_connections
+    }
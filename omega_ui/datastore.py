@@ -0,0 +1,135 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+
+import backtrader as bt
+import numpy as np
+import pandas as pd
+
+import omega_ui.configuration as oc
+
+
+"""Data store module
+
+CSV files are converted once into a binary columnar format (a column-major float64 matrix and an int64 index saved as
+.npy files) which is memory-mapped, so the bars are shared by all the backtests instead of being parsed on every run.
+Converted files are versioned by the size and modification time of the CSV file.
+
+Usage: python -m omega_ui.datastore <directory> [--force] to pre-ingest all the CSV files of a directory.
+"""
+
+
+class DataStore:
+    """Columnar store of CSV market data."""
+    def __init__(self, root):
+        self.root = root
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    def _symbol_dir(self, path):
+        key = hashlib.sha1(os.path.abspath(path).encode('utf8')).hexdigest()[:16]
+        return os.path.join(self.root, '{}-{}'.format(os.path.splitext(os.path.basename(path))[0], key))
+
+    def _version_dir(self, path, stat):
+        return os.path.join(self._symbol_dir(path), '{}-{}'.format(stat.st_size, stat.st_mtime_ns))
+
+    def ingest(self, path, force=False):
+        """Convert a CSV file (first column being the dates) into the columnar format
+
+        :param path: string - Path of the CSV file
+        :param force: bool - Convert the file even if it is up to date
+        :return: string - Directory of the converted file
+        """
+        stat = os.stat(path)
+        target = self._version_dir(path, stat)
+        if os.path.exists(os.path.join(target, 'meta.json')) and not force:
+            return target
+        df = pd.read_csv(path, parse_dates=True, index_col=0).select_dtypes(include=[np.number])
+        tmp = os.path.join(self._symbol_dir(path), 'tmp-' + uuid.uuid4().hex)
+        os.makedirs(tmp)
+        index = pd.DatetimeIndex(df.index).values.astype('datetime64[ns]')
+        np.save(os.path.join(tmp, 'index.npy'), index.view(np.int64))
+        np.save(os.path.join(tmp, 'values.npy'), np.asfortranarray(df.values, dtype=np.float64))
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump({'source': os.path.abspath(path), 'columns': list(df.columns), 'rows': len(df.index)}, f)
+        if force and os.path.exists(target):
+            shutil.rmtree(target, ignore_errors=True)
+        try:
+            os.rename(tmp, target)
+        except OSError:
+            # Another process converted the same version of the file
+            shutil.rmtree(tmp, ignore_errors=True)
+        self._remove_old_versions(path, target)
+        return target
+
+    def _remove_old_versions(self, path, current):
+        for version in glob.glob(os.path.join(self._symbol_dir(path), '*')):
+            if version != current and not os.path.basename(version).startswith('tmp-'):
+                # Files might still be mapped by another process (fails on Windows), they are removed next time
+                shutil.rmtree(version, ignore_errors=True)
+
+    def frame(self, path):
+        """Get the bars of a CSV file as a DataFrame backed by memory-mapped arrays (shared across runs)
+
+        :param path: string - Path of the CSV file
+        :return: pd.DataFrame - Bars indexed by date
+        """
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        with self._lock:
+            cached = self._frames.get(key)
+            if cached is not None and cached[0] == (stat.st_size, stat.st_mtime_ns):
+                return cached[1]
+        target = self.ingest(path)
+        with open(os.path.join(target, 'meta.json')) as f:
+            meta = json.load(f)
+        index = pd.DatetimeIndex(np.load(os.path.join(target, 'index.npy')).view('datetime64[ns]'))
+        values = np.load(os.path.join(target, 'values.npy'), mmap_mode='r')
+        df = pd.DataFrame(values, index=index, columns=meta['columns'], copy=False)
+        with self._lock:
+            self._frames[key] = ((stat.st_size, stat.st_mtime_ns), df)
+        return df
+
+    def feed(self, path, fromdate=None, todate=None, **kwargs):
+        """Get a backtrader feed for a CSV file
+
+        :param path: string - Path of the CSV file
+        :param fromdate: datetime - First date of the feed (optional)
+        :param todate: datetime - Last date of the feed (optional)
+        :param kwargs: dict - Extra parameters of bt.feeds.PandasData
+        :return: object - bt.feeds.PandasData
+        """
+        df = self.frame(path)
+        if fromdate is not None or todate is not None:
+            df = df.loc[fromdate:todate]
+        return bt.feeds.PandasData(dataname=df, **kwargs)
+
+
+_store = None
+
+
+def store():
+    """Data store shared by all the backtests of a process."""
+    global _store
+    if _store is None:
+        _store = DataStore(oc.cfg['data']['root'])
+    return _store
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert the CSV files of a directory into the columnar data store.')
+    parser.add_argument('directory', help='Directory containing the CSV files (one file per symbol)')
+    parser.add_argument('--force', action='store_true', help='Convert files even if they are up to date')
+    args = parser.parse_args()
+    files = sorted(glob.glob(os.path.join(args.directory, '*.csv')))
+    for i, path in enumerate(files):
+        print('[{}/{}] {} -> {}'.format(i + 1, len(files), path, store().ingest(path, force=args.force)))
+
+
+if __name__ == '__main__':
+    main()
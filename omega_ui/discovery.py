@@ -0,0 +1,139 @@
+import copy
+import importlib
+import inspect
+import os
+import sys
+import threading
+
+import backtrader as bt
+
+
+"""Discovery module
+
+Strategy modules are imported once and only reloaded when the modification time of one of their source files changes
+(for a package, the files of its submodules are checked as well). The strategies of a module and the default
+parameters returned by Backtest.get_parameters are cached until the module is reloaded.
+"""
+_lock = threading.RLock()
+_mtimes = {}  # module name -> {path: mtime}
+_strategies = {}  # module name -> list of strategy names
+_parameters = {}  # (module name, strategy name, symbols) -> parameters
+
+
+def _module_files(module):
+    """Source files of an imported module (all the .py files under its directory for a package)."""
+    return source_files(getattr(module, '__file__', None), getattr(module, '__path__', None))
+
+
+def source_files(path, package_path=None):
+    """Source files of a module file, or of all the directories of a package
+
+    :param path: string - File of the module (module.__file__ or spec.origin), None if it has none
+    :param package_path: list - Directories of a package (module.__path__ or spec.submodule_search_locations)
+    :return: list - Paths of the .py files
+    """
+    if path is None:
+        return []
+    if package_path is None:
+        return [path]
+    files = []
+    for directory in package_path:
+        for root, _, names in os.walk(directory):
+            files.extend(os.path.join(root, name) for name in names if name.endswith('.py'))
+    return files
+
+
+def _stat(files):
+    mtimes = {}
+    for path in files:
+        try:
+            mtimes[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            pass
+    return mtimes
+
+
+def _reload(module_name):
+    """Reload the modified submodules (deepest first) then the module itself."""
+    names = [name for name in sys.modules if name.startswith(module_name + '.') and sys.modules[name] is not None]
+    for name in sorted(names, key=lambda n: n.count('.'), reverse=True):
+        submodule = sys.modules[name]
+        path = getattr(submodule, '__file__', None)
+        if path is not None and _mtimes[module_name].get(path) != _stat([path]).get(path):
+            importlib.reload(submodule)
+    return importlib.reload(sys.modules[module_name])
+
+
+def load(module_name):
+    """Import a module, or reload it if its source files have been modified since it was loaded
+
+    :param module_name: string - Name of the module
+    :return: object - Module
+    """
+    with _lock:
+        module = sys.modules.get(module_name)
+        if module is None:
+            module = importlib.import_module(module_name)
+        elif module_name in _mtimes:
+            if _stat(_mtimes[module_name]) == _mtimes[module_name] and \
+                    len(_module_files(module)) == len(_mtimes[module_name]):
+                return module
+            module = _reload(module_name)
+        else:
+            # Imported by another module, its state is unknown
+            module = importlib.reload(module)
+        _mtimes[module_name] = _stat(_module_files(module))
+        _strategies.pop(module_name, None)
+        for key in [key for key in _parameters if key[0] == module_name]:
+            del _parameters[key]
+        return module
+
+
+def strategies(module_name):
+    """Names of the strategies (bt.Strategy subclasses) of a module."""
+    with _lock:
+        module = load(module_name)
+        if module_name not in _strategies:
+            _strategies[module_name] = [
+                name for name, obj in inspect.getmembers(module, inspect.isclass)
+                if issubclass(obj, bt.Strategy) and not obj.__module__.startswith('backtrader')
+            ]
+        return list(_strategies[module_name])
+
+
+def strategy(module_name, strategy_name):
+    """Strategy class of a module (the module is reloaded if modified)."""
+    return getattr(load(module_name), strategy_name)
+
+
+def parameters(backtest, module_name, strategy_name, symbols):
+    """Default parameters of a strategy (see Backtest.get_parameters), cached until the module is modified
+
+    :param backtest: object - Backtest instance
+    :param module_name: string - Name of the module
+    :param strategy_name: string - Name of the strategy
+    :param symbols: list - List of symbols
+    :return: dict - Parameters dictionary to be displayed in the UI
+    """
+    with _lock:
+        cls = strategy(module_name, strategy_name)
+        key = (module_name, strategy_name, tuple(symbols or ()))
+        if key not in _parameters:
+            _parameters[key] = backtest.get_parameters(cls, symbols) or {}
+        return copy.deepcopy(_parameters[key])
+
+
+def warm(module_names):
+    """Import the modules and list their strategies (errors are ignored, they are raised again when the modules are
+    used)."""
+    for module_name in module_names:
+        try:
+            strategies(module_name)
+        except Exception:
+            pass
+
+
+def warm_in_background(module_names):
+    thread = threading.Thread(target=warm, args=(module_names,), daemon=True)
+    thread.start()
+    return thread
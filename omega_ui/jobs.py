@@ -0,0 +1,246 @@
+import concurrent.futures as cf
+import os
+import threading
+import time
+import uuid
+
+import omega_ui.configuration as oc
+import omega_ui.metrics as om
+
+
+"""Jobs module
+
+This module runs backtests in a pool of worker processes so that the Dash callbacks only submit work and poll for it
+instead of running cerebro inline.
+"""
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+_executor = None
+_jobs = {}
+_lock = threading.Lock()
+_current_job_id = None  # job running in this (worker) process
+
+jobs_finished = om.Counter('omega_jobs_finished_total', 'Finished jobs (cached: result found in the cache)',
+                           ['name', 'state'])
+job_wait = om.Histogram('omega_job_wait_seconds', 'Time spent by the jobs in the queue', ['name'])
+job_run = om.Histogram('omega_job_run_seconds', 'Run duration of the jobs', ['name'])
+
+
+class Job:
+    """Bookkeeping for a job submitted to the process pool."""
+    def __init__(self, name, future, job_id=None):
+        self.job_id = job_id or uuid.uuid4().hex
+        self.name = name
+        self.future = future
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.cancel_requested = False
+        self.cached = False
+        self.error = None
+
+    def state(self):
+        if self.future.cancelled() or (self.cancel_requested and self.future.done()):
+            return CANCELLED
+        if self.future.done():
+            # From the future itself: the done callback setting error may not have run yet
+            return FAILED if self.future.exception() is not None else DONE
+        if self.future.running():
+            return RUNNING
+        return PENDING
+
+    def timings(self):
+        """Queue wait, run and total durations in seconds (None while unknown)."""
+        end = self.finished or time.time()
+        start = self.started
+        if start is None and self.future.done():
+            start = end
+        return {
+            'wait': round((start or time.time()) - self.submitted, 3),
+            'run': None if start is None else round(end - start, 3),
+            'total': round(end - self.submitted, 3)
+        }
+
+
+def _execute(job_id, fn, args, kwargs):
+    """Run a job inside a worker process and return its start/end times with the result."""
+    global _current_job_id
+    started = time.time()
+    _current_job_id = job_id
+    try:
+        value = fn(*args, **kwargs)
+    finally:
+        _current_job_id = None
+    return started, time.time(), value
+
+
+def current_job_id():
+    """Id of the job being run by this worker process (None outside of a job)."""
+    return _current_job_id
+
+
+def _on_done(job, future):
+    job.finished = time.time()
+    if not future.cancelled():
+        try:
+            job.started, job.finished, _ = future.result()
+        except Exception as e:
+            job.error = str(e)
+    jobs_finished.inc(name=job.name, state=job.state())
+    if job.started is not None:
+        job_wait.observe(job.started - job.submitted, name=job.name)
+        job_run.observe(job.finished - job.started, name=job.name)
+
+
+def _pool():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = cf.ProcessPoolExecutor(max_workers=workers())
+        return _executor
+
+
+def workers():
+    """Number of worker processes (all cores if not configured)."""
+    return int(oc.cfg['jobs']['workers']) or os.cpu_count()
+
+
+def _prune():
+    """Forget finished jobs which are older than the configured retention."""
+    limit = time.time() - float(oc.cfg['jobs']['retention'])
+    with _lock:
+        for job_id in [k for k, j in _jobs.items() if j.future.done() and (j.finished or j.submitted) < limit]:
+            del _jobs[job_id]
+
+
+def submit(fn, *args, **kwargs):
+    """Submit a function to the process pool
+
+    :param fn: function - Module level function to run in a worker process
+    :param args: list - Positional arguments of the function
+    :param kwargs: dict - Keyword arguments of the function
+    :return: string - Job id
+    """
+    global _executor
+    _prune()
+    job_id = uuid.uuid4().hex
+    try:
+        future = _pool().submit(_execute, job_id, fn, args, kwargs)
+    except cf.process.BrokenProcessPool:
+        # A worker died (e.g. killed by the OS), start a fresh pool
+        with _lock:
+            _executor = None
+        future = _pool().submit(_execute, job_id, fn, args, kwargs)
+    job = Job(getattr(fn, '__name__', str(fn)), future, job_id)
+    with _lock:
+        _jobs[job.job_id] = job
+    future.add_done_callback(lambda f: _on_done(job, f))
+    return job.job_id
+
+
+def completed(name, value):
+    """Register a job which is already done (e.g. a result found in the cache)
+
+    :param name: string - Name of the job
+    :param value: object - Result of the job
+    :return: string - Job id
+    """
+    _prune()
+    now = time.time()
+    future = cf.Future()
+    future.set_running_or_notify_cancel()
+    future.set_result((now, now, value))
+    job = Job(name, future)
+    job.started, job.finished, job.cached = now, now, True
+    with _lock:
+        _jobs[job.job_id] = job
+    jobs_finished.inc(name=name, state='cached')
+    return job.job_id
+
+
+def add_done_callback(job_id, fn):
+    """Call fn with the result of a job once it is done (not called if the job fails or is cancelled)."""
+    job = _jobs[job_id]
+
+    def on_done(future):
+        if not future.cancelled() and future.exception() is None and not job.cancel_requested:
+            fn(future.result()[2])
+    job.future.add_done_callback(on_done)
+
+
+def status(job_id):
+    """Get the state and timings of a job
+
+    :param job_id: string - Job id
+    :return: dict - State, error and timings of the job (state is None for unknown jobs)
+    """
+    _prune()
+    job = _jobs.get(job_id)
+    if job is None:
+        return {'id': job_id, 'state': None}
+    state = job.state()
+    error = job.error
+    if state == FAILED and error is None:
+        error = str(job.future.exception())
+    result = {'id': job_id, 'name': job.name, 'state': state, 'error': error, 'cached': job.cached}
+    result.update(job.timings())
+    return result
+
+
+def result(job_id):
+    """Get the result of a finished job
+
+    :param job_id: string - Job id
+    :return: object - Value returned by the job function, None if the job is not done or failed
+    """
+    job = _jobs.get(job_id)
+    if job is None or job.state() != DONE:
+        return None
+    return job.future.result()[2]
+
+
+def cancel(job_id):
+    """Cancel a job. Pending jobs are removed from the queue and the result of running jobs is discarded (see
+    live.request_stop to stop a running backtest early).
+
+    :param job_id: string - Job id
+    :return: bool - True if the job will not produce a result
+    """
+    job = _jobs.get(job_id)
+    if job is None:
+        return False
+    if not job.future.cancel():
+        job.cancel_requested = True
+    return job.state() in (PENDING, RUNNING, CANCELLED)
+
+
+def queue_depth():
+    """Number of jobs waiting for a worker."""
+    return sum(1 for job in list(_jobs.values()) if job.state() == PENDING)
+
+
+def in_flight():
+    """Number of pending and running jobs."""
+    states = [job.state() for job in list(_jobs.values())]
+    return {PENDING: states.count(PENDING), RUNNING: states.count(RUNNING)}
+
+
+jobs_in_flight = om.Gauge('omega_jobs_in_flight', 'Jobs waiting for a worker or running', ['state'], in_flight)
+job_workers = om.Gauge('omega_job_workers', 'Number of worker processes', function=workers)
+
+
+def stats():
+    """Queue depth, number of jobs per state and average timings of the finished jobs."""
+    jobs = list(_jobs.values())
+    states = [job.state() for job in jobs]
+    finished = [job.timings() for job, state in zip(jobs, states) if state == DONE]
+    result = {state: states.count(state) for state in (PENDING, RUNNING, DONE, FAILED, CANCELLED)}
+    result['queue_depth'] = result[PENDING]
+    result['workers'] = workers()
+    for key in ('wait', 'run', 'total'):
+        result['avg_' + key] = round(sum(t[key] for t in finished) / len(finished), 3) if finished else 0
+    return result
@@ -0,0 +1,109 @@
+import json
+import time
+
+import backtrader as bt
+import redis
+
+import omega_ui.configuration as oc
+import omega_ui.connections as oconn
+
+
+"""Live module
+
+Streams batches of portfolio value and drawdown points of a running backtest over its log channel ('l' + uid) so that
+the chart can be updated while cerebro is running, and lets a running backtest be stopped early (StopCheck, added to every
+cerebro whether the points are streamed or not).
+"""
+_context = {'channel': None, 'job_id': None}
+
+
+def configure(channel, job_id):
+    """Set the channel and the job of the backtest running in this process (None to disable streaming)."""
+    _context['channel'] = channel
+    _context['job_id'] = job_id
+
+
+def enabled():
+    return bool(oc.cfg['live']['enabled']) and _context['channel'] is not None
+
+
+def request_stop(job_id):
+    """Ask the backtest of a running job to stop at its next check (see StopCheck)."""
+    oconn.redis_client().set('c' + job_id, 1, ex=3600)
+
+
+def stop_requested(job_id):
+    return job_id is not None and bool(oconn.redis_client().exists('c' + job_id))
+
+
+class StopCheck(bt.Analyzer):
+    """Analyzer stopping the backtest once its job is cancelled (request_stop). The cancellation is looked up in Redis at
+    most every M milliseconds, the other bars only read the clock.
+    """
+    params = (('interval_ms', 500),)
+
+    def start(self):
+        self.job_id = _context['job_id']
+        self.interval = self.p.interval_ms / 1000
+        self.next_check = time.monotonic() + self.interval
+
+    def next(self):
+        if self.job_id is None:
+            return
+        now = time.monotonic()
+        if now < self.next_check:
+            return
+        self.next_check = now + self.interval
+        try:
+            if stop_requested(self.job_id):
+                self.strategy.env.runstop()
+        except redis.RedisError:
+            pass  # the backtest runs to the end, its result is discarded by jobs.cancel
+
+
+class LiveEquity(bt.Analyzer):
+    """Analyzer publishing the portfolio value and drawdown every N bars or M milliseconds (whichever comes first).
+
+    Only the value and the date are recorded on every bar, the drawdown, the conversion of the dates and the publishing
+    are done once per batch.
+    """
+    params = (('bars', 250), ('interval_ms', 500))
+
+    def start(self):
+        self.channel = _context['channel']
+        self.job_id = _context['job_id']
+        self.redis = oconn.redis_client()
+        self.peak = None
+        self.dates = []
+        self.values = []
+        self.last_flush = time.monotonic()
+
+    def next(self):
+        self.dates.append(self.strategy.datetime[0])
+        self.values.append(self.strategy.broker.getvalue())
+        if len(self.values) >= self.p.bars or (time.monotonic() - self.last_flush) * 1000 >= self.p.interval_ms:
+            self.flush()
+
+    def stop(self):
+        self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.values:
+            return
+        drawdown = []
+        for value in self.values:
+            self.peak = value if self.peak is None else max(self.peak, value)
+            drawdown.append(round(-100 * (self.peak - value) / self.peak, 4) if self.peak else 0)
+        message = {
+            'type': 'equity',
+            'job': self.job_id,
+            'x': [bt.num2date(d).isoformat() for d in self.dates],
+            'value': self.values,
+            'drawdown': drawdown
+        }
+        self.dates, self.values = [], []
+        try:
+            self.redis.publish(self.channel, json.dumps(message))
+        except redis.RedisError:
+            pass  # streaming is best effort, never fail the backtest
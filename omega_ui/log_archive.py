@@ -0,0 +1,193 @@
+import contextlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import omega_ui.configuration as oc
+
+
+"""Log archive module
+
+Logs of the backtests are kept in a SQLite index (logs.db in the logging root). A run gets its id from an
+AUTOINCREMENT key and its records are stored in zlib compressed chunks of a fixed number of records. Each chunk holds
+the number of records of each level so that a page of a run filtered by level is found from the index and only the
+chunks of that page are decompressed.
+"""
+LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT,
+    created REAL,
+    records INTEGER DEFAULT 0,
+    debug INTEGER DEFAULT 0, info INTEGER DEFAULT 0, warning INTEGER DEFAULT 0, error INTEGER DEFAULT 0,
+    critical INTEGER DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    run_id INTEGER,
+    seq INTEGER,
+    records INTEGER,
+    debug INTEGER, info INTEGER, warning INTEGER, error INTEGER, critical INTEGER,
+    data BLOB,
+    PRIMARY KEY (run_id, seq)
+);
+"""
+_initialized = set()
+_lock = threading.Lock()
+
+
+def path():
+    return os.path.join(oc.cfg['logging']['root'], 'logs.db')
+
+
+def connect(check_same_thread=True):
+    """Connection to the archive (the tables are created on the first connection of the process)."""
+    db = path()
+    connection = sqlite3.connect(db, timeout=30, check_same_thread=check_same_thread)
+    with _lock:
+        if db not in _initialized:
+            # WAL lets the UI read the archive while the workers write to it
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.executescript(_SCHEMA)
+            _initialized.add(db)
+    return connection
+
+
+def level_name(levelno):
+    """Name of the level column of a record (custom levels are counted with the level below them)."""
+    return LEVELS[min(max(levelno // 10 - 1, 0), len(LEVELS) - 1)]
+
+
+def _columns(levels):
+    levels = [level.upper() for level in levels or LEVELS if level.upper() in LEVELS]
+    return ' + '.join(level.lower() for level in levels) or '0'
+
+
+def create_run(name):
+    """Create a run and return its id."""
+    with contextlib.closing(connect()) as connection, connection:
+        return connection.execute('INSERT INTO runs (name, created) VALUES (?, ?)', (name, time.time())).lastrowid
+
+
+class ArchiveHandler(logging.Handler):
+    """Handler writing the records of a run to the archive, in compressed chunks of N records.
+
+    :param run_id: int - Id of the run (see create_run)
+    :param chunk_records: int - Number of records per chunk
+    """
+    def __init__(self, run_id, chunk_records=1000, level=logging.NOTSET):
+        logging.Handler.__init__(self, level)
+        self.run_id = run_id
+        self.chunk_records = chunk_records
+        # Records are written by the thread of the BatchListener (calls are serialized by the handler lock)
+        self.connection = connect(check_same_thread=False)
+        self.buffer = []
+        # Records can be appended to a finished run (e.g. timing of the display of its result)
+        self.seq = self.connection.execute(
+            'SELECT COALESCE(MAX(seq) + 1, 0) FROM chunks WHERE run_id = ?', [run_id]).fetchone()[0]
+
+    def emit(self, record):
+        self.handle_batch([record])
+
+    def handle_batch(self, records):
+        self.acquire()
+        try:
+            self.buffer.extend((level_name(r.levelno), r.levelname, r.name, r.getMessage()) for r in records)
+            while len(self.buffer) >= self.chunk_records:
+                self._write(self.buffer[:self.chunk_records])
+                self.buffer = self.buffer[self.chunk_records:]
+        finally:
+            self.release()
+
+    def _write(self, rows):
+        counts = [0] * len(LEVELS)
+        for row in rows:
+            counts[LEVELS.index(row[0])] += 1
+        data = zlib.compress(json.dumps(rows).encode('utf8'))
+        with self.connection:
+            self.connection.execute(
+                'INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [self.run_id, self.seq, len(rows)] + counts + [data])
+            self.connection.execute(
+                'UPDATE runs SET records = records + ?, debug = debug + ?, info = info + ?, warning = warning + ?, '
+                'error = error + ?, critical = critical + ? WHERE id = ?',
+                [len(rows)] + counts + [self.run_id])
+        self.seq += 1
+
+    def flush(self):
+        self.acquire()
+        try:
+            if self.buffer:
+                self._write(self.buffer)
+                self.buffer = []
+        finally:
+            self.release()
+
+    def close(self):
+        try:
+            self.flush()
+            self.connection.close()
+        finally:
+            logging.Handler.close(self)
+
+
+def runs(limit=50, before=None):
+    """Most recent runs
+
+    :param limit: int - Maximum number of runs
+    :param before: int - Only the runs with an id lower than this one (to page through the runs)
+    :return: list - Runs (id, name, created, records and number of records per level)
+    """
+    with contextlib.closing(connect()) as connection:
+        connection.row_factory = sqlite3.Row
+        rows = connection.execute(
+            'SELECT * FROM runs WHERE id < ? ORDER BY id DESC LIMIT ?',
+            (before if before is not None else 2 ** 62, limit)).fetchall()
+    return [dict(row) for row in rows]
+
+
+def page(run_id, levels=None, offset=0, limit=200):
+    """Page of the records of a run
+
+    :param run_id: int - Id of the run
+    :param levels: list - Levels of the records (all levels if None)
+    :param offset: int - Number of matching records to skip
+    :param limit: int - Maximum number of records
+    :return: dict - Total number of matching records and the records of the page (level, logger, msg)
+    """
+    levels = set(level.upper() for level in levels or LEVELS)
+    columns = _columns(levels)
+    with contextlib.closing(connect()) as connection:
+        chunks = connection.execute(
+            'SELECT seq, {} FROM chunks WHERE run_id = ? ORDER BY seq'.format(columns), (run_id,)).fetchall()
+        total = sum(count for _, count in chunks)
+        # Only the chunks overlapping the page are read and decompressed
+        seqs, skip, start = [], 0, 0
+        for seq, count in chunks:
+            if start + count > offset and start < offset + limit:
+                if not seqs:
+                    skip = offset - start
+                seqs.append(seq)
+            start += count
+        records = []
+        for seq in seqs:
+            data, = connection.execute(
+                'SELECT data FROM chunks WHERE run_id = ? AND seq = ?', (run_id, seq)).fetchone()
+            records.extend(
+                {'level': name, 'logger': logger, 'msg': msg}
+                for level, name, logger, msg in json.loads(zlib.decompress(data).decode('utf8')) if level in levels)
+    return {'run': run_id, 'total': total, 'offset': offset, 'records': records[skip:skip + limit]}
+
+
+def text(run_id):
+    """Lines of the log of a run, in the format of the former log files (generator)."""
+    with contextlib.closing(connect()) as connection:
+        cursor = connection.execute('SELECT data FROM chunks WHERE run_id = ? ORDER BY seq', (run_id,))
+        for data, in cursor:
+            for _, level, _, msg in json.loads(zlib.decompress(data).decode('utf8')):
+                yield '{} - {}\n'.format(level, msg)
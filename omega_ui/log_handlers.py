@@ -0,0 +1,145 @@
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+
+
+"""Log handlers module
+
+Handlers used during a backtest. The strategies only put records on a queue (QueueHandler), a background listener
+drains the queue and hands the records in batches to the handlers, which write them to the log archive (see
+omega_ui.log_archive) and publish them to Redis in one pipeline.
+"""
+_STOP = None
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """Queue handler which does not copy nor format the records (the listener formats them)."""
+    def prepare(self, record):
+        # Merge the arguments now as they might be modified by the strategy before the record is handled
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def log_control(logger, message):
+    """Log a DEBUG control message used by the UI to follow a backtest ('start', 'done'). Control messages bypass the
+    level of the logger and of the handlers."""
+    logger.handle(logger.makeRecord(logger.name, logging.DEBUG, __file__, 0, message, None, None, extra={'control': True}))
+
+
+class SamplingFilter(logging.Filter):
+    """Filter keeping only 1 in N DEBUG records of some loggers (e.g. loggers called on every bar)
+
+    :param rates: dict - N per logger name
+    """
+    def __init__(self, rates):
+        logging.Filter.__init__(self)
+        self.rates = rates
+        self.counts = {}
+
+    def filter(self, record):
+        rate = self.rates.get(record.name)
+        if record.levelno > logging.DEBUG or not rate or rate <= 1:
+            return True
+        count = self.counts.get(record.name, 0)
+        self.counts[record.name] = count + 1
+        return count % rate == 0
+
+
+class RedisBatchHandler(logging.Handler):
+    """Handler publishing records to a Redis channel, a batch of records being sent in one pipeline.
+
+    Records are published as JSON with the fields used by the socket server (name, levelname, msg).
+    """
+    def __init__(self, channel, redis_client, level=logging.NOTSET):
+        logging.Handler.__init__(self, level)
+        self.channel = channel
+        self.redis_client = redis_client
+
+    @staticmethod
+    def to_json(record):
+        return json.dumps({
+            'name': record.name,
+            'levelname': record.levelname,
+            'msg': record.getMessage(),
+            'created': record.created
+        })
+
+    def emit(self, record):
+        self.handle_batch([record])
+
+    def handle_batch(self, records):
+        if not records:
+            return
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for record in records:
+                pipe.publish(self.channel, self.to_json(record))
+            pipe.execute()
+        except Exception:
+            pass  # the UI logs are best effort, never fail the backtest
+
+
+class BatchListener:
+    """Listener draining a queue of records in a background thread and handing them in batches to the handlers
+
+    :param records_queue: queue.Queue - Queue filled by a QueueHandler
+    :param handlers: list - Handlers (handle_batch is used when available)
+    :param batch_size: int - Maximum number of records per batch
+    """
+    def __init__(self, records_queue, handlers, batch_size=1000):
+        self.queue = records_queue
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.records = 0
+        self.seconds = 0.0
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._monitor, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Handle the remaining records and stop the background thread."""
+        self.queue.put_nowait(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    def _monitor(self):
+        while True:
+            batch = [self.queue.get()]
+            stop = batch[0] is _STOP
+            while not stop and len(batch) < self.batch_size:
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                stop = record is _STOP
+                batch.append(record)
+            self.handle([record for record in batch if record is not _STOP])
+            if stop:
+                return
+
+    def handle(self, records):
+        if not records:
+            return
+        start = time.perf_counter()
+        for handler in self.handlers:
+            accepted = [
+                record for record in records
+                if (record.levelno >= handler.level or getattr(record, 'control', False)) and handler.filter(record)
+            ]
+            if hasattr(handler, 'handle_batch'):
+                handler.handle_batch(accepted)
+            else:
+                for record in accepted:
+                    handler.handle(record)
+        self.records += len(records)
+        self.seconds += time.perf_counter() - start
+
+    def stats(self):
+        """Number of records handled and time spent in the handlers (in seconds)."""
+        return {'records': self.records, 'seconds': round(self.seconds, 4)}
@@ -0,0 +1,147 @@
+import bisect
+import functools
+import threading
+import time
+
+
+"""Metrics module
+
+Counters, gauges and histograms of a process exposed in the Prometheus text format (/metrics on the Dash server and on
+the socket server). Updating a metric is a dictionary lookup under a lock, gauges read from other modules (e.g. the
+number of jobs in flight) are computed when the metrics are scraped.
+"""
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_registry = []
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(n, str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+                          for n, v in zip(names, values)) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(n, '') for n in self.label_names)
+
+    def samples(self):
+        """(suffix, label names, label values, value) of the samples of the metric."""
+        with self.lock:
+            return [('', self.label_names, key, value) for key, value in self.values.items()]
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.documentation), '# TYPE {} {}'.format(self.name, self.kind)]
+        for suffix, names, values, value in self.samples():
+            lines.append('{}{}{} {}'.format(self.name, suffix, _labels(names, values), _number(value)))
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        Metric.__init__(self, name, documentation, labels)
+        if not self.label_names:
+            self.values[()] = 0
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """Gauge set by the code or computed when scraped (function returning a value or a dict label value -> value)."""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labels=(), function=None):
+        Metric.__init__(self, name, documentation, labels)
+        self.function = function
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def samples(self):
+        if self.function is None:
+            return Metric.samples(self)
+        try:
+            value = self.function()
+        except Exception:
+            return []
+        if isinstance(value, dict):
+            return [('', self.label_names, (k,) if not isinstance(k, tuple) else k, v) for k, v in value.items()]
+        return [('', (), (), value)]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=BUCKETS):
+        Metric.__init__(self, name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        if not self.label_names:
+            self.values[()] = [0] * (len(self.buckets) + 1) + [0.0]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                # Count per bucket (last one for +Inf) and sum, cumulated when scraped
+                counts = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[i] += 1
+            counts[-1] += value
+
+    def time(self, **labels):
+        """Decorator observing the duration of a function (also when it raises)."""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, **labels)
+            return timed
+        return decorator
+
+    def samples(self):
+        with self.lock:
+            items = [(key, list(counts)) for key, counts in self.values.items()]
+        result = []
+        names = self.label_names + ('le',)
+        for key, counts in items:
+            total = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                total += count
+                result.append(('_bucket', names, key + (_number(bound),), total))
+            result.append(('_sum', self.label_names, key, counts[-1]))
+            result.append(('_count', self.label_names, key, total))
+        return result
+
+
+def render():
+    """All the metrics of the process in the Prometheus text format."""
+    return '\n'.join(metric.render() for metric in _registry) + '\n'
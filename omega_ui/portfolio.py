@@ -0,0 +1,137 @@
+import hashlib
+import json
+import logging
+import uuid
+
+import numpy as np
+import pandas as pd
+
+import omega_ui.jobs as oj
+import omega_ui.results as ors
+import omega_ui.tearsheet as ots
+
+
+"""Portfolio module
+
+Backtests of symbol independent strategies (see Backtest.symbol_independent) are run as one job per symbol, each with
+its share of the cash. Once all the jobs are done, the portfolio value is rebuilt from the returns of the symbols and
+their trades are merged into a single result.
+"""
+BREAKDOWN = 'Return % | Sharpe | Trades'
+
+_portfolios = {}
+
+
+def submit(submit_fn, symbols, weights, cash):
+    """Submit one job per symbol
+
+    :param submit_fn: function - Function submitting a backtest for a symbol and its cash and returning its job id
+    :param symbols: list - List of symbols
+    :param weights: dict - Weight of each symbol (normalized to 1)
+    :param cash: float - Cash of the portfolio
+    :return: string - Portfolio id
+    """
+    for key in [k for k, p in _portfolios.items() if all(oj.status(j)['state'] is None for j in p['jobs'])]:
+        del _portfolios[key]  # jobs have been pruned
+    portfolio_id = 'p' + uuid.uuid4().hex
+    cashes = [cash * weights[s] for s in symbols]
+    _portfolios[portfolio_id] = {
+        'symbols': list(symbols),
+        'cash': cashes,
+        'jobs': [submit_fn(s, c) for s, c in zip(symbols, cashes)],
+        'result': None
+    }
+    return portfolio_id
+
+
+def is_portfolio_id(job_id):
+    return job_id in _portfolios
+
+
+def job_ids(portfolio_id):
+    return list(_portfolios.get(portfolio_id, {}).get('jobs', []))
+
+
+def status(portfolio_id):
+    """Aggregated state and timings of the jobs of a portfolio (same format as jobs.status). The portfolio is done once
+    all its symbols are done, it fails if any of them fails."""
+    states = [oj.status(job_id) for job_id in job_ids(portfolio_id)]
+    if not states:
+        return {'id': portfolio_id, 'state': None}
+    names = [s['state'] for s in states]
+    if any(n in (oj.PENDING, oj.RUNNING) for n in names):
+        state = oj.RUNNING if any(n != oj.PENDING for n in names) else oj.PENDING
+    elif oj.FAILED in names or None in names:
+        state = oj.FAILED
+    elif oj.CANCELLED in names:
+        state = oj.CANCELLED
+    else:
+        state = oj.DONE
+    done = [s for s in states if s['state'] == oj.DONE]
+    return {
+        'id': portfolio_id,
+        'state': state,
+        'error': next((s['error'] for s in states if s.get('error')), None) or (
+            'a symbol failed' if state == oj.FAILED else None),
+        'cached': all(s.get('cached') for s in states),
+        'symbols': len(states),
+        'done': len(done),
+        'wait': max((s['wait'] for s in done), default=0),
+        'run': max((s['run'] or 0 for s in done), default=0),
+        'total': max(s.get('total', 0) for s in states)
+    }
+
+
+def result(portfolio_id):
+    """Result of a portfolio, merged once all its symbols are done
+
+    :param portfolio_id: string - Portfolio id
+    :return: string - Result id, None if not done
+    """
+    portfolio = _portfolios.get(portfolio_id)
+    if portfolio is None or status(portfolio_id)['state'] != oj.DONE:
+        return None
+    if portfolio['result'] is None:
+        try:
+            portfolio['result'] = merge(
+                portfolio['symbols'], [oj.result(j) for j in portfolio['jobs']], portfolio['cash'])
+        except Exception as e:
+            logging.getLogger(__name__).log(logging.ERROR, 'Error in merging a portfolio: {}'.format(str(e)))
+            portfolio['result'] = []
+    return portfolio['result']
+
+
+def merge(symbols, result_ids, cashes):
+    """Merge the results of the symbols of a portfolio into one result
+
+    :param symbols: list - List of symbols
+    :param result_ids: list - Result of each symbol
+    :param cashes: list - Starting cash of each symbol
+    :return: string - Result id of the portfolio
+    """
+    # Results of the symbols are content-addressed when cached, so is the merged result
+    result_id = hashlib.sha256(json.dumps([symbols, result_ids, cashes]).encode('utf8')).hexdigest()
+    if ors.exists(result_id):
+        return result_id
+    values, trades, still_open, breakdown = [], [], 0, {'Symbol': BREAKDOWN}
+    for symbol, rid, cash in zip(symbols, result_ids, cashes):
+        returns = ors.get_returns(rid)
+        header = ors.get_header(rid)
+        values.append((cash * (1 + returns).cumprod()).rename(symbol))
+        trade_list = header.get('trades') or {'trades': [], 'open': 0}
+        trades.extend([date, pnl, length, symbol] for date, pnl, length, _ in trade_list['trades'])
+        still_open += trade_list['open']
+        curve = header['statistic']['Curve']
+        breakdown[symbol] = '{} | {} | {}'.format(
+            curve['Total Return'], curve['Sharpe Ratio'], header['statistic']['Trade']['Trades'])
+    # Before its first bar (and after its last one) a symbol holds its cash (resp. its last value)
+    frame = pd.concat(values, axis=1).sort_index().ffill().fillna(pd.Series(cashes, index=symbols))
+    total = frame.sum(axis=1)
+    returns = total.pct_change()
+    returns.iloc[0] = total.iloc[0] / sum(cashes) - 1
+    returns = returns.rename('return')
+    statistic = ots.combined_statistic(returns, np.append(sum(cashes), total.values), trades, still_open)
+    statistic['Symbols'] = breakdown
+    title = '{}: {:,.2f}'.format(symbols, total.iloc[-1] - sum(cashes))
+    return ors.put(
+        returns, statistic, title, result_id, trades={'trades': sorted(trades), 'open': still_open}, cash=sum(cashes))
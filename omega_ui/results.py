@@ -0,0 +1,141 @@
+import json
+import struct
+import uuid
+
+import numpy as np
+import pandas as pd
+
+import omega_ui.configuration as oc
+import omega_ui.connections as oconn
+
+
+"""Results module
+
+Backtest results are kept server-side in Redis (with a TTL) so that only a result id goes through the browser. The
+returns are stored as raw int64 (dates) and float64 (values) arrays instead of JSON.
+"""
+FIELDS = ('header', 'index', 'values')
+
+
+def _key(result_id):
+    return 'r' + result_id
+
+
+def new_id():
+    return uuid.uuid4().hex
+
+
+def put(returns, statistic, title, result_id=None, **extra):
+    """Store the result of a backtest
+
+    :param returns: pd.Series - Daily returns of the strategy, noncumulative
+    :param statistic: dict - Statistics of the backtest (see tearsheet.create_statistic)
+    :param title: string - Title of the tearsheet
+    :param result_id: string - Id of the result (a new id is created if not provided)
+    :param extra: dict - Other JSON serializable items to store with the result
+    :return: string - Result id
+    """
+    result_id = result_id or new_id()
+    header = dict(extra, statistic=statistic, title=title, name=returns.name)
+    index = pd.DatetimeIndex(returns.index).values.astype('datetime64[ns]').view(np.int64)
+    r = oconn.redis_client()
+    pipe = r.pipeline()
+    pipe.hset(_key(result_id), mapping={
+        'header': json.dumps(header),
+        'index': index.tobytes(),
+        'values': np.ascontiguousarray(returns.values, dtype=np.float64).tobytes()
+    })
+    pipe.expire(_key(result_id), int(oc.cfg['results']['ttl']))
+    pipe.execute()
+    return result_id
+
+
+def exists(result_id):
+    return bool(result_id) and bool(oconn.redis_client().exists(_key(result_id)))
+
+
+def get_header(result_id):
+    """Statistic, title and extra items of a result (None if not found)."""
+    header = oconn.redis_client().hget(_key(result_id), 'header')
+    return None if header is None else json.loads(header.decode('utf8'))
+
+
+def update_header(result_id, **extra):
+    """Add JSON serializable items to the header of a result."""
+    header = get_header(result_id)
+    if header is not None:
+        header.update(extra)
+        oconn.redis_client().hset(_key(result_id), 'header', json.dumps(header))
+
+
+def get_statistic(result_id):
+    header = get_header(result_id)
+    return None if header is None else header['statistic']
+
+
+def get_returns(result_id):
+    """Returns of a result (None if not found)
+
+    :param result_id: string - Result id
+    :return: pd.Series - Daily returns of the strategy, noncumulative
+    """
+    header, index, values = oconn.redis_client().hmget(_key(result_id), FIELDS)
+    if header is None:
+        return None
+    header = json.loads(header.decode('utf8'))
+    return pd.Series(
+        np.frombuffer(values, dtype=np.float64),
+        index=pd.DatetimeIndex(np.frombuffer(index, dtype=np.int64).view('datetime64[ns]')),
+        name=header['name'])
+
+
+def dumps(result_id):
+    """Serialize a result into bytes (None if not found)."""
+    items = oconn.redis_client().hmget(_key(result_id), FIELDS)
+    if items[0] is None:
+        return None
+    return b''.join(struct.pack('<Q', len(item)) + item for item in items)
+
+
+def loads(result_id, blob):
+    """Store a result serialized by dumps
+
+    :param result_id: string - Id of the result
+    :param blob: bytes - Serialized result
+    :return: string - Result id
+    """
+    items, offset = [], 0
+    for _ in FIELDS:
+        size, = struct.unpack_from('<Q', blob, offset)
+        items.append(blob[offset + 8:offset + 8 + size])
+        offset += 8 + size
+    r = oconn.redis_client()
+    pipe = r.pipeline()
+    pipe.hset(_key(result_id), mapping=dict(zip(FIELDS, items)))
+    pipe.expire(_key(result_id), int(oc.cfg['results']['ttl']))
+    pipe.execute()
+    return result_id
+
+
+def put_timing(result_id, phase, spans):
+    """Store the timing spans of a phase of a result (see omega_ui.timing), each phase in its own field."""
+    r = oconn.redis_client()
+    if r.exists(_key(result_id)):
+        r.hset(_key(result_id), 'timing:' + phase, json.dumps(spans))
+
+
+def mark(result_id, flag):
+    """Set a flag stored with a result
+
+    :param result_id: string - Result id
+    :param flag: string - Name of the flag
+    :return: bool - True the first time the flag is set (False if already set or if the result has expired)
+    """
+    r = oconn.redis_client()
+    return bool(r.exists(_key(result_id))) and bool(r.hsetnx(_key(result_id), 'flag:' + flag, 1))
+
+
+def get_timing(result_id, phases):
+    """Timing spans of the phases of a result which have been stored (dict phase -> spans)."""
+    values = oconn.redis_client().hmget(_key(result_id), ['timing:' + phase for phase in phases])
+    return {phase: json.loads(value.decode('utf8')) for phase, value in zip(phases, values) if value is not None}
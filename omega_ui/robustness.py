@@ -0,0 +1,134 @@
+import numpy as np
+
+import omega_ui.configuration as oc
+
+
+"""Robustness module
+
+Monte Carlo analysis of a backtest. The daily returns are resampled with a block bootstrap (blocks of consecutive days
+keep the autocorrelation of the returns) to get confidence bands of the equity curve and the distributions of CAGR,
+Sharpe ratio and maximum drawdown, and the order of the trades is shuffled to get the distribution of the maximum
+drawdown due to the sequence of the trades. All the paths of a chunk are computed at once with NumPy, the chunks bound
+the memory used (chunk x days floats).
+"""
+PERCENTILES = (5, 25, 50, 75, 95)
+TRADING_DAYS = 252
+
+
+def _bootstrap(rng, returns, paths, block):
+    """Paths of returns made of random blocks of consecutive days (paths x days)."""
+    n = len(returns)
+    blocks = -(-n // block)
+    # View of all the blocks of the returns (one row per starting day), whole blocks are copied at once
+    windows = np.lib.stride_tricks.as_strided(
+        returns, shape=(n - block + 1, block), strides=(returns.strides[0], returns.strides[0]), writeable=False)
+    starts = rng.randint(0, n - block + 1, size=(paths, blocks))
+    return windows[starts].reshape(paths, -1)[:, :n]
+
+
+def bootstrap(returns, paths=10000, block=20, chunk=250, points=200, seed=0):
+    """Block bootstrap of daily returns
+
+    :param returns: np.ndarray - Daily returns, noncumulative
+    :param paths: int - Number of paths
+    :param block: int - Number of consecutive days per block
+    :param chunk: int - Number of paths computed at once (0 for all the paths at once)
+    :param points: int - Number of points of the equity curve kept for the bands
+    :param seed: int - Seed of the random generator
+    :return: dict - Positions of the points, equity bands (one array per percentile) and CAGR, Sharpe ratio and maximum
+        drawdown of every path
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    n = len(returns)
+    block = max(min(block, n), 1)
+    chunk = chunk or paths
+    rng = np.random.RandomState(seed)
+    positions = np.unique(np.linspace(0, n - 1, min(points, n)).astype(np.int64))
+    equity_points = np.empty((paths, len(positions)))
+    cagr, sharpe, drawdown = np.empty(paths), np.empty(paths), np.empty(paths)
+    for start in range(0, paths, chunk):
+        stop = min(start + chunk, paths)
+        sample = _bootstrap(rng, returns, stop - start, block)
+        # Mean and standard deviation from the sums (no temporary paths x days array)
+        mean = sample.sum(axis=1) / n
+        variance = (np.einsum('ij,ij->i', sample, sample) - n * mean ** 2) / max(n - 1, 1)
+        std = np.sqrt(np.maximum(variance, 0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sharpe[start:stop] = np.where(std > 1e-12, mean / std * np.sqrt(TRADING_DAYS), np.nan)
+        # Equity curves computed in place in log space: log returns -> cumulative log returns (log equity)
+        np.log1p(sample, out=sample)
+        np.cumsum(sample, axis=1, out=sample)
+        equity_points[start:stop] = np.exp(sample[:, positions])
+        cagr[start:stop] = np.exp(sample[:, -1] * (TRADING_DAYS / n)) - 1
+        peak = np.maximum.accumulate(sample, axis=1)
+        np.maximum(peak, 0.0, out=peak)  # the curves start at 1
+        np.subtract(sample, peak, out=peak)
+        drawdown[start:stop] = 1 - np.exp(peak.min(axis=1))
+    return {
+        'positions': positions,
+        'bands': np.percentile(equity_points, PERCENTILES, axis=0),
+        'cagr': cagr,
+        'sharpe': sharpe,
+        'drawdown': drawdown
+    }
+
+
+def shuffle_trades(pnls, cash, paths=10000, chunk=250, seed=0):
+    """Maximum drawdown of the equity curve of the trades taken in a random order
+
+    :param pnls: list - Net PnL of the trades
+    :param cash: float - Starting cash
+    :param paths: int - Number of paths
+    :param chunk: int - Number of paths computed at once (0 for all the paths at once)
+    :param seed: int - Seed of the random generator
+    :return: np.ndarray - Maximum drawdown of every path
+    """
+    pnls = np.asarray(pnls, dtype=np.float64)
+    chunk = chunk or paths
+    rng = np.random.RandomState(seed)
+    drawdown = np.empty(paths)
+    for start in range(0, paths, chunk):
+        stop = min(start + chunk, paths)
+        order = np.argsort(rng.random_sample((stop - start, len(pnls))), axis=1)
+        equity = cash + np.cumsum(pnls[order], axis=1)
+        peak = np.maximum(np.maximum.accumulate(equity, axis=1), cash)
+        drawdown[start:stop] = ((peak - equity) / peak).max(axis=1)
+    return drawdown
+
+
+def _percentiles(values, scale=100, digits=2):
+    low, median, high = np.nanpercentile(values, (5, 50, 95)) * scale
+    return '{} / {} / {}'.format(round(low, digits), round(median, digits), round(high, digits))
+
+
+def analyze(returns, trades=None, cash=None):
+    """Robustness analysis of a backtest (see the robustness section of the configuration)
+
+    :param returns: pd.Series - Daily returns of the strategy, noncumulative
+    :param trades: list - Closed trades (date, net PnL, length, symbol), see analyzers.TradeList
+    :param cash: float - Starting cash (needed to shuffle the trades)
+    :return: tuple - Statistics section (5% / 50% / 95% percentiles) and JSON serializable bands and histogram for the
+        tearsheet, (None, None) if disabled or not enough returns
+    """
+    cfg = oc.cfg['robustness']
+    if not cfg['enabled'] or len(returns) < 2:
+        return None, None
+    paths, chunk, seed = int(cfg['paths']), int(cfg['chunk']), int(cfg['seed'])
+    result = bootstrap(returns.values, paths, int(cfg['block']), chunk, seed=seed)
+    section = {
+        'Paths': paths,
+        'CAGR % (5/50/95)': _percentiles(result['cagr']),
+        'Sharpe (5/50/95)': _percentiles(result['sharpe'], scale=1),
+        'Max Drawdown % (5/50/95)': _percentiles(result['drawdown']),
+        'Losing Paths %': round(float(np.mean(result['cagr'] < 0)) * 100, 2)
+    }
+    pnls = [t[1] for t in trades or []]
+    if cash and len(pnls) > 1:
+        section['Shuffled Trades Max DD % (5/50/95)'] = _percentiles(shuffle_trades(pnls, cash, paths, chunk, seed))
+    counts, edges = np.histogram(result['cagr'][np.isfinite(result['cagr'])] * 100, bins=40)
+    figure = {
+        'x': [d.isoformat() for d in returns.index[result['positions']]],
+        'bands': np.round(result['bands'], 6).tolist(),
+        'histogram': {'counts': counts.tolist(), 'edges': np.round(edges, 4).tolist()}
+    }
+    return section, figure
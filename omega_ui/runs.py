@@ -0,0 +1,252 @@
+import contextlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+import omega_ui.configuration as oc
+import omega_ui.results as ors
+
+
+"""Runs module
+
+Saved backtests (Save/Load buttons). Their metadata is kept in a SQLite index (runs.db in the runs root): the columns
+of the list of runs in the runs table, their parameters and statistic in the details table, and a full-text index of
+their strategy, symbols, title and notes (runs_search, FTS5 with trigrams so that any part of a word matches) so that
+filtering the list does not scan the runs. Their returns and trades are stored in columnar .npy files (one directory
+per run, a thousand runs per folder). The list of runs is read one page at a time and the files of a run are only read
+(memory-mapped) when it is opened, so a store of 100k runs stays fast.
+"""
+COLUMNS = ['Run', 'Date', 'Strategy', 'Symbols', 'Sharpe Ratio', 'Total Return', 'Max Daily Drawdown', 'Notes']
+RESULT_PREFIX = 'run'  # result ids of the opened runs (the other result ids are hexadecimal)
+TRADE_COLUMNS = ('date', 'pnl', 'length', 'symbol')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created REAL,
+    title TEXT,
+    module TEXT,
+    strategy TEXT,
+    symbols TEXT,
+    notes TEXT,
+    sharpe REAL,
+    total_return REAL,
+    max_drawdown REAL,
+    trades INTEGER,
+    search TEXT
+);
+CREATE TABLE IF NOT EXISTS details (
+    run_id INTEGER PRIMARY KEY,
+    params TEXT,
+    statistic TEXT
+);
+"""
+# Created apart so that the index of a runs.db saved before it is built from the runs table
+_SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS runs_search USING fts5(
+    search, content='runs', content_rowid='id', tokenize='trigram');
+"""
+MIN_MATCH = 3  # shorter words are not in the trigram index (LIKE on the matching rows)
+_initialized = set()
+_lock = threading.Lock()
+
+
+def root():
+    return oc.cfg['runs']['root']
+
+
+def path():
+    return os.path.join(root(), 'runs.db')
+
+
+def run_dir(run_id):
+    return os.path.join(root(), str(run_id // 1000), str(run_id))
+
+
+def connect():
+    """Connection to the index (the tables are created on the first connection of the process)."""
+    db = path()
+    os.makedirs(root(), exist_ok=True)
+    connection = sqlite3.connect(db, timeout=30)
+    with _lock:
+        if db not in _initialized:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.executescript(_SCHEMA)
+            indexed = connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'runs_search'").fetchone()
+            connection.executescript(_SEARCH_SCHEMA)
+            if not indexed:
+                with connection:
+                    connection.execute("INSERT INTO runs_search(runs_search) VALUES ('rebuild')")
+            _initialized.add(db)
+    return connection
+
+
+def _write(run_id, returns, trades, header):
+    """Write the returns, the trades and the header of a run to its directory (renamed once complete)."""
+    target = run_dir(run_id)
+    tmp = os.path.join(os.path.dirname(target), 'tmp-' + uuid.uuid4().hex)
+    os.makedirs(tmp)
+    try:
+        index = pd.DatetimeIndex(returns.index).values.astype('datetime64[ns]').view(np.int64)
+        np.save(os.path.join(tmp, 'index.npy'), index)
+        np.save(os.path.join(tmp, 'values.npy'), np.ascontiguousarray(returns.values, dtype=np.float64))
+        columns = list(zip(*trades)) if trades else [[]] * len(TRADE_COLUMNS)
+        for name, values, dtype in zip(TRADE_COLUMNS, columns, (str, np.float64, np.int64, str)):
+            np.save(os.path.join(tmp, 'trades_{}.npy'.format(name)), np.array(values, dtype=dtype))
+        with open(os.path.join(tmp, 'header.json'), 'w') as f:
+            json.dump(header, f)
+        if os.path.exists(target):
+            shutil.rmtree(target)  # left by a save which failed after writing the files
+        os.rename(tmp, target)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+
+def save(result_id, notes='', inputs=None):
+    """Save a result of the result store
+
+    :param result_id: string - Result id (see omega_ui.results)
+    :param notes: string - Notes of the run
+    :param inputs: dict - Module, strategy, symbols and parameters, if not stored with the result (see create_ts)
+    :return: int - Id of the run
+    """
+    header = ors.get_header(result_id)
+    returns = ors.get_returns(result_id)
+    if header is None or returns is None:
+        raise KeyError('The result has expired, please run the backtest again')
+    inputs = header.pop('inputs', None) or inputs or {}
+    statistic = header.pop('statistic')
+    trades = header.pop('trades', None) or {'trades': [], 'open': 0}
+    header['trades'] = {'open': trades.get('open', 0)}
+    curve = statistic.get('Curve', {})
+    symbols = inputs.get('symbols') or []
+    symbols = ', '.join(symbols) if isinstance(symbols, list) else str(symbols)
+    strategy, title, notes = inputs.get('strategy') or '', header.get('title') or '', notes or ''
+    search = ' '.join((strategy, symbols, title, notes)).lower()
+    with contextlib.closing(connect()) as connection, connection:
+        run_id = connection.execute(
+            'INSERT INTO runs (created, title, module, strategy, symbols, notes, sharpe, total_return, max_drawdown, '
+            'trades, search) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (time.time(), title, inputs.get('module'), strategy, symbols, notes, curve.get('Sharpe Ratio'),
+             curve.get('Total Return'), curve.get('Max Daily Drawdown'), statistic.get('Trade', {}).get('Trades'),
+             search)).lastrowid
+        connection.execute('INSERT INTO runs_search (rowid, search) VALUES (?, ?)', (run_id, search))
+        connection.execute('INSERT INTO details VALUES (?, ?, ?)',
+                           (run_id, json.dumps(inputs.get('params') or {}), json.dumps(statistic)))
+        # The row is only committed once the files are written
+        _write(run_id, returns, trades['trades'], header)
+    return run_id
+
+
+def _where(text):
+    """Filter of the runs: every word of the text is in the strategy, the symbols, the title or the notes (lookup of
+    the words of MIN_MATCH characters or more in runs_search, the shorter ones are compared to the search column of the
+    runs found)."""
+    words = (text or '').lower().split()
+    indexed = [w for w in words if len(w) >= MIN_MATCH]
+    short = [w for w in words if len(w) < MIN_MATCH]
+    clauses, args = [], []
+    if indexed:
+        clauses.append('id IN (SELECT rowid FROM runs_search WHERE runs_search MATCH ?)')
+        args.append(' '.join('"{}"'.format(w.replace('"', '""')) for w in indexed))
+    clauses.extend(["search LIKE ? ESCAPE '\\'"] * len(short))
+    args.extend('%{}%'.format(w.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')) for w in short)
+    return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', args
+
+
+def runs(text='', limit=50, offset=0):
+    """Most recent runs matching a filter (only the index is read)
+
+    :param text: string - Words to look for in the strategy, symbols, title and notes of the runs
+    :param limit: int - Maximum number of runs
+    :param offset: int - Number of matching runs to skip
+    :return: list - Runs (id, created, title, module, strategy, symbols, notes and the ranking statistics)
+    """
+    where, args = _where(text)
+    with contextlib.closing(connect()) as connection:
+        connection.row_factory = sqlite3.Row
+        rows = connection.execute(
+            'SELECT id, created, title, module, strategy, symbols, notes, sharpe, total_return, max_drawdown, trades '
+            'FROM runs{} ORDER BY id DESC LIMIT ? OFFSET ?'.format(where), args + [limit, offset]).fetchall()
+    return [dict(row) for row in rows]
+
+
+def rows(text='', limit=50, offset=0):
+    """Rows of the runs table (see COLUMNS)."""
+    return [{
+        'Run': run['id'],
+        'Date': time.strftime('%Y-%m-%d %H:%M', time.localtime(run['created'])),
+        'Strategy': run['strategy'] or run['title'],
+        'Symbols': run['symbols'],
+        'Sharpe Ratio': run['sharpe'],
+        'Total Return': run['total_return'],
+        'Max Daily Drawdown': run['max_drawdown'],
+        'Notes': run['notes']
+    } for run in runs(text, limit, offset)]
+
+
+def get(run_id):
+    """Metadata of a run with its parameters and statistic (None if not found)."""
+    with contextlib.closing(connect()) as connection:
+        connection.row_factory = sqlite3.Row
+        row = connection.execute(
+            'SELECT runs.*, params, statistic FROM runs JOIN details ON run_id = id WHERE id = ?', (run_id,)).fetchone()
+    if row is None:
+        return None
+    run = dict(row)
+    del run['search']
+    run['params'] = json.loads(run['params'])
+    run['statistic'] = json.loads(run['statistic'])
+    return run
+
+
+def load(run_id):
+    """Returns, trades and header of a run (the arrays are memory-mapped)
+
+    :param run_id: int - Id of the run
+    :return: tuple - pd.Series of the returns, list of the trades (see analyzers.TradeList) and dict of the header
+    """
+    directory = run_dir(run_id)
+
+    def array(name):
+        return np.load(os.path.join(directory, name + '.npy'), mmap_mode='r', allow_pickle=False)
+
+    with open(os.path.join(directory, 'header.json')) as f:
+        header = json.load(f)
+    returns = pd.Series(array('values'), index=pd.DatetimeIndex(array('index').view('datetime64[ns]')),
+                        name=header.get('name'))
+    columns = [array('trades_' + name).tolist() for name in TRADE_COLUMNS]
+    return returns, [list(trade) for trade in zip(*columns)], header
+
+
+def open_run(run_id):
+    """Put a run back in the result store (without running the backtest again)
+
+    :param run_id: int - Id of the run
+    :return: string - Result id
+    """
+    result_id = RESULT_PREFIX + str(run_id)
+    if ors.exists(result_id):
+        return result_id
+    run = get(run_id)
+    if run is None:
+        raise KeyError('Run {} not found'.format(run_id))
+    returns, trades, header = load(run_id)
+    header['trades']['trades'] = trades
+    extra = {k: v for k, v in header.items() if k not in ('title', 'name')}
+    return ors.put(returns, run['statistic'], header.get('title') or run['title'], result_id, **extra)
+
+
+def run_id(result_id):
+    """Id of the run of a result opened with open_run (None for the other results)."""
+    if isinstance(result_id, str) and result_id.startswith(RESULT_PREFIX) and result_id[len(RESULT_PREFIX):].isdigit():
+        return int(result_id[len(RESULT_PREFIX):])
+    return None
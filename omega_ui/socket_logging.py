@@ -2,9 +2,11 @@ import eventlet
 import flask
 import flask_socketio as fsio
 import json
-import redis
 
+import omega_ui.auth as oau
 import omega_ui.configuration as oc
+import omega_ui.connections as oconn
+import omega_ui.metrics as om
 
 eventlet.monkey_patch()
 pool = eventlet.GreenPool(1000)  # number of available connections
@@ -15,31 +17,147 @@ s_app.config['SECRET_KEY'] = 'secret!'
 socketio = fsio.SocketIO(s_app, async_mode=None)
 
 
-def background_thread(uid_with_size):
-    uid, size = uid_with_size.split(';')
-    r = redis.StrictRedis(oc.cfg['default']['redis'], 6379, db=0)
-    r.set(uid+'size', size)
-    pubsub = r.pubsub()
-    pubsub.subscribe('l'+uid)
-    count = 0
-    for message in pubsub.listen():
+CONTROL_MESSAGES = ('start', 'done')  # DEBUG messages used by the UI to follow a backtest (see backend.create_ts)
+
+records_forwarded = om.Counter('omega_socket_records_forwarded_total', 'Log records sent to the clients')
+records_dropped = om.Counter('omega_socket_records_dropped_total', 'DEBUG records dropped when a client falls behind')
+equity_forwarded = om.Counter('omega_socket_equity_forwarded_total', 'Batches of equity points sent to the clients')
+messages_drained = om.Histogram('omega_socket_drained_messages', 'Redis messages read per batch',
+                                buckets=(0, 1, 10, 100, 1000, 10000, 100000))
+
+
+def drain(pubsub, limit):
+    """Get all the pending messages of a subscription (at most limit messages)."""
+    messages = []
+    message = pubsub.get_message()
+    while message is not None:
         # Filter out events like Redis connections.
-        if message['type'] != 'message':
-            continue
-        count += 1
-        socketio.sleep(0.01)
+        if message['type'] in ('message', 'pmessage'):
+            messages.append(message)
+            if len(messages) >= limit:
+                break
+        message = pubsub.get_message()
+    return messages
+
+
+def throttle(records, max_batch):
+    """Keep at most max_batch records. When the client falls behind, DEBUG records are dropped first (control
+    messages and higher levels are always kept).
+
+    :param records: list - Log records (dictionaries with name, levelname and msg)
+    :param max_batch: int - Maximum number of records in a batch
+    :return: list, int - Records to send and number of dropped records
+    """
+    if len(records) <= max_batch:
+        return records, 0
+    kept = [r['levelname'] != 'DEBUG' or r['msg'] in CONTROL_MESSAGES for r in records]
+    budget = max_batch - sum(kept)
+    for i, keep in enumerate(kept):
+        if budget <= 0:
+            break
+        if not keep:
+            kept[i] = True
+            budget -= 1
+    result = [r for r, keep in zip(records, kept) if keep]
+    return result, len(records) - len(result)
+
+
+class Dispatcher:
+    """Single pattern subscription ('l*') to the log channels of all the backtests. Messages are dispatched to the
+    Socket.IO room of their uid and discarded when no client is connected for that uid."""
+    def __init__(self):
+        self.clients = {}  # sid -> uid
+        self.subscribers = {}  # uid -> set of sids
+        self.counts = {}  # uid -> number of records sent
+        self.running = False
+
+    def add(self, sid, uid):
+        self.remove(sid)
+        self.clients[sid] = uid
+        self.subscribers.setdefault(uid, set()).add(sid)
+        if not self.running:
+            self.running = True
+            pool.spawn(self.run)
+
+    def remove(self, sid):
+        uid = self.clients.pop(sid, None)
+        if uid is None:
+            return
+        sids = self.subscribers.get(uid, set())
+        sids.discard(sid)
+        if not sids:
+            self.subscribers.pop(uid, None)
+            self.counts.pop(uid, None)
+
+    def run(self):
+        pubsub = oconn.redis_client().pubsub()
+        pubsub.psubscribe('l*')
+        interval = float(oc.cfg['socket']['batch_interval_ms']) / 1000
+        max_drain = int(oc.cfg['socket']['max_drain'])
         try:
-            data = json.loads(message['data'].decode('utf8'))
-            msg = uid + data['name'] + ': ' + data['levelname'] + ': ' + data['msg']
-            socketio.emit('log_response', {'data': msg, 'count': count}, namespace='/omega_log')
-        except:
-            pass
+            # Stops (and tears down the subscription) when the last client disconnects
+            while self.subscribers:
+                socketio.sleep(interval)
+                batches = {}
+                messages = drain(pubsub, max_drain)
+                messages_drained.observe(len(messages))
+                for message in messages:
+                    uid = message['channel'].decode('utf8')[1:]
+                    if uid in self.subscribers:
+                        batches.setdefault(uid, []).append(message)
+                for uid, messages in batches.items():
+                    self.forward(uid, messages)
+        finally:
+            self.running = False
+            pubsub.punsubscribe()
+            pubsub.close()
+
+    def forward(self, uid, messages):
+        records = []
+        for message in messages:
+            try:
+                data = json.loads(message['data'].decode('utf8'))
+                if data.get('type') == 'equity':
+                    # Batch of points of the equity curve (see live.LiveEquity)
+                    socketio.emit('equity_response', data, namespace='/omega_log', room=uid)
+                    equity_forwarded.inc()
+                else:
+                    records.append(data)
+            except:
+                pass
+        if not records:
+            return
+        records, dropped = throttle(records, int(oc.cfg['socket']['max_batch']))
+        records = [{'level': data['levelname'], 'logger': data['name'], 'msg': data['msg']} for data in records]
+        if dropped:
+            records.append({
+                'level': 'WARNING',
+                'logger': 'omega_ui.socket_logging',
+                'msg': '{} DEBUG messages dropped'.format(dropped)
+            })
+        self.counts[uid] = self.counts.get(uid, 0) + len(records)
+        records_forwarded.inc(len(records))
+        records_dropped.inc(dropped)
+        # Only the client of the backtest (room named after its log uid) receives its logs
+        socketio.emit('log_batch', {'records': records, 'count': self.counts[uid], 'dropped': dropped},
+                      namespace='/omega_log', room=uid)
+
+
+dispatcher = Dispatcher()
+socket_clients = om.Gauge('omega_socket_clients', 'Connected Socket.IO clients',
+                          function=lambda: len(dispatcher.clients))
+socket_subscribers = om.Gauge('omega_socket_subscribers', 'Backtest uids with at least one client',
+                              function=lambda: len(dispatcher.subscribers))
+green_threads = om.Gauge('omega_socket_green_threads', 'Running green threads of the pool', function=pool.running)
 
 
 @socketio.on('connect_event', namespace='/omega_log')
 def test_message(message):
     flask.session['receive_count'] = flask.session.get('receive_count', 0) + 1
-    pool.spawn(background_thread, message['data'])
+    uid, size = message['data'].split(';')
+    oconn.redis_client().set(uid + 'size', size, ex=7 * 24 * 3600)
+    fsio.join_room(uid)
+    dispatcher.add(flask.request.sid, uid)
     fsio.emit('log_response', {'data': message['data'], 'count': flask.session['receive_count']})
 
 
@@ -52,6 +170,27 @@ def connect():
 @socketio.on('disconnect', namespace='/omega_log')
 def disconnect():
     print('Client disconnected', flask.request.sid)
+    uid = dispatcher.clients.get(flask.request.sid)
+    if uid is not None:
+        fsio.leave_room(uid)
+    dispatcher.remove(flask.request.sid)
+
+
+@s_app.route('/status')
+def status():
+    return flask.jsonify({
+        'clients': len(dispatcher.clients),
+        'subscribers': len(dispatcher.subscribers),
+        'dispatcher_running': dispatcher.running,
+        'green_threads': pool.running(),
+        'redis_connections': oconn.stats()
+    })
+
+
+@s_app.route('/metrics')
+@oau.protected
+def metrics():
+    return flask.Response(om.render(), content_type=om.CONTENT_TYPE)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,66 @@
+import contextlib
+import importlib
+import threading
+import time
+
+
+"""Startup module
+
+Time taken by the UI to start, step by step: imports of the libraries and of the omega_ui modules, reading of the
+configuration, import and creation of the Backtest class, layout and first listing of the symbols (the last ones happen
+on first use). The report is printed when the app starts and available at /startup.
+"""
+STARTED = time.perf_counter()
+# Libraries imported one by one by app.py (the omega_ui modules then only import the modules of the package)
+LIBRARIES = ('numpy', 'pandas', 'plotly', 'empyrical', 'backtrader', 'redis', 'flask', 'dash', 'dash_core_components',
+             'dash_html_components', 'dash_table_experiments', 'dash_auth')
+
+_steps = []  # [name, seconds, depth] in the order the steps started
+_local = threading.local()
+_ready = {}
+
+
+@contextlib.contextmanager
+def step(name):
+    """Time a step of the startup (steps run during another step are nested in it)."""
+    depth = getattr(_local, 'depth', 0)
+    entry = [name, 0.0, depth]
+    _steps.append(entry)
+    _local.depth = depth + 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        entry[1] = round(time.perf_counter() - start, 3)
+        _local.depth = depth
+
+
+def add(name, start):
+    """Add a step which started at a time (time.perf_counter) and ends now."""
+    _steps.append([name, round(time.perf_counter() - start, 3), getattr(_local, 'depth', 0)])
+
+
+def imports(names):
+    """Import modules, each one in its own step."""
+    for name in names:
+        with step('Import ' + name):
+            importlib.import_module(name)
+
+
+def ready():
+    """Mark the UI as started (time since the import of this module)."""
+    _ready.setdefault('seconds', round(time.perf_counter() - STARTED, 3))
+
+
+def report():
+    """Steps (name, seconds, depth) and time until the UI was ready (None if not yet)."""
+    return {'steps': [list(entry) for entry in _steps], 'ready': _ready.get('seconds')}
+
+
+def summary():
+    """Report as text, one step per line."""
+    result = report()
+    lines = ['{:<48} {:8.3f}s'.format('  ' * depth + name, seconds) for name, seconds, depth in result['steps']]
+    if result['ready'] is not None:
+        lines.append('{:<48} {:8.3f}s'.format('Ready', result['ready']))
+    return '\n'.join(lines)
@@ -42,6 +42,69 @@ function on_child_load(mutations) {
   });
 }
 
+function on_equity(msg) {
+    var gd = document.getElementById('charts');
+    if(!gd || typeof Plotly === 'undefined')
+        return;
+    // New backtest: replace the tearsheet by the live equity curve and drawdown
+    if(gd.live_job != msg.job)
+    {
+        gd.live_job = msg.job;
+        Plotly.newPlot(gd, [
+            {x: [], y: [], mode: 'lines', line: {color: '#66B266', width: 2}, name: ''},
+            {x: [], y: [], mode: 'lines', fill: 'tozeroy', line: {color: '#FF6A6A', width: 2}, name: '', xaxis: 'x2', yaxis: 'y2'}
+        ], {
+            title: 'Backtesting...',
+            showlegend: false,
+            // fixed x-axes: zooming would re-fetch the previous tearsheet over the live chart
+            xaxis: {anchor: 'y', fixedrange: true},
+            yaxis: {domain: [0.35, 1], tickformat: '.2f'},
+            xaxis2: {anchor: 'y2', fixedrange: true},
+            yaxis2: {domain: [0, 0.3], tickformat: '.2f'},
+            margin: {l: 40, r: 20, t: 40, b: 40}
+        });
+    }
+    Plotly.extendTraces(gd, {x: [msg.x, msg.x], y: [msg.value, msg.drawdown]}, [0, 1]);
+}
+
+function on_log_batch(records) {
+    var iframe = $('#log-frame').contents();
+    var iframeBody = iframe.find("body");
+    var visible_levels = $('#level-log').html();
+    var html = [];
+    for(var i = 0, len = records.length; i < len; i++)
+    {
+        var sub_mes = records[i].msg;
+        var level = records[i].level;
+        var message = records[i].logger + ': ' + level + ': ' + sub_mes;
+        if(level == 'ERROR')
+        {
+            $('#status-area').html('Error: '+sub_mes )
+        }
+        if(sub_mes == 'start')
+        {
+            iframeBody.html('')
+            html = [];
+            $('#status-area').html('Backtesting...')
+        }
+        else if(sub_mes == 'done')
+        {
+            $('#status-area').html('Done!')
+        }
+        else
+        {
+            var hidden = visible_levels.indexOf(level) == -1 ? ' style="display: none"' : '';
+            html.push('<div class='+level+hidden+'>'+message+'</div>');
+        }
+    }
+    // Single DOM write per batch
+    if(html.length)
+    {
+        iframeBody.append(html.join(''));
+        iframe.scrollTop(iframe.height());
+    }
+}
+
 $(document).ready(function() {
     onElementInserted('body', '#log-uid', function(element) {
         var socket = io.connect('http://' + document.domain + ':' + 5000+'/omega_log');
@@ -50,41 +113,12 @@ $(document).ready(function() {
             var text = $('#log-uid').val()+';'+graph.outerWidth()+','+graph.outerHeight();
             socket.emit('connect_event', {data: text});
         });
-        socket.on('log_response', function(msg) {
-            var str = msg.data;
-            var uid = $('#log-uid').val();
-            if(str.indexOf(uid)==0)
-            {
-                message = str.replace(uid,'');
-                var iframe = $('#log-frame').contents();
-                var iframeBody = iframe.find("body");
-                var sub_mes = message.split(': ')[2];
-                var level = message.split(': ')[1];
-                if(level == 'ERROR')
-                {
-                    $('#status-area').html('Error: '+sub_mes )
-                }
-                if(sub_mes == 'start')
-                {
-                    iframeBody.html('')
-                    $('#status-area').html('Backtesting...')
-                }
-                else if(sub_mes == 'done')
-                {
-                    $('#status-area').html('Done!')
-                }
-                else
-                {
-                    var visible_levels = $('#level-log').html();
-                    iframeBody.append('<div class='+level+'>'+message+'</div>');
-                    var item = iframeBody.children().last();
-                    if(visible_levels.indexOf(level) == -1)
-                        item.hide();
-                    else
-                        item.show();
-                }
-                iframe.scrollTop(iframe.height());
-            }
+        // Only the logs of this page's backtests are received (room named after the log uid)
+        socket.on('equity_response', function(msg) {
+            on_equity(msg);
+        });
+        socket.on('log_batch', function(msg) {
+            on_log_batch(msg.records);
         });
 
     });
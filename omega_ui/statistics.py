@@ -0,0 +1,173 @@
+import numpy as np
+import pandas as pd
+
+
+"""Statistics module
+
+Statistics of the returns of a backtest whatever the frequency of its bars. The returns are compounded once into daily,
+monthly and yearly returns (sums of the log returns between the boundaries of the periods, found on the sorted dates in
+a single vectorized pass) and all the Curve and Time metrics are computed from these aggregates. Intraday returns are
+annualized as daily returns, bars longer than a day (weekly, monthly) with their own number of periods per year.
+The Trade metrics are computed from the PnLs of the closed trades (analyzers.TradeList). Every metric is a reduction of
+a contiguous float64 array (sums, dot products, min/max), the engine is called for every run of a sweep.
+"""
+# Part of the cache keys of the results (see cache.make_key): bump it whenever the statistics of a result change (this
+# module, analyzers.py or the statistic functions of tearsheet.py), so that results computed before are not reused
+VERSION = 1
+DAY_NS = 86400 * 10 ** 9
+TRADING_DAYS = 252
+# Periods per year by bar length (seconds): up to a day the returns are compounded to daily returns
+PERIODS_PER_YEAR = ((1.5 * 86400, TRADING_DAYS), (10 * 86400, 52), (60 * 86400, 12), (float('inf'), 1))
+
+
+def _starts(keys):
+    """Positions where a sorted array of period keys changes (start of every period)."""
+    if len(keys) == 0:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate([[0], np.flatnonzero(keys[1:] != keys[:-1]) + 1])
+
+
+class Aggregates:
+    """Returns of a series compounded per day, month and year
+
+    :param returns: pd.Series - Returns (any bar frequency), noncumulative
+    """
+    def __init__(self, returns):
+        index = pd.DatetimeIndex(returns.index)
+        if index.tz is not None:
+            index = index.tz_localize(None)  # periods of the local dates
+        ns = index.values.astype('datetime64[ns]').view(np.int64)
+        values = np.nan_to_num(np.asarray(returns.values, dtype=np.float64))
+        if len(ns) > 1 and (ns[1:] < ns[:-1]).any():
+            order = np.argsort(ns, kind='stable')
+            ns, values = ns[order], values[order]
+        # Bar length from the first bars (median, robust to week-ends and holidays)
+        self.bar_seconds = float(np.median(np.diff(ns[:1001]))) / 1e9 if len(ns) > 1 else 86400.0
+        self.periods_per_year = next(p for limit, p in PERIODS_PER_YEAR if self.bar_seconds < limit)
+        logs = np.log1p(values)
+        days = ns // DAY_NS
+        starts = _starts(days)
+        # Daily (or longer) bars are already one return per day
+        self.daily_logs = logs if len(starts) == len(logs) else np.add.reduceat(logs, starts)
+        self.days = days[starts].astype('datetime64[D]')
+        self.daily = np.expm1(self.daily_logs)
+        # Years compounded from the months (fewer dates to convert)
+        monthly_logs, self.months = self._compound(self.daily_logs, self.days.astype('datetime64[M]'))
+        yearly_logs, self.years = self._compound(monthly_logs, self.months.astype('datetime64[Y]'))
+        self.monthly, self.yearly = np.expm1(monthly_logs), np.expm1(yearly_logs)
+
+    @staticmethod
+    def _compound(logs, periods):
+        starts = _starts(periods)
+        if len(starts) == 0:
+            return np.empty(0), periods
+        return np.add.reduceat(logs, starts), periods[starts]
+
+    @property
+    def intraday(self):
+        return self.bar_seconds < 86400
+
+
+def curve_metrics(aggregates):
+    """Total return, CAGR, Sharpe ratio, annual volatility and R-squared (stability) of the compounded returns
+
+    :param aggregates: Aggregates - Compounded returns
+    :return: dict - Metrics as fractions (nan when not defined)
+    """
+    r = aggregates.daily
+    n = len(r)
+    if n == 0:
+        return dict.fromkeys(('total_return', 'cagr', 'sharpe', 'volatility', 'r_squared'), np.nan)
+    # cumulative log returns: the last one gives the total return, the others the regression of the R-squared
+    cumulative = np.cumsum(aggregates.daily_logs)
+    total = float(np.expm1(cumulative[-1]))
+    annualization = np.sqrt(aggregates.periods_per_year)
+    mean = r.mean()
+    std = np.sqrt(np.dot(r - mean, r - mean) / (n - 1)) if n > 1 else np.nan
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        cagr = (1 + total) ** (aggregates.periods_per_year / n) - 1
+        sharpe = mean / std * annualization
+        # R-squared of the regression on the bar number, x centered: sum(x * y) = sum(x * (y - mean(y)))
+        x = np.arange(n) - (n - 1) / 2
+        centered = cumulative - cumulative.mean()
+        r_squared = np.dot(x, cumulative) ** 2 / (np.dot(x, x) * np.dot(centered, centered)) if n > 1 else np.nan
+    return {
+        'total_return': total,
+        'cagr': cagr,
+        'sharpe': sharpe,
+        'volatility': std * annualization,
+        'r_squared': r_squared
+    }
+
+
+def trade_metrics(trades, still_open=0, years=np.nan):
+    """Metrics of the closed trades
+
+    :param trades: list - Closed trades (close date, net PnL, length in bars, symbol), see analyzers.TradeList
+    :param still_open: int - Number of trades still open (counted in the number of trades)
+    :param years: float - Length of the backtest in years (for the number of trades per year)
+    :return: dict - Winning rate (fraction), PnLs, date of the worst trade, SQN...
+    """
+    n = len(trades)
+    pnls = np.fromiter((t[1] for t in trades), np.float64, n)
+    lengths = np.fromiter((t[2] for t in trades), np.float64, n)
+    won = pnls >= 0  # as bt.analyzers.TradeAnalyzer
+    wins = int(np.count_nonzero(won))
+    total_won = pnls[won].sum()
+    total = pnls.sum()
+    total_lost = total - total_won
+    worst = int(np.argmin(pnls)) if n else -1
+    std = pnls.std() if n > 1 else 0.0
+    return {
+        'trades': n + still_open,
+        'winning': wins / (n + still_open) if n + still_open else 0.0,
+        'average': total / n if n else 0.0,
+        'average_win': total_won / wins if wins else 0.0,
+        'average_loss': total_lost / (n - wins) if n - wins else 0.0,
+        'best': float(pnls.max()) if wins else 0.0,
+        'worst': float(pnls[worst]) if wins < n else 0.0,
+        # close date of the worst losing trade
+        'worst_date': trades[worst][0][:10] if wins < n else None,
+        'average_length': lengths.mean() if n else 0.0,
+        # System quality number (as bt.analyzers.SQN)
+        'sqn': np.sqrt(n) * total / n / std if std > 0 else 0.0,
+        'per_year': (n + still_open) / years if years > 0 else 0.0
+    }
+
+
+def time_metrics(aggregates):
+    """Winning, best and worst months and years of the compounded returns (fractions, nan when not defined)."""
+    def winning(values):
+        return np.mean(values > 0) if len(values) else np.nan
+
+    def mean(values):
+        return values.mean() if len(values) else np.nan
+
+    monthly, yearly = aggregates.monthly, aggregates.yearly
+    return {
+        'winning_months': winning(monthly),
+        'average_winning_month': mean(monthly[monthly > 0]),
+        'average_losing_month': mean(monthly[monthly < 0]),
+        'best_month': monthly.max() if len(monthly) else np.nan,
+        'worst_month': monthly.min() if len(monthly) else np.nan,
+        'winning_years': winning(yearly),
+        'best_year': yearly.max() if len(yearly) else np.nan,
+        'worst_year': yearly.min() if len(yearly) else np.nan
+    }
+
+
+def metrics(returns, trades, still_open=0):
+    """Curve, Trade and Time metrics of a backtest, computed from the returns compounded once and the trade arrays
+
+    :param returns: pd.Series - Returns (any bar frequency), noncumulative
+    :param trades: list - Closed trades, see analyzers.TradeList
+    :param still_open: int - Number of trades still open
+    :return: dict - Curve, Trade and Time metrics (see curve_metrics, trade_metrics and time_metrics)
+    """
+    aggregates = Aggregates(returns)
+    years = len(aggregates.daily) / aggregates.periods_per_year
+    result = dict(curve=curve_metrics(aggregates), trade=trade_metrics(trades, still_open, years),
+                  time=time_metrics(aggregates))
+    # NumPy scalars as Python floats (rounded and JSON encoded by the caller)
+    return {section: {k: float(v) if isinstance(v, np.floating) else v for k, v in values.items()}
+            for section, values in result.items()}
@@ -0,0 +1,162 @@
+import itertools
+import json
+import re
+import uuid
+
+import omega_ui.configuration as oc
+import omega_ui.jobs as oj
+import omega_ui.results as ors
+
+
+"""Sweep module
+
+This module expands parameter cells holding a range (e.g. '5..50 step 5') or a list (e.g. '5, 10, 20') into a grid of
+parameter sets and runs every set as a job in the process pool.
+"""
+RANGE = re.compile(r'^\s*(-?[\d.]+)\s*\.\.\s*(-?[\d.]+)\s*(?:step\s+(-?[\d.]+))?\s*$')
+RANKING = ['Sharpe Ratio', 'CAGR', 'Max Daily Drawdown']
+
+_sweeps = {}
+
+
+def parse_value(text):
+    """Parse a parameter cell
+
+    :param text: string - Value of the cell
+    :return: list - Values to sweep over, None if the cell holds a single (JSON) value
+    """
+    try:
+        json.loads(text)
+        return None
+    except ValueError:
+        pass
+    match = RANGE.match(text)
+    if match:
+        start, stop, step = (float(x) if x is not None else None for x in match.groups())
+        step = 1.0 if step is None else step
+        if step <= 0 or stop < start:
+            raise ValueError('Invalid range: {}'.format(text))
+        values = [round(start + i * step, 10) for i in range(int((stop - start) / step + 1e-9) + 1)]
+        if all(v.is_integer() for v in values) and step.is_integer():
+            values = [int(v) for v in values]
+        return values
+    if ',' in text:
+        return [json.loads(v) for v in text.split(',')]
+    raise ValueError('Invalid value: {}'.format(text))
+
+
+def expand(params):
+    """Expand the parameters of the params table into a grid
+
+    :param params: dict - Parameters as strings (as found in the params table)
+    :return: list - Parameter dictionaries (values encoded as JSON strings), one per run. A single item is returned if
+        no cell holds a range or a list.
+    """
+    keys, grid = [], []
+    for key, value in params.items():
+        values = parse_value(value)
+        keys.append(key)
+        grid.append([value] if values is None else [json.dumps(v) for v in values])
+    return [dict(zip(keys, combination)) for combination in itertools.product(*grid)]
+
+
+def is_sweep(params):
+    try:
+        return len(expand(params)) > 1
+    except ValueError:
+        return False
+
+
+def submit(submit_fn, params):
+    """Submit one job per parameter set
+
+    :param submit_fn: function - Function submitting a single backtest for a parameter set and returning its job id
+    :param params: dict - Parameters of the params table
+    :return: string - Sweep id
+    """
+    grid = expand(params)
+    if len(grid) > int(oc.cfg['sweep']['max_runs']):
+        raise ValueError('Too many runs in sweep: {} (max: {})'.format(len(grid), oc.cfg['sweep']['max_runs']))
+    for key in [k for k, runs in _sweeps.items() if all(oj.status(j)['state'] is None for _, j in runs)]:
+        del _sweeps[key]  # jobs have been pruned
+    sweep_id = 's' + uuid.uuid4().hex
+    _sweeps[sweep_id] = [
+        (dict(p), submit_fn(p)) for p in grid
+    ]
+    return sweep_id
+
+
+def is_sweep_id(job_id):
+    return job_id in _sweeps
+
+
+def grid_keys(sweep_id):
+    """Names of the parameters which vary within a sweep."""
+    runs = _sweeps.get(sweep_id, [])
+    return [key for key in (runs[0][0] if runs else {}) if len(set(p[key] for p, _ in runs)) > 1]
+
+
+def status(sweep_id):
+    """Aggregated state and timings of the jobs of a sweep (same format as jobs.status)."""
+    states = [oj.status(job_id) for _, job_id in _sweeps.get(sweep_id, [])]
+    if not states:
+        return {'id': sweep_id, 'state': None}
+    names = [s['state'] for s in states]
+    if any(n in (oj.PENDING, oj.RUNNING) for n in names):
+        state = oj.RUNNING if any(n != oj.PENDING for n in names) else oj.PENDING
+    elif oj.DONE in names:
+        state = oj.DONE
+    elif oj.CANCELLED in names:
+        state = oj.CANCELLED
+    else:
+        state = oj.FAILED
+    done = [s for s in states if s['state'] == oj.DONE]
+    return {
+        'id': sweep_id,
+        'state': state,
+        'error': next((s['error'] for s in states if s.get('error')), None),
+        'runs': len(states),
+        'done': len(done),
+        'wait': max((s['wait'] for s in done), default=0),
+        'run': sum(s['run'] or 0 for s in done),
+        'total': max(s.get('total', 0) for s in states)
+    }
+
+
+def job_ids(sweep_id):
+    return [job_id for _, job_id in _sweeps.get(sweep_id, [])]
+
+
+def run_result(sweep_id, run):
+    """Result of a single run of a sweep (None if not available)."""
+    runs = _sweeps.get(sweep_id, [])
+    if not 0 <= run < len(runs):
+        return None
+    return oj.result(runs[run][1]) or None
+
+
+def ranked(sweep_id):
+    """Rows of the finished runs of a sweep ranked by Sharpe ratio
+
+    :param sweep_id: string - Sweep id
+    :return: list - One dictionary per run with the run index, the ranking statistics and the parameters
+    """
+    rows = []
+    for run, (params, job_id) in enumerate(_sweeps.get(sweep_id, [])):
+        result_id = oj.result(job_id)
+        statistic = ors.get_statistic(result_id) if result_id else None
+        if statistic is None:
+            continue
+        curve = statistic['Curve']
+        row = {'Run': run}
+        row.update({key: curve[key] for key in RANKING})
+        row.update({key: params[key] for key in grid_keys(sweep_id)})
+        rows.append(row)
+    # NaN Sharpe ratios (e.g. flat returns) are ranked last
+    return sorted(rows, key=lambda r: r['Sharpe Ratio'] if r['Sharpe Ratio'] == r['Sharpe Ratio'] else -1e300,
+                  reverse=True)
+
+
+def best_result(sweep_id):
+    rows = ranked(sweep_id)
+    return run_result(sweep_id, rows[0]['Run']) if rows else None
@@ -4,26 +4,103 @@ import numpy as np
 import empyrical as ep
 import pandas as pd
 
+import omega_ui.statistics as ost
 
-def create_figure(returns, title):
+
+def downsample(index, values, buckets):
+    """
+        Shape preserving downsampling: the minimum and the maximum of each bucket of consecutive points are kept (in
+        their original order), so that peaks and drawdowns stay visible at any zoom level.
+        :param index: pd.Index
+            Positions of the points
+        :param values: np.ndarray
+            Values of the points
+        :param buckets: int
+            Number of buckets (e.g. width of the plot in pixels)
+        :return: index and values of the kept points (at most 2 per bucket plus the first and last points)
+    """
+    n = len(values)
+    if not buckets or n <= 2 * buckets:
+        return index, values
+    size = -(-n // buckets)
+    rows = -(-n // size)
+    # buckets of equal size (the last one is padded with the last value)
+    padded = np.pad(np.asarray(values, dtype=np.float64), (0, rows * size - n), mode='edge').reshape(rows, size)
+    starts = np.arange(rows) * size
+    kept = np.concatenate([starts + padded.argmin(axis=1), starts + padded.argmax(axis=1), [0, n - 1]])
+    kept = np.unique(np.minimum(kept, n - 1))
+    return index[kept], values[kept]
+
+
+def visible(index, x_range):
+    """
+        Positions of the points of a zoomed range (with the points just outside of it so that the lines reach the edges)
+        :param index: pd.DatetimeIndex
+            Dates of the points
+        :param x_range: tuple
+            First and last dates displayed (strings or datetimes)
+        :return: slice
+    """
+    start, end = (pd.Timestamp(x) for x in x_range)
+    if index.tz is not None:
+        start, end = (x.tz_localize(index.tz) if x.tz is None else x for x in (start, end))
+    first = max(index.searchsorted(start) - 1, 0)
+    last = min(index.searchsorted(end, side='right') + 1, len(index))
+    return slice(first, last)
+
+
+def monthly_returns(aggregates):
+    """
+        Table of the monthly returns, compounded once by statistics.Aggregates (the same returns as the Time metrics)
+        :param aggregates: statistics.Aggregates
+            Compounded returns
+        :return: years (np.ndarray) and monthly returns in % (one row per year, one column per month, 0 for the
+            months without returns)
+    """
+    years = aggregates.months.astype('datetime64[Y]').astype(np.int64) + 1970
+    months = aggregates.months.astype(np.int64) % 12
+    rows = np.unique(years)
+    table = np.zeros((len(rows), 12))
+    table[np.searchsorted(rows, years), months] = aggregates.monthly * 100
+    return rows, table
+
+
+def create_figure(returns, title, robustness=None, width=None, x_range=None, webgl_points=None):
     """
         Creates figure with graphics: drawdown, underwater, heat map with month returns and revenue by year.
         :param returns: pd.Series or np.ndarray
             Daily returns of the strategy, noncumulative.
         :param title: string
             Header of tearsheet
+        :param robustness: dict
+            Equity bands and CAGR histogram of the Monte Carlo analysis (see robustness.analyze), adds a row of graphics
+        :param width: int
+            Width of the plot in pixels, the drawdown and underwater series are downsampled to 2 points per pixel
+            (all the points are sent if not provided)
+        :param x_range: tuple
+            Dates displayed by the drawdown and underwater plots (zoom), only the points of that range are sent
+        :param webgl_points: int
+            Number of points of a series above which it is drawn with WebGL (Scattergl) instead of SVG
         :return: Figure
              Plotly figure that could be displayed using plot or iplot
     """
-    df = returns.to_frame()
-    df['year'] = df.index.year
-    df['month'] = df.index.month
+    aggregates = ost.Aggregates(returns)
 
-    # plot drawdown
+    # the drawdown is computed on the whole series, then only the displayed points are sent
     df_cum_rets = ep.cum_returns(returns, starting_value=1.0)
-    drawdown = go.Scatter(
-        x=df_cum_rets.index,
-        y=df_cum_rets,
+    running_max = np.maximum.accumulate(df_cum_rets)
+    underwater = -100 * ((running_max - df_cum_rets) / running_max)
+    shown = visible(df_cum_rets.index, x_range) if x_range else slice(None)
+    cum_x, cum_y = downsample(df_cum_rets.index[shown], df_cum_rets.values[shown], width)
+    uw_x, uw_y = downsample(underwater.index[shown], underwater.values[shown], width)
+
+    def scatter(x, **kwargs):
+        return (go.Scattergl if webgl_points and len(x) > webgl_points else go.Scatter)(x=x, **kwargs)
+
+    # plot drawdown
+    drawdown = scatter(
+        cum_x,
+        y=cum_y,
         line=dict(
             color='#66B266',
             width=2),
@@ -31,11 +108,9 @@ def create_figure(returns, title):
     )
 
     # plot underwater
-    running_max = np.maximum.accumulate(df_cum_rets)
-    underwater = -100 * ((running_max - df_cum_rets) / running_max)
-    uw = go.Scatter(
-        x=underwater.index,
-        y=underwater,
+    uw = scatter(
+        uw_x,
+        y=uw_y,
         fill='tonexty',
         line=dict(
             color='#FF6A6A',
@@ -43,13 +118,8 @@ def create_figure(returns, title):
         name=''
     )
 
-    pivot_for_hm = pd.pivot_table(
-        df,
-        index='year',
-        columns='month',
-        values='return',
-        aggfunc=np.sum
-    ).fillna(0).apply(lambda x: x * 100)
+    # months and years compounded once, as in the statistics
+    years, values = monthly_returns(aggregates)
 
     custom_color_scale = [
         [0.0, '#C41E27'],
@@ -64,57 +134,56 @@ def create_figure(returns, title):
         [1.0, '#006837']
     ]
 
-    months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+    months = np.array(['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'])
 
-    hover = pivot_for_hm.values.astype(str)
-    for x in range(len(pivot_for_hm.index)):
-        for y in range(len(months)):
-            hover[x][y] = '{} {}: {:,.2f}'.format(pivot_for_hm.index[x], months[y], pivot_for_hm.values[x][y])
+    # format all the cells at once
+    labels = np.char.add(np.char.add(years.astype(str)[:, None], ' '), months[None, :])
+    hover = np.char.add(np.char.add(labels, ': '), np.char.mod('%.2f', values))
+    cells = np.char.mod('%0.1f', values)
 
     heat_map = go.Heatmap(
-        z=pivot_for_hm.values.tolist(),
+        z=values.tolist(),
         colorscale=custom_color_scale,
         showscale=False,
-        x=months,
-        y=pivot_for_hm.index,
-        text=hover,
+        x=months.tolist(),
+        y=years.tolist(),
+        text=hover.tolist(),
         hoverinfo='text',
         name=''
     )
 
-    annotations = []
-    for n, row in enumerate(pivot_for_hm.values.tolist()):
-        for m, val in enumerate(row):
-            annotations.append(
-                go.Annotation(
-                    text='%0.1f' % pivot_for_hm.values.tolist()[n][m],
-                    x=pivot_for_hm.columns[m] - 1,
-                    y=pivot_for_hm.index[n],
-                    xref='x3',
-                    yref='y3',
-                    font=dict(color='#000'),
-                    showarrow=False)
-            )
+    # plain dicts (no validation per cell), the values are written as annotations as the plotly.js version bundled
+    # with dash-core-components does not support texttemplate on heatmaps
+    rows, columns = np.indices(values.shape)
+    annotations = [
+        dict(text=text, x=int(x), y=int(years[y]), xref='x3', yref='y3', font=dict(color='#000'), showarrow=False)
+        for text, x, y in zip(cells.ravel().tolist(), columns.ravel(), rows.ravel())
+    ]
 
     # plot revenue by year
-    df_rby = df.groupby(['year'])[['return']].sum().apply(lambda x: x * 100)
     revenue_by_year = go.Bar(
-        x=df_rby.index,
-        y=df_rby['return'],
+        x=(aggregates.years.astype(np.int64) + 1970).tolist(),
+        y=(aggregates.yearly * 100).tolist(),
         marker=dict(color='#44F'),
         name=''
     )
 
+    specs = [
+        [{'colspan': 4}, None, None, None],
+        [{'colspan': 4}, None, None, None],
+        [{'colspan': 3}, None, None, {}]
+    ]
+    subplot_titles = ['', 'Drawdown (%)', 'Monthly Returns (%)', 'Yearly Returns (%)']
+    if robustness:
+        specs.append([{'colspan': 3}, None, None, {}])
+        subplot_titles += ['Monte Carlo Equity (5-25-50-75-95%)', 'Monte Carlo CAGR (%)']
+
     # draw all plots on the same figure
     fig = pto.make_subplots(
-        rows=3,
+        rows=len(specs),
         cols=4,
-        specs=[
-            [{'colspan': 4}, None, None, None],
-            [{'colspan': 4}, None, None, None],
-            [{'colspan': 3}, None, None, {}]
-        ],
-        subplot_titles=('', 'Drawdown (%)', 'Monthly Returns (%)', 'Yearly Returns (%)'),
+        specs=specs,
+        subplot_titles=subplot_titles,
         horizontal_spacing=0.05,
         vertical_spacing=0.05,
         print_grid=False,
@@ -125,11 +194,14 @@ def create_figure(returns, title):
     fig.append_trace(uw, 2, 1)
     fig.append_trace(heat_map, 3, 1)
     fig.append_trace(revenue_by_year, 3, 4)
+    if robustness:
+        for trace in robustness_traces(robustness):
+            fig.append_trace(trace, 4, 4 if trace['type'] == 'bar' else 1)
 
     fig['layout'].update(
         autosize=False,
         width=1000,
-        height=1200
+        height=1600 if robustness else 1200
     )
 
     fig['layout'].update(showlegend=False, title=title)
@@ -137,12 +209,15 @@ def create_figure(returns, title):
     fig['layout']['xaxis1']['tickformat'] = '%Y-%m-%d'
     fig['layout']['yaxis2']['tickformat'] = '.2f'
     fig['layout']['xaxis2']['tickformat'] = '%Y-%m-%d'
+    if x_range:
+        fig['layout']['xaxis1']['range'] = list(x_range)
+        fig['layout']['xaxis2']['range'] = list(x_range)
     fig['layout']['yaxis4']['tickformat'] = '.2f'
     fig['layout']['yaxis3']['autorange'] = 'reversed'  # direction of years on the heat map
     fig['layout']['yaxis3']['dtick'] = 1  # show all ticks
     fig['layout']['xaxis4']['dtick'] = 1  # show all ticks
     fig['layout']['xaxis4']['tickangle'] = -45  # rotate ticks
-    fig['layout']['annotations'].extend(annotations)
+    fig['layout']['annotations'] = list(fig['layout']['annotations']) + annotations  # plotly 5 tuples are immutable
     fig['layout']['margin']['l'] = 40
     fig['layout']['margin']['r'] = 20
     fig['layout']['margin']['t'] = 40
@@ -151,6 +226,29 @@ def create_figure(returns, title):
     return fig
 
 
+def robustness_traces(robustness):
+    """
+        Traces of the Monte Carlo analysis: equity bands (filled between the 5-95% and 25-75% percentiles) and
+        histogram of the CAGR of the paths
+        :param robustness: dict
+            See robustness.analyze
+        :return: list of traces
+    """
+    x = robustness['x']
+    p5, p25, p50, p75, p95 = robustness['bands']
+    edges = np.asarray(robustness['histogram']['edges'])
+    line = dict(color='#66B266', width=0)
+    return [
+        go.Scatter(x=x, y=p5, line=line, hoverinfo='y', name='5%'),
+        go.Scatter(x=x, y=p95, line=line, fill='tonexty', fillcolor='rgba(102,178,102,0.2)', hoverinfo='y', name='95%'),
+        go.Scatter(x=x, y=p25, line=line, hoverinfo='y', name='25%'),
+        go.Scatter(x=x, y=p75, line=line, fill='tonexty', fillcolor='rgba(102,178,102,0.4)', hoverinfo='y', name='75%'),
+        go.Scatter(x=x, y=p50, line=dict(color='#66B266', width=2), name='50%'),
+        go.Bar(x=((edges[:-1] + edges[1:]) / 2).tolist(), y=robustness['histogram']['counts'], marker=dict(color='#44F'),
+               name='')
+    ]
+
+
 def create_statistic(returns, results):
     """
         Calculates different metrics for strategy
@@ -160,52 +258,94 @@ def create_statistic(returns, results):
             Results from a backtrader backtest
         :return: metrics based on returns and trades
     """
-    df = returns.to_frame()
-    df['year'] = df.index.year
-    df['month'] = df.index.month
-    # Analysis
-    sqn_analysis = results.analyzers.SQN.get_analysis()
     dd_analysis = results.analyzers.drawdown.get_analysis()
-    trades = results.analyzers.trades.get_analysis()
-    df_cum_rets = ep.cum_returns(returns, starting_value=1.0)
-    returns_by_month = df.groupby(['year', 'month'])['return'].sum()
-    df_rby = df.groupby(['year'])[['return']].sum().apply(lambda x: x * 100)
+    trades = results.analyzers.tradelist.get_analysis()
+    return statistic(returns, dd_analysis['max']['drawdown'], dd_analysis['max']['len'], trades['trades'],
+                     trades['open'])
+
+
+def statistic(returns, max_drawdown, max_drawdown_len, trades, still_open=0):
+    """
+        Calculates different metrics for strategy from its returns and its trades (see omega_ui.statistics)
+        :param returns: pd.Series
+            Returns of the strategy (daily or any other bar frequency), noncumulative.
+        :param max_drawdown: float
+            Maximum drawdown (%)
+        :param max_drawdown_len: int
+            Length of the maximum drawdown (bars)
+        :param trades: list
+            Closed trades (date, net PnL, length in bars, symbol), see analyzers.TradeList
+        :param still_open: int
+            Number of trades still open
+        :return: metrics based on returns and trades
+    """
+    result = ost.metrics(returns, trades, still_open)
+    curve, trade, periods = result['curve'], result['trade'], result['time']
     return dict(
         Curve={
-            'Total Return': round((df_cum_rets.iloc[-1] - 1) * 100, 2),
-            'CAGR': round(ep.cagr(returns) * 100, 2),
-            'Sharpe Ratio': round(ep.sharpe_ratio(returns), 2),
-            'Annual Volatility': round(ep.annual_volatility(returns) * 100, 2),
-            'SQN': round(sqn_analysis['sqn'], 2),
-            'R-Squared': round(ep.stability_of_timeseries(returns), 2),
-            'Max Daily Drawdown': round(dd_analysis['max']['drawdown'], 2),
-            'Max Drawdown Duration': dd_analysis['max']['len'],
-            'Trades Per Year': 0  # TODO
+            'Total Return': round(curve['total_return'] * 100, 2),
+            'CAGR': round(curve['cagr'] * 100, 2),
+            'Sharpe Ratio': round(curve['sharpe'], 2),
+            'Annual Volatility': round(curve['volatility'] * 100, 2),
+            'SQN': round(trade['sqn'], 2),
+            'R-Squared': round(curve['r_squared'], 2),
+            'Max Daily Drawdown': round(max_drawdown, 2),
+            'Max Drawdown Duration': max_drawdown_len,
+            'Trades Per Year': round(trade['per_year'], 2)
         },
         Trade={
-            'Trade Winning %': round(trades['won']['total'] / trades['total']['total'] * 100, 2),
-            'Average Trade': round(trades['pnl']['net']['average'], 2),
-            'Average Win': round(trades['won']['pnl']['average'], 2),
-            'Average Loss': round(trades['lost']['pnl']['average'], 2),
-            'Best Trade': round(trades['won']['pnl']['max'], 2),
-            'Worst Trade': round(trades['lost']['pnl']['max'], 2),
-            'Worst Trade Date': 0,  # TODO
-            'Avg Days in Trade': round(trades['len']['average'], 2),
-            'Trades': trades['total']['total']
+            'Trade Winning %': round(trade['winning'] * 100, 2),
+            'Average Trade': round(trade['average'], 2),
+            'Average Win': round(trade['average_win'], 2),
+            'Average Loss': round(trade['average_loss'], 2),
+            'Best Trade': round(trade['best'], 2),
+            'Worst Trade': round(trade['worst'], 2),
+            'Worst Trade Date': trade['worst_date'] or '-',
+            'Avg Days in Trade': round(trade['average_length'], 2),
+            'Trades': trade['trades']
         },
         Time={
-            'Winning Months %': round(len(returns_by_month.loc[lambda x: x > 0]) / len(returns_by_month.index) * 100, 2),
-            'Average Winning Month %': round(returns_by_month.loc[lambda x: x > 0].mean() * 100, 2),
-            'Average Losing Month %': round(returns_by_month.loc[lambda x: x < 0].mean() * 100, 2),
-            'Best Month %': round(returns_by_month.max() * 100, 2),
-            'Worst Month %': round(returns_by_month.min() * 100, 2),
-            'Winning Years %': round(len(df_rby[df_rby['return'] > 0].index) / len(df_rby.index) * 100, 2),
-            'Best Year %': round(df_rby.max()['return'], 2),
-            'Worst Year %': round(df_rby.min()['return'], 2),
+            'Winning Months %': round(periods['winning_months'] * 100, 2),
+            'Average Winning Month %': round(periods['average_winning_month'] * 100, 2),
+            'Average Losing Month %': round(periods['average_losing_month'] * 100, 2),
+            'Best Month %': round(periods['best_month'] * 100, 2),
+            'Worst Month %': round(periods['worst_month'] * 100, 2),
+            'Winning Years %': round(periods['winning_years'] * 100, 2),
+            'Best Year %': round(periods['best_year'] * 100, 2),
+            'Worst Year %': round(periods['worst_year'] * 100, 2),
         }
     )
 
 
+def drawdown(values):
+    """Maximum drawdown (%) and its length (bars) of a portfolio value series (as bt.analyzers.DrawDown)."""
+    values = np.asarray(values, dtype=np.float64)
+    peaks = np.maximum.accumulate(values)
+    dd = 100.0 * (peaks - values) / peaks
+    # length of a drawdown: bars since the last peak
+    last_peak = np.maximum.accumulate(np.where(dd == 0, np.arange(len(values)), 0))
+    lengths = np.arange(len(values)) - last_peak
+    return (dd.max() if len(dd) else 0.0), (int(lengths.max()) if len(lengths) else 0)
+
+
+def combined_statistic(returns, values, trades, still_open=0):
+    """
+        Calculates the metrics of a strategy whose returns have been combined from several backtests (portfolio of
+        symbols, walk-forward windows)
+        :param returns: pd.Series
+            Daily returns, noncumulative.
+        :param values: np.ndarray
+            Portfolio values (starting with the initial cash)
+        :param trades: list
+            Closed trades (date, net PnL, length in bars, symbol), see analyzers.TradeList
+        :param still_open: int
+            Number of trades still open
+        :return: metrics based on returns and trades
+    """
+    max_drawdown, max_drawdown_len = drawdown(values)
+    return statistic(returns, max_drawdown, max_drawdown_len, trades, still_open)
+
+
 def create_tearsheet(results, title):
     """
         Creates tearsheet with graphics: drawdown, underwater, heat map with month returns, revenue by year and also,
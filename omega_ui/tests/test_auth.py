@@ -0,0 +1,56 @@
+import base64
+import json
+
+import flask
+import pytest
+
+import omega_ui.auth as oau
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """Flask app with a protected route and a users file of one user."""
+    users_file = tmp_path / 'users.json'
+    users_file.write_text(json.dumps({'alice': 'secret'}))
+    monkeypatch.setattr(oau, 'users_file', str(users_file))
+    monkeypatch.setattr(oau, 'enabled', True)
+    app = flask.Flask(__name__)
+
+    @app.route('/runs/<int:run_id>')
+    @oau.protected
+    def run(run_id):
+        return flask.jsonify({'id': run_id})
+
+    return app.test_client()
+
+
+def credentials(user, password):
+    return {'Authorization': 'Basic ' + base64.b64encode('{}:{}'.format(user, password).encode()).decode()}
+
+
+def test_request_without_credentials(client):
+    response = client.get('/runs/1')
+    assert response.status_code == 401
+    assert response.headers['WWW-Authenticate'] == oau.REALM
+
+
+@pytest.mark.parametrize('user,password', [('alice', 'wrong'), ('bob', 'secret'), ('alice', '')])
+def test_request_with_wrong_credentials(client, user, password):
+    assert client.get('/runs/1', headers=credentials(user, password)).status_code == 401
+
+
+def test_request_of_a_user(client):
+    response = client.get('/runs/1', headers=credentials('alice', 'secret'))
+    assert response.status_code == 200
+    assert response.get_json() == {'id': 1}
+
+
+def test_disabled_in_debug_mode(client, monkeypatch):
+    monkeypatch.setattr(oau, 'enabled', False)
+    assert client.get('/runs/1').status_code == 200
+
+
+def test_missing_users_file(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(oau, 'users_file', str(tmp_path / 'missing.json'))
+    assert oau.users() == {}
+    assert client.get('/runs/1', headers=credentials('alice', 'secret')).status_code == 401
@@ -1,6 +1,5 @@
 import logging
 import os
-import pandas as pd
 
 import backtrader as bt
 
@@ -88,15 +87,26 @@ class ExampleBacktest(ob.Backtest):
     def get_parameters(self, strategy, symbols):
         return {'param1': 10, 'param2': 20}
 
+    def get_date_range(self, symbols):
+        path_dir = os.path.dirname(os.path.realpath(__file__))
+        indexes = [self.load_data(os.path.join(path_dir, '{}.csv'.format(s))).p.dataname.index for s in symbols]
+        return max(index[0] for index in indexes), min(index[-1] for index in indexes)
+
+    def get_data_fingerprint(self, symbols):
+        path_dir = os.path.dirname(os.path.realpath(__file__))
+        fingerprint = []
+        for s in symbols:
+            stat = os.stat(os.path.join(path_dir, '{}.csv'.format(s)))
+            fingerprint.append('{}:{}:{}'.format(s, stat.st_size, stat.st_mtime))
+        return ';'.join(fingerprint)
+
     def run(self, symbols, cash, strategy, **params):
         path_dir = os.path.dirname(os.path.realpath(__file__))
         # Setup Cerebro
         cerebro = ob.Backtest.setup_cerebro(cash)
         # Add Data
         for s in symbols:
-            df = pd.read_csv(os.path.join(path_dir, '{}.csv'.format(s)), parse_dates=True, index_col=0)
-            data = bt.feeds.PandasData(dataname=df)
-            cerebro.adddata(data)
+            cerebro.adddata(self.load_data(os.path.join(path_dir, '{}.csv'.format(s))))
         # Strategy
         cerebro.addstrategy(strategy, **params)
         # Backtest
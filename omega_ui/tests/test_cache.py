@@ -0,0 +1,64 @@
+import sys
+
+import pytest
+
+import omega_ui.cache as oca
+import omega_ui.configuration as oc
+import omega_ui.statistics as ost
+
+
+@pytest.fixture
+def strategies(tmp_path, monkeypatch):
+    """A strategy module and a strategy package importable from a temporary directory."""
+    (tmp_path / 'key_module.py').write_text('PERIOD = 10\n')
+    package = tmp_path / 'key_package'
+    (package / 'signals').mkdir(parents=True)
+    (package / '__init__.py').write_text('')
+    (package / 'signals' / '__init__.py').write_text('')
+    (package / 'signals' / 'cross.py').write_text('FAST = 5\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setitem(oc.cfg['default'], 'module', 'key_module')
+    yield tmp_path
+    for name in [n for n in sys.modules if n.startswith('key_')]:
+        del sys.modules[name]
+
+
+def key(module='key_module', strategy='Strategy', symbols=('AAPL',), params=None, fingerprint='f'):
+    return oca.make_key(module, strategy, list(symbols), params or {'Cash': '10000'}, fingerprint)
+
+
+def test_same_inputs_same_key(strategies):
+    assert key() == key()
+    assert key(params={'Cash': '10000', 'a': '1'}) == key(params={'a': '1', 'Cash': '10000'})
+
+
+def test_inputs_change_the_key(strategies):
+    keys = {key(), key(strategy='Other'), key(symbols=('MSFT',)), key(params={'Cash': '5000'}), key(fingerprint='g'),
+            key(fingerprint=['f', ['2001-01-02', '2001-06-30']])}
+    assert len(keys) == 6
+
+
+def test_module_source_changes_the_key(strategies):
+    before = key()
+    (strategies / 'key_module.py').write_text('PERIOD = 20\n')
+    assert key() != before
+
+
+def test_package_submodule_changes_the_key(strategies):
+    before = key(module='key_package')
+    (strategies / 'key_package' / 'signals' / 'cross.py').write_text('FAST = 8\n')
+    assert key(module='key_package') != before
+    added = key(module='key_package')
+    (strategies / 'key_package' / 'signals' / 'exit.py').write_text('SLOW = 30\n')
+    assert key(module='key_package') != added
+
+
+def test_statistics_version_changes_the_key(strategies, monkeypatch):
+    before = key()
+    monkeypatch.setattr(ost, 'VERSION', ost.VERSION + 1)
+    assert key() != before
+
+
+def test_unknown_module(strategies):
+    assert oca.module_source('key_missing') == b''
+    assert key(module='key_missing') == key(module='key_missing')
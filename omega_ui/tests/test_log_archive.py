@@ -0,0 +1,66 @@
+import logging
+
+import pytest
+
+import omega_ui.configuration as oc
+import omega_ui.log_archive as ola
+
+
+@pytest.fixture
+def run(tmp_path, monkeypatch):
+    """Run of 35 records (every third one a WARNING) written in chunks of 10 records."""
+    monkeypatch.setitem(oc.cfg['logging'], 'root', str(tmp_path))
+    run_id = ola.create_run('test')
+    handler = ola.ArchiveHandler(run_id, chunk_records=10)
+    logger = logging.getLogger('test_log_archive')
+    records = []
+    for n in range(35):
+        level = logging.WARNING if n % 3 == 0 else logging.DEBUG
+        records.append({'level': logging.getLevelName(level), 'logger': logger.name, 'msg': 'message {}'.format(n)})
+        handler.handle(logger.makeRecord(logger.name, level, __file__, 0, 'message %d', (n,), None))
+    handler.close()
+    return run_id, records
+
+
+def test_page_of_all_records(run):
+    run_id, records = run
+    result = ola.page(run_id, offset=0, limit=200)
+    assert result['total'] == 35
+    assert result['records'] == records
+
+
+@pytest.mark.parametrize('offset,limit', [(0, 10), (5, 10), (8, 15), (10, 10), (30, 10), (34, 1)])
+def test_page_across_chunks(run, offset, limit):
+    run_id, records = run
+    result = ola.page(run_id, offset=offset, limit=limit)
+    assert result['total'] == 35
+    assert result['offset'] == offset
+    assert result['records'] == records[offset:offset + limit]
+
+
+def test_page_filtered_by_level(run):
+    run_id, records = run
+    warnings = [r for r in records if r['level'] == 'WARNING']
+    result = ola.page(run_id, levels=['warning'], offset=3, limit=4)
+    assert result['total'] == len(warnings) == 12
+    assert result['records'] == warnings[3:7]
+    assert ola.page(run_id, levels=['ERROR'])['total'] == 0
+
+
+def test_page_after_the_last_record(run):
+    run_id, _ = run
+    result = ola.page(run_id, offset=35, limit=10)
+    assert result['total'] == 35
+    assert result['records'] == []
+
+
+def test_records_appended_to_a_finished_run(run):
+    run_id, records = run
+    handler = ola.ArchiveHandler(run_id, chunk_records=10)
+    logger = logging.getLogger('test_log_archive')
+    handler.handle(logger.makeRecord(logger.name, logging.INFO, __file__, 0, 'appended', None, None))
+    handler.close()
+    result = ola.page(run_id, offset=30, limit=10)
+    assert result['total'] == 36
+    assert result['records'] == records[30:] + [{'level': 'INFO', 'logger': logger.name, 'msg': 'appended'}]
+    assert list(ola.text(run_id))[-1] == 'INFO - appended\n'
@@ -0,0 +1,119 @@
+import contextlib
+import sqlite3
+
+import fakeredis
+import numpy as np
+import pandas as pd
+import pytest
+
+import omega_ui.configuration as oc
+import omega_ui.connections as oconn
+import omega_ui.results as ors
+import omega_ui.runs as oru
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """Runs root in a temporary directory and a fake Redis for the result store."""
+    redis = fakeredis.FakeStrictRedis()
+    monkeypatch.setattr(oconn, 'redis_client', lambda: redis)
+    monkeypatch.setitem(oc.cfg['runs'], 'root', str(tmp_path))
+    return tmp_path
+
+
+def result(strategy='SmaCross', symbols=('AAPL',), sharpe=1.2, trades=None):
+    index = pd.date_range('2010-01-04', periods=300, freq='B', tz='UTC')
+    returns = pd.Series(np.random.RandomState(0).normal(0.0005, 0.01, 300), index=index, name='return')
+    statistic = {'Curve': {'Sharpe Ratio': sharpe, 'Total Return': 12.5, 'Max Daily Drawdown': -8.1},
+                 'Trade': {'Trades': 2}}
+    trades = trades if trades is not None else [
+        ['2010-03-01T00:00:00', 150.5, 12, 'AAPL'], ['2010-06-01T00:00:00', -75.25, 30, 'AAPL']]
+    inputs = {'module': 'strategies', 'strategy': strategy, 'symbols': list(symbols), 'params': {'period': 15}}
+    result_id = ors.put(returns, statistic, '{}: 1,250.00'.format(list(symbols)), trades={'trades': trades, 'open': 1},
+                        cash=10000.0, inputs=inputs)
+    return result_id, returns, statistic, trades
+
+
+def test_save_and_load(store):
+    result_id, returns, statistic, trades = result()
+    run_id = oru.save(result_id, 'first run')
+    loaded, loaded_trades, header = oru.load(run_id)
+    np.testing.assert_array_equal(loaded.values, returns.values)
+    np.testing.assert_array_equal(loaded.index.values, returns.index.tz_localize(None).values)
+    assert loaded_trades == trades
+    assert header['trades'] == {'open': 1}
+    assert header['cash'] == 10000.0
+    run = oru.get(run_id)
+    assert run['statistic'] == statistic
+    assert run['params'] == {'period': 15}
+    assert (run['strategy'], run['symbols'], run['notes']) == ('SmaCross', 'AAPL', 'first run')
+
+
+def test_save_without_trades(store):
+    result_id, returns, _, _ = result(trades=[])
+    _, trades, _ = oru.load(oru.save(result_id))
+    assert trades == []
+
+
+def test_save_expired_result(store):
+    with pytest.raises(KeyError):
+        oru.save('missing')
+
+
+def test_open_run_restores_the_result(store):
+    result_id, returns, statistic, trades = result()
+    run_id = oru.save(result_id)
+    opened = oru.open_run(run_id)
+    assert oru.run_id(opened) == run_id and oru.run_id(result_id) is None
+    header = ors.get_header(opened)
+    assert header['statistic'] == statistic
+    assert header['trades'] == {'trades': trades, 'open': 1}
+    np.testing.assert_array_equal(ors.get_returns(opened).values, returns.values)
+    with pytest.raises(KeyError):
+        oru.open_run(run_id + 1)
+
+
+def test_runs_filter(store):
+    ids = [oru.save(result(strategy, symbols)[0], notes) for strategy, symbols, notes in [
+        ('SmaCross', ('AAPL',), 'baseline'),
+        ('SmaCross', ('MSFT', 'AAPL'), 'wider stops'),
+        ('Breakout', ('MSFT',), 'test 100% invested'),
+        ('Breakout', ('TSLA',), 'fast_exit variant')]]
+    assert [r['id'] for r in oru.runs()] == ids[::-1]
+    assert [r['id'] for r in oru.runs('smacross')] == [ids[1], ids[0]]
+    assert [r['id'] for r in oru.runs('msft breakout')] == [ids[2]]  # every word must match
+    assert [r['id'] for r in oru.runs('  AAPL  ')] == [ids[1], ids[0]]
+    assert oru.runs('nothing') == []
+    assert [r['id'] for r in oru.runs(limit=2, offset=1)] == [ids[2], ids[1]]
+    assert [row['Run'] for row in oru.rows('breakout')] == [ids[3], ids[2]]
+
+
+def test_runs_filter_escapes_like_wildcards(store):
+    ids = [oru.save(result()[0], notes) for notes in ('100% invested', '1000 invested', 'fast_exit', 'fastexit',
+                                                     'back\\slash')]
+    assert [r['id'] for r in oru.runs('100%')] == [ids[0]]
+    assert [r['id'] for r in oru.runs('fast_exit')] == [ids[2]]
+    assert [r['id'] for r in oru.runs('%')] == [ids[0]]
+    assert [r['id'] for r in oru.runs('_')] == [ids[2]]
+    assert [r['id'] for r in oru.runs('back\\slash')] == [ids[4]]
+
+
+def test_runs_filter_of_a_large_index_saved_before_the_search_index(store):
+    # 100k runs in a runs.db without runs_search: the index is built on the first connection
+    strategies, symbols = ['smacross', 'breakout', 'meanreversion', 'momentum'], ['aapl', 'msft', 'tsla', 'spy']
+    search = ['{} {}, {} run {} note{}'.format(strategies[n % 4], symbols[n % 3], symbols[(n // 7) % 4], n, n % 997)
+              for n in range(100000)]
+    with contextlib.closing(sqlite3.connect(oru.path())) as connection, connection:
+        connection.executescript(oru._SCHEMA)
+        connection.executemany('INSERT INTO runs (created, strategy, search) VALUES (0, ?, ?)',
+                               [(s.split()[0], s) for s in search])
+    for text in ('note123 tsla', 'momentum spy', 'RUN 9999', 'n 1', 'ote99'):
+        words = text.lower().split()
+        expected = [n + 1 for n in range(len(search) - 1, -1, -1) if all(w in search[n] for w in words)][:50]
+        assert [r['id'] for r in oru.runs(text)] == expected, text
+    where, args = oru._where('note123 tsla')
+    with contextlib.closing(oru.connect()) as connection:
+        plan = connection.execute('EXPLAIN QUERY PLAN SELECT id FROM runs{} ORDER BY id DESC'.format(where), args)
+        details = [row[-1] for row in plan.fetchall()]
+    assert 'SCAN runs' not in details
+    assert any(d.startswith('SCAN runs_search VIRTUAL TABLE') for d in details)
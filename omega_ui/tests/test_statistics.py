@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+import omega_ui.benchmarks.statistics as obs
+import omega_ui.configuration as oc
+import omega_ui.datastore as ods
+import omega_ui.statistics as ost
+import omega_ui.tearsheet as ots
+import omega_ui.tests.test_backtest as otb
+
+# Output of create_statistic on AAPL before the statistics engine (empyrical on the raw returns, months and years as
+# sums of the daily returns, Trades Per Year and Worst Trade Date not computed)
+BASELINE = {
+    'Curve': {'Total Return': -3.55, 'CAGR': -0.2, 'Sharpe Ratio': 0.03, 'Annual Volatility': 10.51, 'SQN': -0.04,
+              'R-Squared': 0.02, 'Max Daily Drawdown': 28.67, 'Max Drawdown Duration': 3037, 'Trades Per Year': 0},
+    'Trade': {'Trade Winning %': 60.63, 'Average Trade': -2.16, 'Average Win': 887.74, 'Average Loss': -1377.2,
+              'Best Trade': 6309.16, 'Worst Trade': -17050.65, 'Worst Trade Date': 0, 'Avg Days in Trade': 6.05,
+              'Trades': 762},
+    'Time': {'Winning Months %': 48.42, 'Average Winning Month %': 1.98, 'Average Losing Month %': -1.8,
+             'Best Month %': 7.07, 'Worst Month %': -15.39, 'Winning Years %': 36.84, 'Best Year %': 30.87,
+             'Worst Year %': -23.71}
+}
+# Metrics that moved: the former TODOs are computed, months and years compound the daily returns
+MOVED = {
+    ('Curve', 'Trades Per Year'): 41.64,
+    ('Trade', 'Worst Trade Date'): '2000-10-16',
+    ('Time', 'Winning Months %'): 47.06,
+    ('Time', 'Average Winning Month %'): 2.03,
+    ('Time', 'Average Losing Month %'): -1.77,
+    ('Time', 'Best Month %'): 7.12,
+    ('Time', 'Worst Month %'): -15.29,
+    ('Time', 'Best Year %'): 34.48,
+    ('Time', 'Worst Year %'): -23.11
+}
+
+
+@pytest.fixture(scope='module')
+def backtest(tmp_path_factory):
+    """Returns, trades and analyzers of the example strategy on AAPL (data store in a temporary directory)."""
+    root = oc.cfg['data']['root']
+    oc.cfg['data']['root'] = str(tmp_path_factory.mktemp('data'))
+    ods._store = None
+    try:
+        _, strat = otb.ExampleBacktest().run(['AAPL'], 100000, otb.TestStrategy)
+    finally:
+        oc.cfg['data']['root'] = root
+        ods._store = None
+    returns, _, _, _ = strat.analyzers.pyfolio.get_pf_items()
+    trades = strat.analyzers.tradelist.get_analysis()
+    return returns, trades, strat
+
+
+def test_trade_metrics_match_trade_analyzer(backtest):
+    returns, trades, strat = backtest
+    analysis = strat.analyzers.trades.get_analysis()
+    result = ost.metrics(returns, trades['trades'], trades['open'])['trade']
+    assert len(trades['trades']) == analysis.total.closed
+    assert result['trades'] == analysis.total.total
+    assert result['winning'] == pytest.approx(analysis.won.total / analysis.total.total)
+    assert result['average'] == pytest.approx(analysis.pnl.net.average)
+    assert result['average_win'] == pytest.approx(analysis.won.pnl.average)
+    assert result['average_loss'] == pytest.approx(analysis.lost.pnl.average)
+    assert result['best'] == pytest.approx(analysis.won.pnl.max)
+    assert result['worst'] == pytest.approx(analysis.lost.pnl.max)
+    assert result['average_length'] == pytest.approx(analysis.len.average)
+
+
+def test_sqn_matches_sqn_analyzer(backtest):
+    returns, trades, strat = backtest
+    result = ost.metrics(returns, trades['trades'], trades['open'])['trade']
+    assert result['sqn'] == pytest.approx(strat.analyzers.SQN.get_analysis().sqn)
+
+
+def test_worst_trade_date(backtest):
+    returns, trades, _ = backtest
+    result = ost.metrics(returns, trades['trades'], trades['open'])['trade']
+    worst = min(trades['trades'], key=lambda t: t[1])
+    assert result['worst_date'] == worst[0][:10]
+    assert ost.metrics(returns, [], 0)['trade']['worst_date'] is None
+
+
+def test_curve_and_time_metrics_match_the_reference(backtest):
+    returns, trades, _ = backtest
+    expected = obs.reference(returns, trades['trades'], trades['open'])
+    assert obs.compare(ost.metrics(returns, trades['trades'], trades['open']), expected) == []
+
+
+@pytest.mark.parametrize('case', range(4))
+def test_metrics_match_the_reference_on_synthetic_returns(case):
+    name, returns, trades, still_open = obs.cases(200)[case]
+    differences = obs.compare(ost.metrics(returns, trades, still_open), obs.reference(returns, trades, still_open))
+    assert differences == [], name
+
+
+def test_metrics_are_python_floats(backtest):
+    returns, trades, _ = backtest
+    for values in ost.metrics(returns, trades['trades'], trades['open']).values():
+        assert not any(isinstance(v, np.generic) for v in values.values())
+
+
+def test_statistic_against_the_baseline(backtest):
+    returns, _, strat = backtest
+    statistic = ots.create_statistic(returns, strat)
+    assert {s: list(v) for s, v in statistic.items()} == {s: list(v) for s, v in BASELINE.items()}
+    moved = {(s, k): v for s, values in statistic.items() for k, v in values.items() if v != BASELINE[s][k]}
+    assert moved == MOVED
@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+import omega_ui.configuration as oc
+import omega_ui.sweep as osw
+
+
+def test_parse_value_single_values():
+    assert osw.parse_value('10') is None
+    assert osw.parse_value('1.5') is None
+    assert osw.parse_value('"text"') is None
+    assert osw.parse_value('[1, 2]') is None  # a JSON list is a single value
+
+
+def test_parse_value_ranges():
+    assert osw.parse_value('5..20 step 5') == [5, 10, 15, 20]
+    assert osw.parse_value('1..3') == [1, 2, 3]
+    assert osw.parse_value(' -2 .. 2 step 2 ') == [-2, 0, 2]
+    assert osw.parse_value('0.1..0.3 step 0.1') == [0.1, 0.2, 0.3]
+    assert osw.parse_value('1..2 step 0.5') == [1.0, 1.5, 2.0]
+    assert osw.parse_value('5..21 step 5') == [5, 10, 15, 20]  # the stop is included only if reached
+
+
+def test_parse_value_lists():
+    assert osw.parse_value('5, 10, 20') == [5, 10, 20]
+    assert osw.parse_value('"a", "b"') == ['a', 'b']
+
+
+@pytest.mark.parametrize('text', ['10..5', '1..5 step 0', '1..5 step -1', 'abc', '5..'])
+def test_parse_value_invalid(text):
+    with pytest.raises(ValueError):
+        osw.parse_value(text)
+
+
+def test_expand_grid():
+    grid = osw.expand({'Cash': '10000', 'fast': '5..10 step 5', 'slow': '20, 30, 40'})
+    assert len(grid) == 6
+    assert grid[0] == {'Cash': '10000', 'fast': '5', 'slow': '20'}
+    assert grid[-1] == {'Cash': '10000', 'fast': '10', 'slow': '40'}
+    assert {(p['fast'], p['slow']) for p in grid} == {(f, s) for f in ('5', '10') for s in ('20', '30', '40')}
+    # The values are JSON strings, as in the params table
+    assert all(json.loads(p['fast']) in (5, 10) for p in grid)
+
+
+def test_expand_without_sweep():
+    params = {'Cash': '10000', 'period': '15'}
+    assert osw.expand(params) == [params]
+    assert not osw.is_sweep(params)
+    assert osw.is_sweep({'period': '10, 15'})
+    assert not osw.is_sweep({'period': '10..5'})  # invalid cells are not sweeps
+
+
+def test_submit_limits_the_number_of_runs(monkeypatch):
+    monkeypatch.setitem(oc.cfg['sweep'], 'max_runs', 4)
+    submitted = []
+    sweep_id = osw.submit(lambda p: submitted.append(p) or 'job{}'.format(len(submitted)), {'a': '1, 2', 'b': '3, 4'})
+    assert osw.is_sweep_id(sweep_id)
+    assert osw.job_ids(sweep_id) == ['job1', 'job2', 'job3', 'job4']
+    assert osw.grid_keys(sweep_id) == ['a', 'b']
+    with pytest.raises(ValueError):
+        osw.submit(lambda p: 'job', {'a': '1..5'})
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import omega_ui.tearsheet as ots
+
+
+def series(n, seed=0):
+    index = pd.date_range('2000-01-03', periods=n, freq='D')
+    return index, np.cumsum(np.random.RandomState(seed).normal(0, 1, n))
+
+
+def test_downsample_small_series_unchanged():
+    index, values = series(100)
+    kept_index, kept_values = ots.downsample(index, values, 50)
+    assert kept_index is index and kept_values is values
+    assert ots.downsample(index, values, 0)[1] is values
+    assert ots.downsample(index, values, None)[1] is values
+
+
+@pytest.mark.parametrize('n,buckets', [(10000, 100), (10001, 100), (12345, 1200), (250, 100)])
+def test_downsample_keeps_extremes(n, buckets):
+    index, values = series(n)
+    kept_index, kept_values = ots.downsample(index, values, buckets)
+    assert len(kept_values) <= 2 * buckets + 2
+    # First and last points, global extremes, original order and matching dates
+    assert kept_index[0] == index[0] and kept_index[-1] == index[-1]
+    assert kept_values.min() == values.min() and kept_values.max() == values.max()
+    assert kept_index.is_monotonic_increasing
+    positions = index.get_indexer(kept_index)
+    np.testing.assert_array_equal(values[positions], kept_values)
+
+
+def test_downsample_keeps_the_extremes_of_every_bucket():
+    index, values = series(10000, seed=1)
+    kept_index, kept_values = ots.downsample(index, values, 100)
+    positions = set(index.get_indexer(kept_index))
+    for start in range(0, 10000, 100):
+        bucket = values[start:start + 100]
+        assert start + int(bucket.argmin()) in positions
+        assert start + int(bucket.argmax()) in positions
+
+
+def test_downsample_flat_series():
+    index = pd.date_range('2000-01-03', periods=1000, freq='D')
+    kept_index, kept_values = ots.downsample(index, np.zeros(1000), 10)
+    assert len(kept_values) <= 22
+    assert kept_index[0] == index[0] and kept_index[-1] == index[-1]
+
+
+def volatile_returns():
+    index = pd.bdate_range('2001-01-01', periods=1500, tz='UTC')
+    return pd.Series(np.random.RandomState(2).normal(0.001, 0.04, 1500), index=index, name='return')
+
+
+def test_heatmap_cells_are_the_monthly_statistics():
+    returns = volatile_returns()
+    fig = ots.create_figure(returns, 'Test')
+    heatmap = next(trace for trace in fig['data'] if trace['type'] == 'heatmap')
+    cells = np.array(heatmap['z'])
+    compounded = (1 + returns).groupby([returns.index.year, returns.index.month]).prod() - 1
+    assert cells.shape == (len(heatmap['y']), 12)
+    for (year, month), value in compounded.items():
+        assert cells[list(heatmap['y']).index(year), month - 1] == pytest.approx(value * 100)
+    time = ots.statistic(returns, 0.0, 0, [])['Time']
+    assert time['Best Month %'] == round(cells.max(), 2)
+    assert time['Worst Month %'] == round(cells.min(), 2)
+
+
+def test_yearly_bars_are_the_yearly_statistics():
+    returns = volatile_returns()
+    fig = ots.create_figure(returns, 'Test')
+    bars = next(trace for trace in fig['data'] if trace['type'] == 'bar')
+    compounded = (1 + returns).groupby(returns.index.year).prod() - 1
+    assert list(bars['x']) == list(compounded.index)
+    np.testing.assert_allclose(bars['y'], compounded.values * 100)
+    time = ots.statistic(returns, 0.0, 0, [])['Time']
+    assert time['Best Year %'] == round(max(bars['y']), 2)
+    assert time['Worst Year %'] == round(min(bars['y']), 2)
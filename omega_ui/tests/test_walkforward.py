@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import omega_ui.backtest as obt
+import omega_ui.configuration as oc
+import omega_ui.datastore as ods
+import omega_ui.walkforward as owf
+
+
+def daily_returns(start='2010-01-04', days=60):
+    index = pd.bdate_range(start, periods=days, tz='UTC')
+    return pd.Series(np.random.RandomState(0).normal(0.0005, 0.01, days), index=index, name='return')
+
+
+def test_trim_drops_the_warm_up():
+    returns = daily_returns()
+    trades = {'trades': [['2010-01-20T00:00:00', 100.0, 5, 'AAPL'], ['2010-02-10T00:00:00', -50.0, 3, 'AAPL']],
+              'open': 1}
+    kept, kept_trades, statistic = owf.trim(returns, trades, ['2010-01-13T00:00:00', '2010-02-05T00:00:00'],
+                                            '2010-02-01')
+    assert kept.index[0] == pd.Timestamp('2010-02-01', tz='UTC')
+    assert kept_trades == {'trades': [['2010-02-10T00:00:00', -50.0, 3, 'AAPL']], 'open': 1}
+    assert statistic['Trade']['Trades'] == 2
+
+
+def test_trim_drops_a_trade_crossing_the_start_of_the_window():
+    returns = daily_returns()
+    # Opened during the warm-up and closed in the test window: part of its PnL was made before the window
+    crossing = ['2010-02-03T00:00:00', 500.0, 10, 'AAPL']
+    inside = ['2010-02-12T00:00:00', 20.0, 2, 'AAPL']
+    _, kept_trades, statistic = owf.trim(returns, {'trades': [crossing, inside], 'open': 0},
+                                         ['2010-01-20T00:00:00', '2010-02-10T00:00:00'], '2010-02-01')
+    assert kept_trades['trades'] == [inside]
+    assert statistic['Trade']['Best Trade'] == 20.0
+
+
+@pytest.fixture
+def minute_data(tmp_path, monkeypatch):
+    """CSV file of the minute bars of the regular session of 5 business days (data store in a temporary directory)."""
+    session = pd.timedelta_range('09:30:00', '15:59:00', freq='min')
+    index = pd.DatetimeIndex([d + t for d in pd.bdate_range('2015-01-05', periods=5) for t in session], name='Date')
+    close = 100 + np.cumsum(np.random.RandomState(0).normal(0, 0.05, len(index)))
+    frame = pd.DataFrame({'Open': close, 'High': close, 'Low': close, 'Close': close, 'Volume': 100}, index=index)
+    path = tmp_path / 'MINUTE.csv'
+    frame.to_csv(str(path))
+    monkeypatch.setitem(oc.cfg['data'], 'root', str(tmp_path / 'store'))
+    monkeypatch.setattr(ods, '_store', None)
+    yield str(path)
+    obt.set_window(None, None)
+
+
+def test_window_keeps_the_intraday_bars_of_its_last_day(minute_data):
+    obt.set_window(owf.to_datetime('2015-01-06'), owf.end_of_day('2015-01-07'))
+    index = obt.Backtest.load_data(minute_data).p.dataname.index
+    assert index[0] == pd.Timestamp('2015-01-06 09:30')
+    assert index[-1] == pd.Timestamp('2015-01-07 15:59')
+    assert len(index) == 2 * 390
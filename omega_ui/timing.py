@@ -0,0 +1,79 @@
+import contextlib
+import cProfile
+import os
+import time
+
+import omega_ui.configuration as oc
+
+
+"""Timing module
+
+Durations of the stages of a backtest (module reload, data loading, cerebro.run, analyzers, statistics, storage of the
+result) and of its display (figure and statistics callbacks). The spans are stored with the result, shown in the
+Performance section of the statistics and written to the log of the run. When logging/profile is set, cerebro.run is
+also run under cProfile and the pstats dump of the run can be downloaded from /profiles/<log run id>.
+"""
+PHASES = ('Backtest', 'Statistic', 'Figure')
+
+_context = {'timer': None, 'profile': None}
+
+
+class Timer:
+    """Spans of the stages of a phase, in the order they started (stages run several times are summed)."""
+    def __init__(self):
+        self.spans = []
+        self.start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        for span in self.spans:
+            if span[0] == name:
+                span[1] += seconds
+                return
+        self.spans.append([name, seconds])
+
+    def result(self):
+        """Spans in seconds (rounded to the ms) followed by the total duration of the phase."""
+        return [[name, round(seconds, 3)] for name, seconds in self.spans] + [
+            ['Total', round(time.perf_counter() - self.start, 3)]]
+
+
+def summary(spans):
+    return ', '.join('{} {:.3f}s'.format(name, seconds) for name, seconds in spans)
+
+
+def configure(timer, profile=None):
+    """Set the timer (and the path of the profile dump) of the backtest running in this process (None to disable)."""
+    _context['timer'] = timer
+    _context['profile'] = profile
+
+
+def span(name):
+    """Time a stage of the backtest running in this process (does nothing outside of backend.create_ts)."""
+    timer = _context['timer']
+    return timer.span(name) if timer is not None else contextlib.suppress()
+
+
+def profile_path(run_id):
+    """Path of the pstats dump of a run (see log_archive.create_run)."""
+    return os.path.join(oc.cfg['logging']['root'], 'profiles', '{}.pstats'.format(run_id))
+
+
+def profiled(fn, *args, **kwargs):
+    """Call a function, under cProfile if a profile path is configured (the stats are dumped to that path)."""
+    path = _context['profile']
+    if path is None:
+        return fn(*args, **kwargs)
+    profile = cProfile.Profile()
+    try:
+        return profile.runcall(fn, *args, **kwargs)
+    finally:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        profile.dump_stats(path)
@@ -0,0 +1,291 @@
+import datetime
+import hashlib
+import json
+import re
+import threading
+import uuid
+
+import numpy as np
+import pandas as pd
+
+import omega_ui.configuration as oc
+import omega_ui.jobs as oj
+import omega_ui.results as ors
+import omega_ui.sweep as osw
+import omega_ui.tearsheet as ots
+
+
+"""Walk-forward module
+
+A walk-forward analysis splits the data range into train/test windows ('rolling 730/180': 730 days of training
+followed by 180 days of test, the windows moving by the test length; 'anchored 730/180': the training always starts at
+the beginning of the data). The parameter grid of the params table is run on every training window, all the windows
+being run concurrently in the process pool, and the best set (by Sharpe ratio) is then run on the following test
+window. The test runs start a lookback before their window so that the indicators are warmed up, only the returns of
+the window itself and the trades opened in it are kept. The out-of-sample returns of the test windows are stitched
+into one result.
+"""
+PARAM = 'Walk-forward'
+SPEC = re.compile(r'^\s*(rolling|anchored)\s+(\d+)\s*/\s*(\d+)(?:\s+step\s+(\d+))?\s*$', re.IGNORECASE)
+DATE_FORMAT = '%Y-%m-%d'
+
+_runs = {}
+_lock = threading.RLock()
+
+
+def parse(spec):
+    """Parse a walk-forward specification ('rolling 730/180', 'anchored 730/180 step 90')
+
+    :param spec: string - Specification (lengths in days)
+    :return: tuple - Mode, train length, test length and step (days)
+    """
+    match = SPEC.match(spec)
+    if not match:
+        raise ValueError('Invalid walk-forward: {} (e.g. rolling 730/180)'.format(spec))
+    mode, train, test, step = match.groups()
+    train, test = int(train), int(test)
+    step = int(step) if step else test
+    if train <= 0 or test <= 0 or step <= 0:
+        raise ValueError('Invalid walk-forward: {}'.format(spec))
+    return mode.lower(), train, test, step
+
+
+def windows(spec, first, last):
+    """Train/test windows of a walk-forward analysis
+
+    :param spec: string - Specification (see parse)
+    :param first: datetime - First date of the data
+    :param last: datetime - Last date of the data
+    :return: list - Windows as ((train start, train end), (test start, test end)) date strings, ends included
+    """
+    mode, train, test, step = parse(spec)
+    first, last = pd.Timestamp(first).normalize(), pd.Timestamp(last).normalize()
+    day = pd.Timedelta(days=1)
+    result = []
+    start = first
+    while True:
+        train_end = start + pd.Timedelta(days=train) - day
+        test_end = min(train_end + pd.Timedelta(days=test), last)
+        if train_end + day > last:
+            break
+        train_start = first if mode == 'anchored' else start
+        result.append(tuple(
+            (a.strftime(DATE_FORMAT), b.strftime(DATE_FORMAT))
+            for a, b in ((train_start, train_end), (train_end + day, test_end))))
+        start += pd.Timedelta(days=step)
+    if not result:
+        raise ValueError('Not enough data for walk-forward {} ({:%Y-%m-%d} to {:%Y-%m-%d})'.format(spec, first, last))
+    return result
+
+
+def to_datetime(date):
+    return datetime.datetime.strptime(date, DATE_FORMAT)
+
+
+def end_of_day(date):
+    """Last instant of a date string (the last day of a window is included with its intraday bars)."""
+    return to_datetime(date) + datetime.timedelta(days=1, microseconds=-1)
+
+
+def test_window(test, first, lookback):
+    """Window of a test run, preceded by a warm-up
+
+    :param test: tuple - First and last dates of the test window (see windows)
+    :param first: datetime - First date of the data
+    :param lookback: int - Length of the warm-up (days)
+    :return: tuple - Warm-up start, test start and test end date strings (see backend.create_ts)
+    """
+    start = max(pd.Timestamp(test[0]) - pd.Timedelta(days=lookback), pd.Timestamp(first).normalize())
+    return (start.strftime(DATE_FORMAT),) + tuple(test)
+
+
+def trim(returns, trades, opened, start):
+    """Drop the warm-up of a test run (with the trades opened during the warm-up, whose PnL is partly made before the
+    test window)
+
+    :param returns: pd.Series - Returns of the test run, warm-up included
+    :param trades: dict - Trades of the test run (see analyzers.TradeList)
+    :param opened: list - Open dates of the closed trades (analyzers.TradeList.opened)
+    :param start: string - First date of the test window
+    :return: tuple - Returns and trades of the test window and their statistic
+    """
+    returns = returns[returns.index >= pd.Timestamp(start, tz=returns.index.tz)]
+    trades = dict(trades, trades=[t for t, o in zip(trades['trades'], opened) if o[:10] >= start])
+    values = np.append(1.0, np.cumprod(1 + returns.values))
+    return returns, trades, ots.combined_statistic(returns, values, trades['trades'], trades['open'])
+
+
+def submit(submit_fn, spec, date_range, params):
+    """Run the parameter grid on every training window
+
+    :param submit_fn: function - Function submitting a backtest for a parameter set and a window ((from, to) date
+        strings, (warm-up from, from, to) for the test runs) and returning its job id
+    :param spec: string - Walk-forward specification (see parse)
+    :param date_range: tuple - First and last dates of the data (see Backtest.get_date_range)
+    :param params: dict - Parameters of the params table (cells can hold ranges/lists, see omega_ui.sweep)
+    :return: string - Walk-forward id
+    """
+    if date_range is None:
+        raise ValueError('Walk-forward needs Backtest.get_date_range')
+    grid = osw.expand(params)
+    splits = windows(spec, *date_range)
+    if len(grid) * len(splits) > int(oc.cfg['sweep']['max_runs']):
+        raise ValueError('Too many runs in walk-forward: {} (max: {})'.format(
+            len(grid) * len(splits), oc.cfg['sweep']['max_runs']))
+    with _lock:
+        for key in [k for k, r in _runs.items() if all(oj.status(j)['state'] is None for j in job_ids(k))]:
+            del _runs[key]  # jobs have been pruned
+    wf_id = 'w' + uuid.uuid4().hex
+    run = {'submit': submit_fn, 'stopped': False, 'result': None, 'windows': [], 'first': date_range[0],
+           'lookback': int(oc.cfg['sweep']['walk_forward_lookback_days'])}
+    with _lock:
+        _runs[wf_id] = run
+        for train, test in splits:
+            run['windows'].append({
+                'train': train,
+                'test': test,
+                'jobs': [(dict(p), submit_fn(dict(p), train)) for p in grid],
+                'best': None,
+                'oos': None
+            })
+    for window in run['windows']:
+        for _, job_id in window['jobs']:
+            # The test window is submitted as soon as its training runs are done
+            oj.add_done_callback(job_id, lambda _: _advance_in_background(wf_id))
+    return wf_id
+
+
+def is_walk_forward_id(job_id):
+    return job_id in _runs
+
+
+def _finished(job_id):
+    return oj.status(job_id)['state'] not in (oj.PENDING, oj.RUNNING)
+
+
+def _advance_in_background(wf_id):
+    # Not submitted from the callback thread of the process pool
+    threading.Thread(target=_advance, args=(wf_id,), daemon=True).start()
+
+
+def _advance(wf_id):
+    """Submit the test run of the windows whose training runs are all done."""
+    with _lock:
+        run = _runs.get(wf_id)
+        if run is None or run['stopped']:
+            return
+        for window in run['windows']:
+            if window['oos'] is not None or not all(_finished(j) for _, j in window['jobs']):
+                continue
+            ranked = []
+            for params, job_id in window['jobs']:
+                result_id = oj.result(job_id)
+                statistic = ors.get_statistic(result_id) if result_id else None
+                if statistic is not None:
+                    sharpe = statistic['Curve']['Sharpe Ratio']
+                    ranked.append((sharpe if sharpe == sharpe else -1e300, params))
+            if not ranked:
+                window['oos'] = ''  # no training run succeeded
+                continue
+            sharpe, window['best'] = max(ranked, key=lambda r: r[0])
+            window['sharpe'] = sharpe
+            test = test_window(window['test'], run['first'], run['lookback'])
+            window['oos'] = run['submit'](dict(window['best']), test)
+
+
+def job_ids(wf_id):
+    run = _runs.get(wf_id)
+    if run is None:
+        return []
+    return [j for w in run['windows'] for _, j in w['jobs']] + [w['oos'] for w in run['windows'] if w['oos']]
+
+
+def stop(wf_id):
+    """Do not submit any other test run (see backend.job_cancel)."""
+    with _lock:
+        if wf_id in _runs:
+            _runs[wf_id]['stopped'] = True
+
+
+def _test_state(window):
+    """State of the test run of a window (None until it is submitted, failed if create_ts did not return a result)."""
+    if window['oos'] is None:
+        return None
+    if window['oos'] == '':
+        return oj.FAILED
+    state = oj.status(window['oos'])['state']
+    return oj.FAILED if state == oj.DONE and not oj.result(window['oos']) else state
+
+
+def status(wf_id):
+    """Aggregated state and timings of a walk-forward analysis (same format as jobs.status)."""
+    _advance(wf_id)
+    run = _runs.get(wf_id)
+    if run is None:
+        return {'id': wf_id, 'state': None}
+    states = [oj.status(job_id) for job_id in job_ids(wf_id)]
+    tests = [_test_state(w) for w in run['windows']]
+    if any(s['state'] == oj.CANCELLED for s in states) or run['stopped']:
+        state = oj.CANCELLED
+    elif any(t in (None, oj.PENDING, oj.RUNNING) for t in tests):
+        state = oj.PENDING if all(s['state'] == oj.PENDING for s in states) else oj.RUNNING
+    elif oj.DONE in tests:
+        state = oj.DONE
+    else:
+        state = oj.FAILED
+    done = [s for s in states if s['state'] == oj.DONE]
+    return {
+        'id': wf_id,
+        'state': state,
+        'error': next((s['error'] for s in states if s.get('error')), None) if state == oj.FAILED else None,
+        'windows': len(tests),
+        'done': tests.count(oj.DONE),
+        'wait': max((s['wait'] for s in done), default=0),
+        'run': sum(s['run'] or 0 for s in done),
+        'total': max((s.get('total', 0) for s in states), default=0)
+    }
+
+
+def result(wf_id):
+    """Stitched out-of-sample result of a walk-forward analysis
+
+    :param wf_id: string - Walk-forward id
+    :return: string - Result id, None if not done
+    """
+    if status(wf_id)['state'] != oj.DONE:
+        return None
+    run = _runs[wf_id]
+    with _lock:
+        if run['result'] is None:
+            windows = [w for w in run['windows'] if _test_state(w) == oj.DONE]
+            run['result'] = stitch(windows)
+        return run['result']
+
+
+def stitch(windows):
+    """Stitch the out-of-sample returns of the test windows into one result
+
+    :param windows: list - Windows with a successful test run
+    :return: string - Result id
+    """
+    result_ids = [oj.result(w['oos']) for w in windows]
+    result_id = hashlib.sha256(json.dumps(['walk-forward'] + result_ids).encode('utf8')).hexdigest()
+    if ors.exists(result_id):
+        return result_id
+    returns, trades, still_open, breakdown = [], [], 0, {'Window': 'Parameters | IS Sharpe | OOS Return %'}
+    for n, (window, rid) in enumerate(zip(windows, result_ids)):
+        header = ors.get_header(rid)
+        returns.append(ors.get_returns(rid))
+        trade_list = header.get('trades') or {'trades': [], 'open': 0}
+        trades.extend(trade_list['trades'])
+        still_open += trade_list['open']
+        breakdown['{} {}..{}'.format(n + 1, *window['test'])] = '{} | {} | {}'.format(
+            ', '.join('{}={}'.format(k, v) for k, v in window['best'].items() if k != 'Cash'),
+            round(window['sharpe'], 2), header['statistic']['Curve']['Total Return'])
+    returns = pd.concat(returns).sort_index()
+    returns = returns[~returns.index.duplicated(keep='first')].rename('return')
+    values = np.append(1.0, np.cumprod(1 + returns.values))
+    statistic = ots.combined_statistic(returns, values, trades, still_open)
+    statistic['Walk-forward'] = breakdown
+    title = 'Walk-forward (out-of-sample): {:,.2f}%'.format((values[-1] - 1) * 100)
+    return ors.put(returns, statistic, title, result_id, trades={'trades': trades, 'open': still_open})